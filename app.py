@@ -1,16 +1,38 @@
 import streamlit as st
 import os
-import json
 import base64
-import time
-import re
-from utils import generate_pdf, generate_ppt, load_chat_history, save_chat_history
-
-# Import Prompts
-from prompts.tabler_prompt import TABLER_PROMPT
-from prompts.coursify_prompt import generate_coursify_prompt
-from prompts.quizzy_prompt import QUIZZY_PROMPT
-from prompts.dictator_prompt import DICTATOR_PROMPT
+import uuid
+from utils import generate_pdf_bytes, generate_ppt_bytes, load_chat_history, save_chat_history
+from llm import HAS_OPENAI, create_client, stream_complete
+from checkpoints import get_default_store, lesson_key, make_course_id
+from lesson_library import get_default_library
+from config import env_flag
+from content_index import index_sections, section_text
+from course_model import Course
+from jobs import (
+    CANCELLED,
+    DONE,
+    FAILED,
+    PRIORITY_CONTENT,
+    PRIORITY_OUTLINE,
+    PRIORITY_PREFETCH,
+    QUEUED,
+    RUNNING,
+    get_scheduler,
+)
+from outline_parser import parse_outline_structure
+from telemetry import count_api_calls, export_trace, start_metrics_server, summarize
+from pipeline import (
+    DEFAULT_MAX_WORKERS,
+    PREFETCH_MAX_WORKERS,
+    REUSE_ADAPT,
+    REUSE_COPY,
+    build_outline_prompt,
+    carry_over_checkpoints,
+    course_config,
+    generate_course_content,
+    parse_outline,
+)
 
 # Config MUST be the first command
 st.set_page_config(
@@ -43,19 +65,37 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-# Try importing OpenAI
+# Try importing dotenv
 try:
-    from openai import OpenAI
     from dotenv import load_dotenv
-    load_dotenv()
-    HAS_OPENAI = True
 except ImportError:
-    HAS_OPENAI = False
+    load_dotenv = None
+
+@st.cache_resource(show_spinner=False)
+def load_environment():
+    """
+    Reads .env once per process rather than on every rerun.
+    """
+    if load_dotenv is not None:
+        load_dotenv()
+    return True
+
+load_environment()
 
 # --- Header ---
 st.markdown('<div class="main-header">Automated Course Content Generator 🎓</div>', unsafe_allow_html=True)
 st.markdown('<div class="sub-header">Empower your teaching with AI-driven course creation</div>', unsafe_allow_html=True)
 
+# One chat history per browser session
+if "session_id" not in st.session_state:
+    st.session_state["session_id"] = uuid.uuid4().hex
+# Telemetry spans of the current course; a new outline starts a new trace
+if "trace_id" not in st.session_state:
+    st.session_state["trace_id"] = uuid.uuid4().hex
+
+# Prometheus metrics for the whole process (only when ACCG_METRICS_PORT is set)
+start_metrics_server()
+
 # --- Sidebar ---
 with st.sidebar:
     st.header("⚙️ Settings")
@@ -73,10 +113,36 @@ with st.sidebar:
     
     st.divider()
     
+    st.subheader("Generation")
+    max_workers = st.slider(
+        "Parallel requests",
+        min_value=1,
+        max_value=16,
+        value=min(max(DEFAULT_MAX_WORKERS, 1), 16),
+        help="Maximum number of lessons/quizzes generated at the same time."
+    )
+    use_cache = st.checkbox(
+        "Use response cache",
+        value=True,
+        help="Reuse stored answers for identical prompts and the lessons this session already wrote "
+             "for an approved outline. Untick to force fresh generations (an edited outline still "
+             "keeps its unchanged lessons)."
+    )
+    prefetch_lessons = st.checkbox(
+        "Prefetch lessons during review",
+        value=env_flag("ACCG_PREFETCH"),
+        help="Start writing lessons in the background while you review the outline. "
+             "Lessons you edit or delete are thrown away, so this may cost extra API calls."
+    )
+    
+    st.divider()
+    
     st.subheader("History Control")
     if st.button("🗑️ Clear Chat History"):
+        for job in get_scheduler().jobs_for(st.session_state["session_id"]):
+            get_scheduler().cancel(job.id)
         st.session_state.messages = []
-        save_chat_history([])
+        save_chat_history([], session_id=st.session_state["session_id"])
         st.session_state.clear()
         st.rerun()
 
@@ -89,37 +155,449 @@ if "final_content" not in st.session_state:
     st.session_state["final_content"] = None
 
 # --- Logic Helpers ---
+@st.cache_resource(show_spinner=False)
+def load_client(api_key):
+    """
+    Builds the OpenAI client (importing openai) the first time a key is used.
+    """
+    return create_client(api_key)
+
 def get_api_client():
-    key = api_key_input or os.getenv("OPENAI_API_KEY")
-    if not key:
+    if not HAS_OPENAI:
         return None
-    return OpenAI(api_key=key)
-
-def get_completion(client, prompt, model="gpt-3.5-turbo"):
-    try:
-        response = client.chat.completions.create(
-            model=model,
-            messages=[{"role": "user", "content": prompt}],
-            temperature=0.7,
+    return load_client(api_key_input)
+
+# --- Background Jobs ---
+# Generation runs on the shared scheduler; these bodies execute on its worker
+# threads, so they must not call Streamlit. Sessions poll the job instead.
+JOB_POLL_SECONDS = 0.5
+
+def outline_job_body(client, config, trace_id):
+    cache = use_cache
+    def run(job):
+        outline = ""
+        with job.call_slot():
+            for chunk in stream_complete(client, build_outline_prompt(config), use_cache=cache,
+                                         stage="tabler", trace_id=trace_id, label=config["course_name"]):
+                job.check_cancelled()
+                outline += chunk
+                job.set_partial("Course outline", outline)
+        return outline
+    return run
+
+def structure_job_body(client, outline, trace_id):
+    cache = use_cache
+    def run(job):
+        with job.call_slot():
+            module_dict, raw_response = parse_outline(client, outline, use_cache=cache, trace_id=trace_id)
+        return outline, module_dict, raw_response
+    return run
+
+def content_job_body(client, module_data, course_name, course_id, trace_id, reuse=None):
+    workers, cache = max_workers, use_cache
+    def run(job):
+        return generate_course_content(
+            client,
+            module_data,
+            course_name,
+            max_workers=workers,
+            on_progress=job.update_progress,
+            on_error=job.add_error,
+            use_cache=cache,
+            on_partial=job.set_partial,
+            checkpoints=get_default_store(),
+            course_id=course_id,
+            cancel_event=job.cancel_event,
+            trace_id=trace_id,
+            reuse=reuse,
+            library=get_default_library(),
+            call_slot=job.call_slot,
         )
-        return response.choices[0].message.content
-    except Exception as e:
-        st.error(f"OpenAI API Error: {e}")
-        return None
+    return run
+
+def prefetch_job_body(client, module_data, course_name, prefetch_id, trace_id, source=None):
+    workers, cache = min(max_workers, PREFETCH_MAX_WORKERS), use_cache
+    def run(job):
+        if source:
+            # Lessons of the cancelled prefetch for the previous edit, once its last calls are in
+            settle_prefetch(source, prefetch_id, module_data)
+        return generate_course_content(
+            client,
+            module_data,
+            course_name,
+            max_workers=workers,
+            on_progress=job.update_progress,
+            use_cache=cache,
+            checkpoints=get_default_store(),
+            course_id=prefetch_id,
+            cancel_event=job.cancel_event,
+            trace_id=trace_id,
+            quizzes=False,
+            call_slot=job.call_slot,
+        )
+    return run
+
+def current_job(state_key):
+    job_id = st.session_state.get(state_key)
+    return get_scheduler().get(job_id) if job_id else None
+
+def render_queued(job):
+    ahead = get_scheduler().queued_ahead(job.id)
+    st.info(f"⏳ Waiting for a free worker ({ahead} job(s) ahead)...")
 
-def extract_json(text):
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def outline_job_panel():
+    job = current_job("outline_job")
+    if job is None:
+        st.session_state.pop("outline_job", None)
+        return
+    
+    if job.status == QUEUED:
+        render_queued(job)
+    elif job.status == RUNNING:
+        st.caption("🧠 AI is brainstorming your course outline...")
+        with st.container(border=True):
+            st.markdown(job.partial_text or "...")
+    elif job.status == DONE:
+        st.session_state.pop("outline_job", None)
+        if job.result:
+            # A new outline is a new course: nothing of the previous one carries over
+            discard_prefetch()
+            for key in ("module_dict", "final_content", "generate_full", "parsed_outline", "previous_course",
+                        "structure_job"):
+                st.session_state.pop(key, None)
+            st.session_state['course_outline'] = job.result
+            st.toast("Outline generated! Go to the 'Outline Review' tab.", icon="✅")
+        st.rerun()
+    elif job.status == FAILED:
+        st.error(f"OpenAI API Error: {job.error}")
+    elif job.status == CANCELLED:
+        st.info("Outline generation cancelled.")
+    
+    if not job.finished and st.button("✖️ Cancel", key="cancel_outline_job"):
+        get_scheduler().cancel(job.id)
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def structure_job_panel():
+    job = current_job("structure_job")
+    if job is None:
+        # Job expired or server restarted: the script submits it again
+        st.session_state.pop("structure_job", None)
+        st.rerun()
+
+    if job.status == QUEUED:
+        render_queued(job)
+    elif job.status == RUNNING:
+        st.caption("🔍 Analyzing the outline's structure...")
+    elif job.status == DONE:
+        outline, module_dict, raw_response = job.result
+        if module_dict:
+            st.session_state.pop("structure_job", None)
+            st.session_state['module_dict'] = module_dict
+            st.session_state['parsed_outline'] = outline
+            st.rerun()
+        st.error(f"Failed to parse AI response into JSON. Response was: {(raw_response or '')[:200]}...")
+    elif job.status == FAILED:
+        st.error(f"OpenAI API Error: {job.error}")
+    elif job.status == CANCELLED:
+        st.info("Structure analysis cancelled.")
+
+    if not job.finished:
+        if st.button("✖️ Cancel", key="cancel_structure_job"):
+            get_scheduler().cancel(job.id)
+    elif st.button("🔁 Try again", key="retry_structure_job"):
+        st.session_state.pop("structure_job", None)
+        st.rerun()
+
+@st.fragment(run_every=JOB_POLL_SECONDS)
+def content_job_panel():
+    job = current_job("content_job")
+    if job is None:
+        # Job expired or server restarted: resubmitting resumes from checkpoints
+        st.session_state.pop("content_job", None)
+        st.rerun()
+    
+    if job.status == QUEUED:
+        render_queued(job)
+    elif job.status == RUNNING:
+        done, total, label = job.progress
+        st.progress(min(done / total, 0.99) if total else 0.0)
+        st.markdown(f"**Finished:** {label} ({done}/{total})" if label else "**Writing lessons...**")
+        if job.partial_text:
+            with st.container(border=True):
+                st.caption(f"✍️ Writing: {job.partial_label}")
+                st.markdown(job.partial_text)
+    elif job.status == DONE:
+        st.session_state.pop("content_job", None)
+        st.session_state["final_content"] = job.result
+        st.rerun()
+    elif job.status == FAILED:
+        st.error(f"Content generation failed: {job.error}")
+    elif job.status == CANCELLED:
+        st.warning("Generation cancelled. Lessons finished so far are saved.")
+    
+    for error in job.errors:
+        st.error(f"OpenAI API Error ({error})")
+    
+    if not job.finished:
+        if st.button("✖️ Cancel generation", key="cancel_content_job"):
+            get_scheduler().cancel(job.id)
+    elif st.button("▶️ Resume generation", key="resume_content_job"):
+        st.session_state.pop("content_job", None)
+        st.rerun()
+
+REUSE_CHOICES = {
+    "Generate new": None,
+    "Adapt it to this course": REUSE_ADAPT,
+    "Reuse as is": REUSE_COPY,
+}
+
+def reuse_plan_form(module_data, course_name, course_id):
     """
-    Robustly extracts JSON object from a string using regex.
+    Offers near-duplicate lessons from earlier courses for reuse. Returns the
+    reuse plan, or None while the user has not decided yet.
     """
-    try:
-        # Find the first opening brace and the last closing brace
-        match = re.search(r'\{.*\}', text, re.DOTALL)
-        if match:
-            json_str = match.group(0)
-            return json.loads(json_str)
-        return None
-    except json.JSONDecodeError:
-        return None
+    plan = st.session_state.get("reuse_plan")
+    if plan and plan[0] == course_id:
+        return plan[1]
+    saved = get_default_store().load(course_id)
+    matches = {
+        key: match
+        for key, match in get_default_library().match_module_dict(module_data, course_name).items()
+        if lesson_key(*key) not in saved
+    }
+    if not matches:
+        st.session_state["reuse_plan"] = (course_id, {})
+        return {}
+
+    with st.form("reuse_plan_form"):
+        st.subheader(f"♻️ {len(matches)} lesson(s) already exist in earlier courses")
+        choices = {}
+        for index, ((module, lesson), match) in enumerate(matches.items()):
+            choices[(module, lesson)] = st.selectbox(
+                f"{module} → {lesson}",
+                list(REUSE_CHOICES),
+                key=f"reuse_choice_{index}",
+                help=f"Similar to \"{match['lesson']}\" from \"{match['course_name']}\" "
+                     f"({match['similarity']:.0%} similar)",
+            )
+        if not st.form_submit_button("Continue"):
+            return None
+    reuse = {
+        lesson_key(module, lesson): (matches[(module, lesson)], REUSE_CHOICES[choice])
+        for (module, lesson), choice in choices.items()
+        if REUSE_CHOICES[choice]
+    }
+    st.session_state["reuse_plan"] = (course_id, reuse)
+    return reuse
+
+def session_course_id(module_dict):
+    # Checkpoints belong to the session, so another user asking for the same course starts afresh
+    course_id = make_course_id(st.session_state.get("course_name", "Course"), module_dict)
+    return f"{st.session_state['session_id']}-{course_id}"
+
+def prefetch_id(module_dict):
+    # Checkpoint namespace of this session's speculative lessons for one outline;
+    # an edited outline only keeps what carry_over_checkpoints copies over. The
+    # trace keeps a regenerated outline apart from the prefetch being cleared.
+    return f"prefetch-{st.session_state['trace_id']}-{session_course_id(module_dict)}"
+
+def stop_prefetch():
+    """
+    Cancels a running lesson prefetch; calls already in flight still finish
+    and write their lessons. `prefetch_source` then names the namespace that
+    holds the prefetched lessons and the job that may still be writing there.
+    """
+    job_id = st.session_state.pop("prefetch_job", None)
+    target = st.session_state.pop("prefetch_target", None)
+    if job_id is None:
+        return
+    job = get_scheduler().get(job_id)
+    if job is not None:
+        get_scheduler().cancel(job_id)
+        if job.started_at is None:
+            # Never ran, so the lessons are still where its source left them
+            return
+    # A started prefetch job moves its source's lessons into its own namespace first
+    st.session_state["prefetch_source"] = (job_id, *target)
+
+def settle_prefetch(source, course_id=None, module_data=None):
+    """
+    Waits for the job still writing the prefetched lessons of `source`, then
+    moves those that fit `module_data` to `course_id` (or only drops them) and
+    clears the prefetch namespace. Runs in job bodies, so no Streamlit calls.
+    Returns the number of lessons moved.
+    """
+    job_id, source_id, source_dict = source
+    job = get_scheduler().get(job_id) if job_id else None
+    if job is not None:
+        job.wait()
+    if source_id == course_id:
+        return 0
+    checkpoints = get_default_store()
+    kept = 0
+    if course_id:
+        kept, _ = carry_over_checkpoints(checkpoints, source_id, source_dict, course_id, module_data)
+    checkpoints.clear_course(source_id)
+    return kept
+
+def discard_prefetch():
+    """
+    Stops the prefetch and drops the lessons it wrote, e.g. for a new outline.
+    """
+    stop_prefetch()
+    st.session_state.pop("prefetch_outline", None)
+    source = st.session_state.pop("prefetch_source", None)
+    if source:
+        # Cleared by a job, as the cancelled prefetch may still be finishing a lesson
+        get_scheduler().submit(
+            st.session_state["session_id"], "prefetch", lambda job: settle_prefetch(source),
+            priority=PRIORITY_PREFETCH,
+        )
+
+def sync_prefetch(client, outline):
+    """
+    Keeps the speculative lesson prefetch in step with the outline under
+    review. On an edit the running prefetch is cancelled, and the new one
+    first maps the lessons already written onto the edited outline (edited or
+    deleted ones are dropped), then continues with what is still missing.
+    """
+    if not prefetch_lessons or st.session_state.get("generate_full") or not client:
+        stop_prefetch()
+        return
+    if st.session_state.get("prefetch_outline") == outline:
+        return
+    stop_prefetch()
+    st.session_state["prefetch_outline"] = outline
+    # Only outlines the local parser understands; no DICTATOR call is spent on a guess
+    module_dict = parse_outline_structure(outline)
+    if not module_dict:
+        # Keeps the last parsed outline's lessons for the next edit that parses
+        return
+    st.session_state["prefetch_target"] = (prefetch_id(module_dict), module_dict)
+    job = get_scheduler().submit(
+        st.session_state["session_id"],
+        "prefetch",
+        prefetch_job_body(
+            client,
+            module_dict,
+            st.session_state.get("course_name", "Course"),
+            prefetch_id(module_dict),
+            st.session_state["trace_id"],
+            st.session_state.get("prefetch_source"),
+        ),
+        priority=PRIORITY_PREFETCH,
+    )
+    st.session_state["prefetch_job"] = job.id
+
+@st.fragment(run_every=2)
+def prefetch_panel():
+    job = current_job("prefetch_job")
+    if job is not None and job.progress[1]:
+        done, total, _ = job.progress
+        st.caption(f"⚡ {done} of {total} lessons written ahead while you review.")
+
+def take_prefetched(course_id, module_data):
+    """
+    Stops the prefetch and moves the lessons it finished into the approved
+    course. Returns the number of lessons taken over.
+    """
+    stop_prefetch()
+    st.session_state.pop("prefetch_outline", None)
+    source = st.session_state.pop("prefetch_source", None)
+    if not source:
+        return 0
+    # A lesson still being written is worth the wait; generating it again costs another call
+    with st.spinner("Saving the lessons written during review..."):
+        return settle_prefetch(source, course_id, module_data)
+
+def restart_for_edited_outline():
+    """
+    Drops the structure and content built from the previous outline, keeping
+    enough to carry its still valid lessons and quizzes over to the edited one.
+    """
+    job = current_job("content_job")
+    if job is not None and not job.finished:
+        get_scheduler().cancel(job.id)
+    st.session_state.pop("content_job", None)
+    previous = st.session_state["module_dict"]
+    st.session_state["previous_course"] = (session_course_id(previous), previous)
+    st.session_state["module_dict"] = None
+    st.session_state["final_content"] = None
+
+@st.cache_data(max_entries=8, show_spinner=False)
+def course_sections(content, modules):
+    # Indexed once per distinct course text
+    return index_sections(content, modules)
+
+def step_section(delta, count):
+    st.session_state["viewer_section"] = min(max(st.session_state.get("viewer_section", 0) + delta, 0), count - 1)
+
+@st.fragment
+def content_viewer(content, modules=None):
+    """
+    Shows one section (lesson or quiz) of the course at a time, with a table
+    of contents; navigating reruns only this fragment and sends only the
+    selected section to the browser.
+    """
+    if isinstance(content, Course):
+        # Offsets come straight from the document structure
+        sections = content.sections()
+        content = content.to_markdown()
+    else:
+        sections = course_sections(content, tuple(modules) if modules else None)
+    if not sections:
+        st.markdown(content)
+        return
+    if st.session_state.get("viewer_section", 0) >= len(sections):
+        st.session_state["viewer_section"] = 0
+
+    def label(index):
+        section = sections[index]
+        if section["module"] and section["title"] != section["module"]:
+            return f"{index + 1}. {section['module']} › {section['title']}"
+        return f"{index + 1}. {section['title']}"
+
+    prev_col, toc_col, next_col = st.columns([1, 6, 1])
+    with prev_col:
+        st.button("◀", key="viewer_prev", on_click=step_section, args=(-1, len(sections)),
+                  disabled=st.session_state.get("viewer_section", 0) == 0)
+    with toc_col:
+        index = st.selectbox(
+            "Contents",
+            range(len(sections)),
+            format_func=label,
+            key="viewer_section",
+            label_visibility="collapsed",
+        )
+    with next_col:
+        st.button("▶", key="viewer_next", on_click=step_section, args=(1, len(sections)),
+                  disabled=index == len(sections) - 1)
+    st.caption(f"Section {index + 1} of {len(sections)}")
+    with st.container(border=True):
+        st.markdown(section_text(content, sections[index]))
+
+def course_metrics_panel():
+    """
+    Per-stage calls, tokens, latency and cost for the current course.
+    """
+    trace_id = st.session_state["trace_id"]
+    rows = summarize(trace_id)
+    if not rows:
+        return
+    with st.expander("📈 Generation Metrics", expanded=False):
+        m1, m2, m3, m4 = st.columns(4)
+        m1.metric("API calls", count_api_calls(trace_id))
+        m2.metric("Tokens", sum(row["prompt_tokens"] + row["completion_tokens"] for row in rows))
+        m3.metric("Retries", sum(row["retries"] for row in rows))
+        m4.metric("Est. cost", f"${sum(row['cost_usd'] for row in rows):.4f}")
+        st.dataframe(rows, hide_index=True)
+        st.download_button(
+            label="⬇️ Download trace (JSONL)",
+            data=export_trace(trace_id),
+            file_name=f"trace_{trace_id}.jsonl",
+            mime="application/x-ndjson",
+        )
 
 # --- Main Layout ---
 tab1, tab2, tab3 = st.tabs(["1️⃣ Course Configuration", "2️⃣ Outline Review", "3️⃣ Final Content"])
@@ -162,30 +640,32 @@ with tab1:
     if submitted:
         client = get_api_client()
         if client:
-            user_input = f"""
-            Topic: {course_name}
-            Audience: {target_audience}
-            Difficulty: {difficulty}
-            Modules: {num_modules}
-            Duration: {course_duration}
-            Credit: {course_credit}
-            """
+            config = course_config(
+                course_name=course_name,
+                target_audience=target_audience,
+                difficulty=difficulty,
+                num_modules=num_modules,
+                course_duration=course_duration,
+                course_credit=course_credit,
+            )
             
             # Save configs to state
             st.session_state.update({
                 "course_name": course_name,
-                "target_audience": target_audience
+                "target_audience": target_audience,
+                "trace_id": uuid.uuid4().hex,
             })
             
-            with st.spinner("🧠 AI is brainstorming your course outline..."):
-                full_prompt = TABLER_PROMPT + "\n\nUser Input Topic: " + user_input
-                outline = get_completion(client, full_prompt)
-                
-                if outline:
-                    st.session_state['course_outline'] = outline
-                    st.success("Outline generated! Go to the 'Outline Review' tab.")
-                    time.sleep(1)
-                    st.rerun()
+            job = get_scheduler().submit(
+                st.session_state["session_id"],
+                "outline",
+                outline_job_body(client, config, st.session_state["trace_id"]),
+                priority=PRIORITY_OUTLINE,
+            )
+            st.session_state["outline_job"] = job.id
+
+    if st.session_state.get("outline_job"):
+        outline_job_panel()
 
 # TAB 2: Outline Review
 with tab2:
@@ -202,12 +682,26 @@ with tab2:
         )
         
         st.session_state['course_outline'] = edited_outline
+        sync_prefetch(get_api_client(), edited_outline)
+        prefetch_panel()
+        outline_changed = (
+            bool(st.session_state.get("module_dict"))
+            and edited_outline != st.session_state.get("parsed_outline")
+        )
+        if outline_changed:
+            st.info("✏️ The outline changed since content was generated. Only new or renamed lessons "
+                    "and the quizzes of changed modules will be generated again.")
         
         st.write("---")
         
         c1, c2, c3 = st.columns([1, 2, 1])
         with c2:
             if st.button("🚀 Approve Outline & Generate Full Content", type="primary"):
+                if outline_changed:
+                    restart_for_edited_outline()
+                # An edit keeps its still valid lessons; otherwise the cache setting decides
+                st.session_state["fresh_start"] = not use_cache and not outline_changed
+                st.session_state.pop("structure_job", None)
                 st.session_state['generate_full'] = True
                 st.rerun()
     else:
@@ -220,34 +714,28 @@ with tab3:
         
         # 1. Parse Outline to JSON
         if not st.session_state.get('module_dict'):
-            with st.status("🔍 Analyzing structure...", expanded=True) as status:
-                st.write("Parsing outline into modules...")
-                dict_prompt = DICTATOR_PROMPT + "\n\nCourse Outline:\n" + st.session_state['course_outline']
-                raw_response = get_completion(client, dict_prompt)
-                
-                # Use robust extraction
-                module_dict = extract_json(raw_response)
-                
-                if module_dict:
-                    st.session_state['module_dict'] = module_dict
-                    status.update(label="Structure analyzed!", state="complete", expanded=False)
-                else:
-                    status.update(label="Error parsing outline", state="error")
-                    st.error(f"Failed to parse AI response into JSON. Response was: {raw_response[:200]}...")
-                    st.stop()
+            outline = st.session_state['course_outline']
+            # Parsed locally; DICTATOR is only asked for unusual layouts, in a job like outline generation
+            module_dict = parse_outline_structure(outline)
+            if module_dict:
+                st.session_state['module_dict'] = module_dict
+                st.session_state['parsed_outline'] = outline
+            else:
+                if not st.session_state.get("structure_job"):
+                    job = get_scheduler().submit(
+                        st.session_state["session_id"],
+                        "structure",
+                        structure_job_body(client, outline, st.session_state["trace_id"]),
+                        priority=PRIORITY_OUTLINE,
+                    )
+                    st.session_state["structure_job"] = job.id
+                structure_job_panel()
 
         # 2. Generate Content
         if st.session_state.get('module_dict'):
             module_data = st.session_state['module_dict']
-            full_text_accumulator = ""
-            
-            # Calculate total steps for progress
-            total_lessons = sum(len(lessons) for lessons in module_data.values())
-            total_quizzes = len(module_data)
-            total_steps = total_lessons + total_quizzes
-            current_step = 0
-            
-            progress_bar = st.progress(0)
+            checkpoints = get_default_store()
+            course_id = session_course_id(module_data)
             status_text = st.empty()
             
             # Container for results
@@ -255,33 +743,44 @@ with tab3:
 
             # Generate if not already generated
             if not st.session_state.get("final_content"):
-                
-                for module, lessons in module_data.items():
-                    module_text = f"# {module}\n\n"
-                    
-                    # Lessons
-                    for lesson in lessons:
-                        status_text.markdown(f"**Writing:** {lesson}...")
-                        lesson_prompt = generate_coursify_prompt(lesson, module, st.session_state.get("course_name", "Course"))
-                        lesson_content = get_completion(client, lesson_prompt) or "Error generating content."
-                        module_text += f"{lesson_content}\n\n---\n\n"
-                        
-                        current_step += 1
-                        progress_bar.progress(min(current_step / total_steps, 0.99))
-                    
-                    # Quiz
-                    status_text.markdown(f"**Generating Quiz for:** {module}...")
-                    quiz_prompt = QUIZZY_PROMPT + f"\n\nModule Content:\n{module_text}"
-                    quiz_content = get_completion(client, quiz_prompt) or "Error generating quiz."
-                    module_text += f"## 🧩 Quiz Questions\n{quiz_content}\n\n"
-                    
-                    current_step += 1
-                    progress_bar.progress(min(current_step / total_steps, 0.99))
-                    
-                    full_text_accumulator += module_text + "\n\n"
-                
-                st.session_state["final_content"] = full_text_accumulator
-                progress_bar.progress(1.0)
+                if not st.session_state.get("content_job"):
+                    if st.session_state.pop("fresh_start", False):
+                        # Approved with the cache off: lessons written earlier for this outline aren't restored
+                        checkpoints.clear_course(course_id)
+                    previous = st.session_state.pop("previous_course", None)
+                    if previous:
+                        kept, total = carry_over_checkpoints(checkpoints, previous[0], previous[1], course_id, module_data)
+                        st.toast(f"Kept {kept} of {total} lessons/quizzes from the previous outline.", icon="♻️")
+                    prefetched = take_prefetched(course_id, module_data)
+                    if prefetched:
+                        st.toast(f"{prefetched} lesson(s) were already written during review.", icon="⚡")
+                    reuse = reuse_plan_form(module_data, st.session_state.get("course_name", "Course"), course_id)
+                    if reuse is None:
+                        st.stop()
+                    job = get_scheduler().submit(
+                        st.session_state["session_id"],
+                        "content",
+                        content_job_body(
+                            client,
+                            module_data,
+                            st.session_state.get("course_name", "Course"),
+                            course_id,
+                            st.session_state["trace_id"],
+                            reuse,
+                        ),
+                        priority=PRIORITY_CONTENT,
+                    )
+                    st.session_state["content_job"] = job.id
+                content_job_panel()
+            
+            # Failed units stay out of the checkpoints, so a retry only redoes those
+            failed_units = checkpoints.failures(course_id) if st.session_state.get("final_content") else {}
+            if failed_units:
+                status_text.warning(f"⚠️ {len(failed_units)} lesson(s)/quiz(zes) could not be generated.")
+                if st.button(f"🔁 Retry {len(failed_units)} failed item(s)"):
+                    st.session_state["final_content"] = None
+                    st.rerun()
+            elif st.session_state.get("final_content"):
                 status_text.success("🎉 All content generated successfully!")
             
             # Display Final Result
@@ -296,54 +795,48 @@ with tab3:
                     final_txt = st.session_state["final_content"]
                     course_name_safe = st.session_state.get('course_name', 'Course').replace(" ", "_")
                     
-                    # Generate Files on the fly
-                    pdf_result = generate_pdf(final_txt, "course.pdf")
-                    ppt_result = generate_ppt(final_txt, "course.pptx")
+                    # Built once per distinct content and served from memory
+                    pdf_data = generate_pdf_bytes(final_txt, st.session_state["trace_id"])
+                    ppt_data = generate_ppt_bytes(final_txt, st.session_state["trace_id"])
                     
                     # 1. PDF
                     with d_cols[0]:
-                        if pdf_result:
-                            try:
-                                with open("course.pdf", "rb") as f:
-                                    pdf_data = f.read()
-                                st.download_button(
-                                    label="📄 Download PDF",
-                                    data=pdf_data,
-                                    file_name=f"{course_name_safe}.pdf",
-                                    mime="application/pdf",
-                                    type="primary"
-                                )
-                            except Exception as e:
-                                st.error(f"PDF error: {e}")
+                        if pdf_data:
+                            st.download_button(
+                                label="📄 Download PDF",
+                                data=pdf_data,
+                                file_name=f"{course_name_safe}.pdf",
+                                mime="application/pdf",
+                                type="primary"
+                            )
                     
                     # 2. PPT
                     with d_cols[1]:
-                        if ppt_result:
-                            try:
-                                with open("course.pptx", "rb") as f:
-                                    ppt_data = f.read()
-                                st.download_button(
-                                    label="📊 Download PPT",
-                                    data=ppt_data,
-                                    file_name=f"{course_name_safe}.pptx",
-                                    mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
-                                    type="primary"
-                                )
-                            except Exception as e:
-                                st.error(f"PPT error: {e}")
+                        if ppt_data:
+                            st.download_button(
+                                label="📊 Download PPT",
+                                data=ppt_data,
+                                file_name=f"{course_name_safe}.pptx",
+                                mime="application/vnd.openxmlformats-officedocument.presentationml.presentation",
+                                type="primary"
+                            )
                                 
                     # 3. Markdown
                     with d_cols[2]:
                         st.download_button(
                             label="📝 Download Markdown",
-                            data=final_txt,
+                            data=final_txt.to_markdown(),
                             file_name=f"{course_name_safe}.md",
                             mime="text/markdown",
                             type="primary"
                         )
 
-                with st.expander("👀 View Full Text Content", expanded=False):
-                    st.markdown(st.session_state["final_content"])
+                # Nothing is sent to the browser until the viewer is opened
+                if st.session_state.get("final_content") and st.toggle("👀 View Full Text Content", key="show_full_text"):
+                    content_viewer(st.session_state["final_content"], list(module_data))
+                
+                if st.session_state.get("final_content"):
+                    course_metrics_panel()
                     
     else:
          st.info("👈 Approve the outline in the previous tab to start content generation.")
\ No newline at end of file
@@ -0,0 +1,386 @@
+"""
+Batch execution mode for bulk (e.g. overnight) course generation.
+
+Instead of one chat request per lesson, every prompt of a round is written
+to a JSONL file and submitted through the provider's Batch API, which is
+cheaper and isn't bound by the per-minute limits. A catalog build runs in
+three rounds: outlines for all courses, then every lesson, then every quiz
+(quizzes need their module's lessons). Results are written to the response
+cache and the checkpoint store, and the normal pipeline assembles the
+courses, generating anything the batch could not deliver one by one.
+"""
+import hashlib
+import io
+import json
+import os
+import time
+import uuid
+
+from checkpoints import get_default_store, lesson_key, make_course_id, quiz_key
+from config import data_path
+from llm import prepare_request
+from pipeline import (
+    DEFAULT_MAX_WORKERS,
+    build_lesson_prompt,
+    build_module_quiz_prompt,
+    build_outline_prompt,
+    course_config,
+    format_course_outline,
+    generate_course_content,
+    generate_outline,
+    parse_outline,
+)
+from prompts.routing import DEFAULT_MODEL, DEFAULT_TEMPERATURE, get_route
+from response_cache import get_default_cache, make_key
+from storage import SQLiteStore
+from telemetry import estimate_cost, record_span
+
+BATCH_ENDPOINT = "/v1/chat/completions"
+BATCH_COMPLETION_WINDOW = "24h"
+BATCH_POLL_SECONDS = float(os.getenv("ACCG_BATCH_POLL_SECONDS", "30"))
+# Provider limit on requests per batch file
+MAX_BATCH_REQUESTS = int(os.getenv("ACCG_BATCH_MAX_REQUESTS", "50000"))
+# Batch requests are billed at half the synchronous price
+BATCH_COST_FACTOR = 0.5
+
+FINAL_STATES = ("completed", "failed", "expired", "cancelled")
+
+
+def batch_line(custom_id, prompt, model=DEFAULT_MODEL, temperature=DEFAULT_TEMPERATURE, max_tokens=None):
+    """
+    One request of a batch input file; `prompt` is a RenderedPrompt or plain text.
+    """
+    messages, _, _, _ = prepare_request(prompt)
+    body = {"model": model, "messages": messages, "temperature": temperature}
+    if max_tokens:
+        body["max_tokens"] = max_tokens
+    return {"custom_id": custom_id, "method": "POST", "url": BATCH_ENDPOINT, "body": body}
+
+
+def parse_batch_output(text):
+    """
+    Parses batch output/error JSONL into {custom_id: (content, usage, error)}.
+    """
+    results = {}
+    for line in text.splitlines():
+        if not line.strip():
+            continue
+        row = json.loads(line)
+        response = row.get("response") or {}
+        body = response.get("body") or {}
+        error = row.get("error")
+        if not error and response.get("status_code") != 200:
+            error = body.get("error") or f"HTTP {response.get('status_code')}"
+        if error:
+            message = error.get("message") if isinstance(error, dict) else str(error)
+            results[row["custom_id"]] = (None, None, message or "batch request failed")
+            continue
+        try:
+            choice = body["choices"][0]
+            content = choice["message"]["content"]
+        except (KeyError, IndexError, TypeError):
+            results[row["custom_id"]] = (None, None, "malformed batch response")
+            continue
+        if choice.get("finish_reason") == "length":
+            # Left for the direct call, which retries it with a larger budget
+            results[row["custom_id"]] = (None, body.get("usage") or {}, "answer cut off at the output limit")
+            continue
+        results[row["custom_id"]] = (content, body.get("usage") or {}, None)
+    return results
+
+
+class BatchJournal(SQLiteStore):
+    """
+    Remembers submitted batches by a hash of their input file, so a rerun
+    after a crash polls the batch already in flight instead of paying for it twice.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS batches (
+            digest TEXT PRIMARY KEY,
+            batch_id TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or data_path("batches.sqlite3"))
+
+    def get(self, digest):
+        row = self._connect().execute("SELECT batch_id FROM batches WHERE digest = ?", (digest,)).fetchone()
+        return row[0] if row else None
+
+    def save(self, digest, batch_id):
+        self._connect().execute(
+            "INSERT OR REPLACE INTO batches (digest, batch_id, created_at) VALUES (?, ?, ?)",
+            (digest, batch_id, time.time()),
+        )
+
+    def forget(self, digest):
+        self._connect().execute("DELETE FROM batches WHERE digest = ?", (digest,))
+
+
+def submit_batch(client, lines, journal=None):
+    """
+    Uploads the request lines as a JSONL file and creates a batch. Returns
+    the batch id, reusing a journaled batch for identical input.
+    """
+    data = "".join(json.dumps(line, ensure_ascii=False) + "\n" for line in lines).encode("utf-8")
+    digest = hashlib.sha256(data).hexdigest()
+    if journal is not None:
+        batch_id = journal.get(digest)
+        if batch_id:
+            status = client.batches.retrieve(batch_id).status
+            if status not in ("failed", "expired", "cancelled"):
+                return batch_id
+            journal.forget(digest)
+
+    upload = client.files.create(file=(f"accg-{digest[:12]}.jsonl", io.BytesIO(data)), purpose="batch")
+    batch = client.batches.create(
+        input_file_id=upload.id,
+        endpoint=BATCH_ENDPOINT,
+        completion_window=BATCH_COMPLETION_WINDOW,
+        metadata={"source": "accg"},
+    )
+    if journal is not None:
+        journal.save(digest, batch.id)
+    return batch.id
+
+
+def wait_for_batch(client, batch_id, poll_seconds=BATCH_POLL_SECONDS, on_status=None):
+    """
+    Polls a batch until it reaches a final state and returns it.
+    `on_status(batch)` is called after every poll.
+    """
+    while True:
+        batch = client.batches.retrieve(batch_id)
+        if on_status:
+            on_status(batch)
+        if batch.status in FINAL_STATES:
+            return batch
+        time.sleep(poll_seconds)
+
+
+def _file_text(client, file_id):
+    if not file_id:
+        return ""
+    return client.files.content(file_id).read().decode("utf-8")
+
+
+def _cache_key(settings, prompt):
+    # Same key llm.complete uses, so batch answers serve later direct calls and vice versa
+    _, system, user, _ = prepare_request(prompt)
+    model, temperature, max_tokens = settings
+    return make_key(model, temperature, user, system, max_tokens)
+
+
+def _settings(stage, model, temperature):
+    # Batches have no per-minute limits or latency SLO, so a stage always uses its primary model
+    route = get_route(stage)
+    return model or route.model, route.temperature if temperature is None else temperature, route.max_tokens
+
+
+def run_batch(client, items, model=None, temperature=None, use_cache=True,
+              journal=None, poll_seconds=BATCH_POLL_SECONDS, on_status=None):
+    """
+    Runs prompts through the Batch API and returns {custom_id: (content, error)}.
+
+    `items` are (custom_id, prompt, stage, trace_id, label) tuples of one
+    stage (a batch file holds requests for a single model); model,
+    temperature and output budget default to the stage's route. Prompts
+    already in the response cache are answered from it; new answers are
+    written to it. Each answer is recorded as a telemetry span with the
+    batch's turnaround time as latency and the discounted cost.
+
+    A batch that doesn't complete keeps whatever it finished; its other
+    requests come back with an error, for the caller to make directly.
+    """
+    cache = get_default_cache() if use_cache else None
+    results = {}
+    pending = []
+    for item in items:
+        custom_id, prompt, stage, trace_id, label = item
+        settings = _settings(stage, model, temperature)
+        cached = cache.get(_cache_key(settings, prompt)) if cache else None
+        if cached is not None:
+            results[custom_id] = (cached, None)
+            record_span(stage, trace_id, label=label, model=settings[0], cached=True, batch=True, latency=0.0,
+                        prompt_tokens=0, completion_tokens=0)
+        else:
+            pending.append(item)
+    if not pending:
+        return results
+
+    started = time.perf_counter()
+    chunks = [pending[i:i + MAX_BATCH_REQUESTS] for i in range(0, len(pending), MAX_BATCH_REQUESTS)]
+    # Submit every chunk before waiting so they are processed side by side
+    batch_ids = [
+        submit_batch(client, [batch_line(c, p, *_settings(stage, model, temperature)) for c, p, stage, _, _ in chunk],
+                     journal)
+        for chunk in chunks
+    ]
+    for chunk, batch_id in zip(chunks, batch_ids):
+        batch = wait_for_batch(client, batch_id, poll_seconds, on_status)
+        # A failed, expired or cancelled batch may still have finished part of its requests
+        missing = "missing from batch output" if batch.status == "completed" else f"batch {batch.status}"
+        outputs = {}
+        for file_id in (getattr(batch, "output_file_id", None), getattr(batch, "error_file_id", None)):
+            try:
+                outputs.update(parse_batch_output(_file_text(client, file_id)))
+            except Exception as e:
+                print(f"Error downloading batch {batch_id} results: {e}")
+        elapsed = time.perf_counter() - started
+
+        for custom_id, prompt, stage, trace_id, label in chunk:
+            content, usage, error = outputs.get(custom_id, (None, None, missing))
+            results[custom_id] = (content, error)
+            usage = usage or {}
+            settings = _settings(stage, model, temperature)
+            record_span(
+                stage, trace_id, label=label, model=settings[0], batch=True, latency=elapsed,
+                prompt_tokens=usage.get("prompt_tokens"), completion_tokens=usage.get("completion_tokens"),
+                cost=BATCH_COST_FACTOR * estimate_cost(settings[0], usage.get("prompt_tokens"),
+                                                       usage.get("completion_tokens")),
+                error=error,
+            )
+            if cache and content:
+                cache.set(_cache_key(settings, prompt), content)
+    return results
+
+
+def generate_courses_batch(client, configs, use_cache=True, checkpoints=None, resume=True,
+                           max_workers=DEFAULT_MAX_WORKERS, poll_seconds=BATCH_POLL_SECONDS,
+                           on_status=None, on_error=None, library=None):
+    """
+    Generates several courses through the Batch API.
+
+    Returns one dict per config in the same order: the `generate_course`
+    result keys (config, outline, module_dict, content, files, timings,
+    trace_id) or {"config", "error"} for a course whose outline failed.
+    `on_status(message)` reports round progress and `on_error(index, label, exc)`
+    each unit that still failed when generated directly. With `resume=False`
+    earlier checkpoints are discarded. Lessons are added to `library` if given.
+    """
+    checkpoints = checkpoints or get_default_store()
+    # Without resume a fresh batch is wanted even for identical input
+    journal = BatchJournal() if resume else None
+    courses = [{"config": course_config(**config), "trace_id": uuid.uuid4().hex, "timings": {}}
+               for config in configs]
+
+    def status_reporter(round_name):
+        def report(batch):
+            if on_status:
+                counts = getattr(batch, "request_counts", None)
+                done = f" {counts.completed + counts.failed}/{counts.total}" if counts else ""
+                on_status(f"{round_name}: batch {batch.id} {batch.status}{done}")
+        return report
+
+    def batch_round(round_name, items):
+        if on_status:
+            on_status(f"{round_name}: {len(items)} request(s)")
+        started = time.perf_counter()
+        results = run_batch(client, items, use_cache=use_cache, journal=journal,
+                            poll_seconds=poll_seconds, on_status=status_reporter(round_name))
+        return results, time.perf_counter() - started
+
+    # Round 1: outlines
+    items = [(f"outline-{i}", build_outline_prompt(c["config"]), "tabler", c["trace_id"], c["config"]["course_name"])
+             for i, c in enumerate(courses)]
+    results, elapsed = batch_round("outlines", items)
+    for i, course in enumerate(courses):
+        outline, error = results[f"outline-{i}"]
+        course["timings"]["outline"] = elapsed
+        if not outline:
+            try:
+                outline = generate_outline(client, course["config"], use_cache=use_cache, trace_id=course["trace_id"])
+            except Exception as e:
+                error = e
+        if not outline:
+            course["error"] = f"TABLER failed: {error}"
+            continue
+        started = time.perf_counter()
+        module_dict, raw_response = parse_outline(client, outline, use_cache=use_cache, trace_id=course["trace_id"])
+        course["timings"]["parse"] = time.perf_counter() - started
+        if not module_dict:
+            course["error"] = f"Failed to parse outline into JSON. Response was: {(raw_response or '')[:200]}..."
+            continue
+        course["outline"] = outline
+        course["module_dict"] = module_dict
+        course["course_id"] = make_course_id(course["config"]["course_name"], module_dict)
+        if not resume:
+            checkpoints.clear_course(course["course_id"])
+    active = [(i, c) for i, c in enumerate(courses) if "error" not in c]
+
+    # Round 2: every lesson not already checkpointed
+    items, units = [], {}
+    for i, course in active:
+        saved = checkpoints.load(course["course_id"])
+        course_outline = format_course_outline(course["module_dict"])
+        for m_idx, (module, lessons) in enumerate(course["module_dict"].items()):
+            for l_idx, lesson in enumerate(lessons):
+                if saved.get(lesson_key(module, lesson)):
+                    continue
+                custom_id = f"lesson-{i}-{m_idx}-{l_idx}"
+                units[custom_id] = (i, lesson_key(module, lesson), lesson)
+                prompt = build_lesson_prompt(lesson, module, course["config"]["course_name"], course_outline)
+                items.append((custom_id, prompt, "coursify", course["trace_id"], lesson))
+    results, elapsed = batch_round("lessons", items) if items else ({}, 0.0)
+    _save_results(checkpoints, courses, units, results, on_status)
+
+    # Round 3: quizzes of modules whose lessons are all done
+    items, units = [], {}
+    for i, course in active:
+        saved = checkpoints.load(course["course_id"])
+        for m_idx, (module, lessons) in enumerate(course["module_dict"].items()):
+            contents = [saved.get(lesson_key(module, lesson)) for lesson in lessons]
+            if saved.get(quiz_key(module)) or not all(contents):
+                continue
+            custom_id = f"quiz-{i}-{m_idx}"
+            units[custom_id] = (i, quiz_key(module), f"Quiz: {module}")
+            # Without a client, long modules are condensed locally rather than by direct calls
+            prompt = build_module_quiz_prompt(module, contents, trace_id=course["trace_id"])
+            items.append((custom_id, prompt, "quizzy", course["trace_id"], f"Quiz: {module}"))
+    quiz_results, quiz_elapsed = batch_round("quizzes", items) if items else ({}, 0.0)
+    _save_results(checkpoints, courses, units, quiz_results, on_status)
+
+    # Assemble from checkpoints; anything the batch didn't deliver is generated directly
+    for i, course in active:
+        started = time.perf_counter()
+        course["content"] = generate_course_content(
+            client,
+            course["module_dict"],
+            course["config"]["course_name"],
+            max_workers=max_workers,
+            on_error=(lambda label, e, i=i: on_error(i, label, e)) if on_error else None,
+            use_cache=use_cache,
+            checkpoints=checkpoints,
+            course_id=course["course_id"],
+            trace_id=course["trace_id"],
+            library=library,
+        )
+        course["timings"]["content"] = elapsed + quiz_elapsed + time.perf_counter() - started
+        course["timings"]["total"] = sum(course["timings"].values())
+        course["files"] = {}
+
+    return [
+        {key: course[key] for key in ("config", "error")} if "error" in course else
+        {key: course[key] for key in ("config", "outline", "module_dict", "content", "files", "timings", "trace_id")}
+        for course in courses
+    ]
+
+
+def _save_results(checkpoints, courses, units, results, on_status):
+    failed = 0
+    for custom_id, (index, unit_key, label) in units.items():
+        content, error = results.get(custom_id, (None, "missing from batch output"))
+        course_id = courses[index]["course_id"]
+        if content:
+            checkpoints.save(course_id, unit_key, content)
+        else:
+            # Retried one by one when the course is assembled
+            checkpoints.save_failure(course_id, unit_key, error)
+            failed += 1
+    if failed and on_status:
+        on_status(f"{failed} request(s) failed in the batch and will be generated directly")
@@ -0,0 +1,178 @@
+"""
+Offline end-to-end benchmark: whole courses against the local mock server.
+
+Runs outline -> parse -> lessons -> quizzes -> PDF/PPTX export through
+pipeline.generate_course (the engine behind app.py and the batch CLI) and
+reports courses/hour, p50/p95 latency per stage and peak memory. Nothing
+leaves the machine and no API key is needed.
+
+    python -m benchmarks.bench_e2e
+    python -m benchmarks.bench_e2e --courses 8 --concurrency 4 --modules 5 --latency 0.5 --error-rate 0.05
+    python -m benchmarks.bench_e2e --json results.json
+"""
+import argparse
+import json
+import os
+import resource
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from benchmarks.mock_openai import MockOpenAIServer, add_settings_arguments, settings_from_args
+
+STAGE_ORDER = ("tabler", "dictator", "coursify", "quizzy", "export_pdf", "export_pptx")
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def percentile(values, pct):
+    """
+    Nearest-rank percentile of a list of numbers (None when empty).
+    """
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(pct / 100.0 * len(ordered) + 0.5)) - 1))
+    return ordered[index]
+
+
+def run_benchmark(args):
+    """
+    Generates `args.courses` courses and returns the report dict.
+    """
+    work_dir = tempfile.mkdtemp(prefix="accg-bench-")
+    # Must be set before the pipeline modules read them at import time
+    os.environ["ACCG_DATA_DIR"] = os.path.join(work_dir, "data")
+    os.environ["ACCG_CACHE_DISABLED"] = "1"
+    os.environ["ACCG_RPM"] = str(args.rpm)
+    os.environ["ACCG_TPM"] = str(args.tpm)
+
+    server = None
+    if args.server_url:
+        os.environ["OPENAI_BASE_URL"] = args.server_url
+    else:
+        server = MockOpenAIServer(settings_from_args(args)).start()
+        os.environ["OPENAI_BASE_URL"] = server.base_url
+
+    from llm import create_client
+    from pipeline import generate_course
+    from telemetry import get_spans
+
+    client = create_client("sk-mock-benchmark")
+    rss_before = peak_rss_mb()
+
+    def one_course(index):
+        return generate_course(
+            client,
+            {"course_name": f"Benchmark Course {index + 1}", "num_modules": args.modules},
+            out_dir=os.path.join(work_dir, "output", str(index)),
+            formats=args.formats,
+            max_workers=args.max_workers,
+            use_cache=False,
+        )
+
+    started = time.perf_counter()
+    try:
+        with ThreadPoolExecutor(max_workers=max(1, args.concurrency)) as executor:
+            results = list(executor.map(one_course, range(args.courses)))
+        wall_time = time.perf_counter() - started
+
+        stage_latencies = {}
+        errors = 0
+        retries = 0
+        for result in results:
+            for span in get_spans(result["trace_id"]):
+                if span.get("error"):
+                    errors += 1
+                    continue
+                stage_latencies.setdefault(span["stage"], []).append(span["latency"])
+                retries += span.get("retries") or 0
+        course_timings = {}
+        for result in results:
+            for stage, seconds in result["timings"].items():
+                course_timings.setdefault(stage, []).append(seconds)
+    finally:
+        if server is not None:
+            server.shutdown()
+        if not args.keep:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    stages = sorted(stage_latencies, key=lambda s: STAGE_ORDER.index(s) if s in STAGE_ORDER else len(STAGE_ORDER))
+    return {
+        "courses": args.courses,
+        "concurrency": args.concurrency,
+        "modules": args.modules,
+        "wall_time": wall_time,
+        "courses_per_hour": args.courses / wall_time * 3600 if wall_time else 0.0,
+        "stages": {
+            stage: {
+                "calls": len(stage_latencies[stage]),
+                "p50": percentile(stage_latencies[stage], 50),
+                "p95": percentile(stage_latencies[stage], 95),
+            }
+            for stage in stages
+        },
+        "course_timings": {
+            stage: {"p50": percentile(values, 50), "p95": percentile(values, 95)}
+            for stage, values in course_timings.items()
+        },
+        "failed_calls": errors,
+        "retries": retries,
+        "server": dict(server.counters) if server is not None else None,
+        "rss_before_mb": rss_before,
+        "peak_rss_mb": peak_rss_mb(),
+        "output_dir": work_dir if args.keep else None,
+    }
+
+
+def print_report(report):
+    print(f"\n{report['courses']} course(s), {report['modules']} module(s) each, "
+          f"{report['concurrency']} at a time: {report['wall_time']:.1f}s "
+          f"({report['courses_per_hour']:.1f} courses/hour)")
+    print(f"\n{'stage':<14} {'calls':>6} {'p50 s':>8} {'p95 s':>8}")
+    for stage, row in report["stages"].items():
+        print(f"{stage:<14} {row['calls']:>6} {row['p50']:>8.3f} {row['p95']:>8.3f}")
+    print(f"\n{'per course':<14} {'':>6} {'p50 s':>8} {'p95 s':>8}")
+    for stage, row in report["course_timings"].items():
+        print(f"{stage:<14} {'':>6} {row['p50']:>8.3f} {row['p95']:>8.3f}")
+    print(f"\nfailed calls: {report['failed_calls']}  retries: {report['retries']}  "
+          f"peak RSS: {report['peak_rss_mb']:.1f} MB (before run: {report['rss_before_mb']:.1f} MB)")
+    if report["output_dir"]:
+        print(f"output kept in {report['output_dir']}")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--courses", type=int, default=4, help="Courses to generate")
+    parser.add_argument("--concurrency", type=int, default=2, help="Courses generated at the same time")
+    parser.add_argument("--modules", type=int, default=3, help="Modules per course")
+    parser.add_argument("--max-workers", type=int, default=8, help="Parallel API calls per course")
+    parser.add_argument("--formats", nargs="+", default=["md", "pdf", "pptx"], choices=["md", "pdf", "pptx"])
+    parser.add_argument("--rpm", type=int, default=0, help="Client request limit per minute (0 = off)")
+    parser.add_argument("--tpm", type=int, default=0, help="Client token limit per minute (0 = off)")
+    parser.add_argument("--server-url", default=None,
+                        help="Use an already running server instead of starting the mock in-process")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated files")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,72 @@
+"""
+PDF export benchmark: render time and peak RSS for synthetic courses.
+
+Each size runs in a fresh interpreter so peak RSS is not polluted by the
+previous run.
+
+    python -m benchmarks.bench_pdf              # 10, 50 and 100 modules
+    python -m benchmarks.bench_pdf --modules 20 200
+"""
+import argparse
+import json
+import os
+import resource
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def peak_rss_mb():
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def run_single(modules, lessons):
+    from benchmarks.synthetic import synthetic_course
+    from pdf_export import render_course_pdf
+
+    content = synthetic_course(modules, lessons)
+    baseline = peak_rss_mb()
+    started = time.perf_counter()
+    data = render_course_pdf(content)
+    elapsed = time.perf_counter() - started
+    return {
+        "modules": modules,
+        "content_kb": len(content.encode("utf-8")) / 1024,
+        "pdf_kb": len(data) / 1024 if data else 0,
+        "seconds": elapsed,
+        "peak_rss_mb": peak_rss_mb(),
+        "rss_before_mb": baseline,
+    }
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--modules", type=int, nargs="+", default=[10, 50, 100])
+    parser.add_argument("--lessons", type=int, default=5, help="Lessons per module")
+    parser.add_argument("--single", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+
+    if args.single:
+        print(json.dumps(run_single(args.modules[0], args.lessons)))
+        return 0
+
+    print(f"{'modules':>8} {'content KB':>11} {'pdf KB':>9} {'seconds':>9} {'peak RSS MB':>12}")
+    for modules in args.modules:
+        out = subprocess.run(
+            [sys.executable, "-m", "benchmarks.bench_pdf", "--single", "--modules", str(modules),
+             "--lessons", str(args.lessons)],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        )
+        row = json.loads(out.stdout.strip().splitlines()[-1])
+        print(f"{row['modules']:>8} {row['content_kb']:>11.0f} {row['pdf_kb']:>9.0f} "
+              f"{row['seconds']:>9.2f} {row['peak_rss_mb']:>12.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
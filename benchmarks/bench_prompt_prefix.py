@@ -0,0 +1,102 @@
+"""
+Prompt prefix benchmark: tokens the lesson prompts of one course share.
+
+The COURSIFY and adapt prompts keep everything a course has in common
+(system text, course name, modules and lessons) before the module and
+lesson, so providers that cache prompt prefixes (from 1024 tokens on) can
+reuse it. This renders the first and last lesson prompt of synthetic
+courses and prints their shared prefix next to the size of a whole lesson
+prompt; with --min-tokens it fails when the shared prefix is shorter.
+`--outline tabler` shows what carrying TABLER's whole outline would cost.
+
+    python -m benchmarks.bench_prompt_prefix
+    python -m benchmarks.bench_prompt_prefix --sizes 6x5 10x5 --min-tokens 1024
+"""
+import argparse
+import os
+import sys
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+COURSE_NAME = "Introduction to Data Science"
+SOURCE = {"lesson": "Stored Lesson", "course_name": "Another Course", "content": "## Stored Lesson\n\nText."}
+
+
+def shared_prefix_tokens(first, last):
+    """
+    Tokens of the system text plus the user text two prompts start with.
+    """
+    from prompts import count_tokens
+
+    if first.system != last.system:
+        return 0
+    return count_tokens(first.system) + count_tokens(os.path.commonprefix([first.user, last.user]))
+
+
+def prompt_tokens(prompt):
+    from prompts import count_tokens
+
+    return count_tokens(prompt.system) + count_tokens(prompt.user)
+
+
+def measure(modules, lessons, outline_kind):
+    from benchmarks.synthetic import synthetic_module_dict, synthetic_outline
+    from pipeline import build_adapt_prompt, build_lesson_prompt, format_course_outline
+
+    module_dict = synthetic_module_dict(modules, lessons)
+    if outline_kind == "tabler":
+        outline = synthetic_outline(modules, lessons)
+    else:
+        outline = format_course_outline(module_dict)
+    units = [(module, lesson) for module, names in module_dict.items() for lesson in names]
+    (first_module, first_lesson), (last_module, last_lesson) = units[0], units[-1]
+    last_prompt = build_lesson_prompt(last_lesson, last_module, COURSE_NAME, outline)
+    return {
+        "lesson": prompt_tokens(last_prompt),
+        "coursify": shared_prefix_tokens(
+            build_lesson_prompt(first_lesson, first_module, COURSE_NAME, outline),
+            last_prompt,
+        ),
+        "adapt": shared_prefix_tokens(
+            build_adapt_prompt(first_lesson, first_module, COURSE_NAME, outline, SOURCE),
+            build_adapt_prompt(last_lesson, last_module, COURSE_NAME, outline, SOURCE),
+        ),
+    }
+
+
+def parse_size(text):
+    modules, _, lessons = text.partition("x")
+    return int(modules), int(lessons or 4)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sizes", nargs="+", default=["2x3", "3x4", "6x5"],
+                        help="Courses as MODULESxLESSONS (lessons per module)")
+    parser.add_argument("--outline", choices=("modules", "tabler"), default="modules",
+                        help="Outline text in the prompts: the module list the pipeline sends, "
+                             "or TABLER's whole outline for comparison")
+    parser.add_argument("--stages", nargs="+", choices=("coursify", "adapt"), default=["coursify"],
+                        help="Stages held to --min-tokens")
+    parser.add_argument("--min-tokens", type=int, default=0,
+                        help="Fail when a shared prefix is shorter (providers cache from 1024)")
+    args = parser.parse_args(argv)
+
+    failures = []
+    print(f"{'course':>8} {'lesson':>7} {'coursify':>9} {'adapt':>7}")
+    for size in args.sizes:
+        modules, lessons = parse_size(size)
+        row = measure(modules, lessons, args.outline)
+        print(f"{size:>8} {row['lesson']:>7} {row['coursify']:>9} {row['adapt']:>7}")
+        failures += [
+            f"{stage} prompts of a {size} course share {row[stage]} tokens (minimum {args.min_tokens})"
+            for stage in args.stages if row[stage] < args.min_tokens
+        ]
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,138 @@
+"""
+Startup benchmark: import time and time to first render of app.py.
+
+Every run uses a fresh interpreter, as a new server process would: it times
+`import streamlit`, the imports of the app's own modules, the first script
+run (what the first visitor waits for, measured with Streamlit's AppTest)
+and a rerun. Runs are repeated with and without run_app.preload() and the
+median is reported. Pass limits to fail when startup regresses.
+
+    python -m benchmarks.bench_startup
+    python -m benchmarks.bench_startup --runs 5 --max-import 0.3 --max-first-render 2.0
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+APP_MODULES = ("utils", "llm", "checkpoints", "lesson_library", "jobs", "outline_parser", "telemetry", "pipeline")
+
+# Runs in the child interpreter; prints one JSON line of timings
+CHILD_SCRIPT = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+timings = {{}}
+started = time.perf_counter()
+import streamlit
+timings["import_streamlit"] = time.perf_counter() - started
+started = time.perf_counter()
+for name in {modules!r}:
+    __import__(name)
+timings["import_app_modules"] = time.perf_counter() - started
+if {preload!r}:
+    from run_app import preload
+    started = time.perf_counter()
+    preload()
+    timings["preload"] = time.perf_counter() - started
+from streamlit.testing.v1 import AppTest
+app = AppTest.from_file({app!r}, default_timeout=120)
+started = time.perf_counter()
+app.run()
+timings["first_render"] = time.perf_counter() - started
+started = time.perf_counter()
+app.run()
+timings["rerun"] = time.perf_counter() - started
+timings["exceptions"] = len(app.exception)
+print(json.dumps(timings))
+"""
+
+METRICS = ("import_streamlit", "import_app_modules", "preload", "first_render", "rerun")
+
+
+def measure(preload, data_dir):
+    """
+    Timings of one fresh interpreter, as a dict.
+    """
+    env = dict(os.environ)
+    env["ACCG_DATA_DIR"] = data_dir
+    # A key makes the first render build the API client, as it would in production
+    env.setdefault("OPENAI_API_KEY", "sk-bench-startup")
+    script = CHILD_SCRIPT.format(
+        root=ROOT, modules=APP_MODULES, preload=preload, app=os.path.join(ROOT, "app.py")
+    )
+    output = subprocess.run(
+        [sys.executable, "-c", script], cwd=ROOT, env=env, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def run_benchmark(args):
+    """
+    Returns {"cold": {...}, "preloaded": {...}} with the median of each metric.
+    """
+    report = {}
+    with tempfile.TemporaryDirectory(prefix="accg-startup-") as data_dir:
+        for label, preload in (("cold", False), ("preloaded", True)):
+            runs = [measure(preload, data_dir) for _ in range(args.runs)]
+            report[label] = {
+                metric: statistics.median(run[metric] for run in runs)
+                for metric in METRICS
+                if metric in runs[0]
+            }
+            report[label]["exceptions"] = max(run["exceptions"] for run in runs)
+    return report
+
+
+def print_report(report):
+    print(f"\n{'':<20} {'cold s':>8} {'preloaded s':>12}")
+    for metric in METRICS:
+        cold = report["cold"].get(metric)
+        warm = report["preloaded"].get(metric)
+        print(f"{metric:<20} {'-' if cold is None else format(cold, '.3f'):>8} "
+              f"{'-' if warm is None else format(warm, '.3f'):>12}")
+
+
+def check_limits(report, args):
+    """
+    Returns the list of exceeded limits (empty when all pass).
+    """
+    failures = []
+    cold = report["cold"]
+    if args.max_import is not None and cold["import_app_modules"] > args.max_import:
+        failures.append(f"app module imports took {cold['import_app_modules']:.3f}s (limit {args.max_import}s)")
+    if args.max_first_render is not None and cold["first_render"] > args.max_first_render:
+        failures.append(f"first render took {cold['first_render']:.3f}s (limit {args.max_first_render}s)")
+    for label, row in report.items():
+        if row["exceptions"]:
+            failures.append(f"{label} run raised {row['exceptions']} exception(s)")
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--runs", type=int, default=3, help="Fresh interpreters per configuration")
+    parser.add_argument("--max-import", type=float, default=None,
+                        help="Fail when the app's own modules take longer than this to import (seconds)")
+    parser.add_argument("--max-first-render", type=float, default=None,
+                        help="Fail when the first cold render takes longer than this (seconds)")
+    parser.add_argument("--json", default=None, help="Also write the report to this file")
+    args = parser.parse_args(argv)
+
+    report = run_benchmark(args)
+    print_report(report)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    failures = check_limits(report, args)
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
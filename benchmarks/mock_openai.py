@@ -0,0 +1,415 @@
+"""
+Local OpenAI-compatible stand-in for offline benchmarks.
+
+Serves POST /v1/chat/completions (plain and streamed) with answers shaped
+like the real pipeline's: TABLER gets an outline with the requested number
+of modules, DICTATOR a JSON dict, COURSIFY a synthetic lesson and QUIZZY a
+synthetic quiz. Latency, token rate, error rate and response sizes are
+configurable, and every answer reports usage.
+
+The files/batches protocol used by `batch.py` is implemented too: uploaded
+JSONL files are processed in the background (`batch_delay` seconds per
+batch) into output and error files.
+
+    python -m benchmarks.mock_openai --port 8765 --latency 0.3 --tokens-per-second 80
+    OPENAI_BASE_URL=http://127.0.0.1:8765/v1 streamlit run app.py
+"""
+import argparse
+import itertools
+import json
+import random
+import re
+import sys
+import threading
+import time
+from email.parser import BytesParser
+from email.policy import HTTP
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from benchmarks.synthetic import synthetic_lesson, synthetic_module_dict, synthetic_quiz
+
+CHARS_PER_TOKEN = 4
+
+
+class MockSettings:
+    """
+    Behaviour of the stand-in server.
+
+    `latency` is the time before the first token, `tokens_per_second` the
+    generation speed (0 for instant), `error_rate` the share of requests
+    answered with a 429 or 500, `lesson_paragraphs`/`quiz_questions` the
+    response sizes, `lessons_per_module` the outline shape and `batch_delay`
+    how long a batch stays in progress.
+    """
+
+    def __init__(self, latency=0.2, tokens_per_second=0.0, error_rate=0.0, lesson_paragraphs=8,
+                 quiz_questions=30, lessons_per_module=5, retry_after=0.1, seed=0, batch_delay=1.0):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        self.error_rate = error_rate
+        self.lesson_paragraphs = lesson_paragraphs
+        self.quiz_questions = quiz_questions
+        self.lessons_per_module = lessons_per_module
+        self.retry_after = retry_after
+        self.seed = seed
+        self.batch_delay = batch_delay
+
+
+def _outline(modules, lessons_per_module):
+    lines = ["# Course Outline", "", "## Curriculum", ""]
+    for module, lessons in synthetic_module_dict(modules, lessons_per_module).items():
+        lines.append(f"**{module}**")
+        lines += [f"- {lesson}" for lesson in lessons]
+        lines.append("")
+    lines += ["## Course Outcomes", "", "- Apply the concepts covered in every module."]
+    return "\n".join(lines)
+
+
+def answer_for(prompt, settings, rng):
+    """
+    Returns the synthetic answer for a prompt, picked by which tool it addresses.
+    """
+    if "You are Tabler" in prompt:
+        match = re.search(r"Modules:\s*(\d+)", prompt)
+        return _outline(int(match.group(1)) if match else 3, settings.lessons_per_module)
+    if "You are DICTator" in prompt:
+        outline = prompt.split("Course Outline:", 1)[-1]
+        modules = len(re.findall(r"Module \d+", outline)) or 3
+        return json.dumps(synthetic_module_dict(modules, settings.lessons_per_module))
+    if "You are Quizzy" in prompt:
+        return synthetic_quiz(rng, settings.quiz_questions)
+    match = re.search(r"^Lesson: (.+)$", prompt, re.MULTILINE) or re.search(r"the lesson '([^']+)'", prompt)
+    return synthetic_lesson(match.group(1) if match else "Lesson", rng, settings.lesson_paragraphs)
+
+
+def completion_for(request, settings, rng):
+    """
+    Returns (answer, usage, finish_reason) for a chat completion request body.
+    An answer over the request's `max_tokens` is cut off with finish_reason
+    "length"; a request continuing an earlier answer (one with an assistant
+    message) gets the rest of a new answer of the same kind.
+    """
+    messages = request.get("messages", [])
+    prompt = "\n".join(str(m.get("content") or "") for m in messages if m.get("role") != "assistant")
+    answer = answer_for(prompt, settings, rng)
+    answered = sum(len(m.get("content") or "") for m in messages if m.get("role") == "assistant")
+    answer = answer[answered:]
+    finish_reason = "stop"
+    max_chars = (request.get("max_tokens") or 0) * CHARS_PER_TOKEN
+    if max_chars and len(answer) > max_chars:
+        answer, finish_reason = answer[:max_chars], "length"
+    usage = {
+        "prompt_tokens": (len(prompt) + answered) // CHARS_PER_TOKEN,
+        "completion_tokens": len(answer) // CHARS_PER_TOKEN,
+    }
+    usage["total_tokens"] = usage["prompt_tokens"] + usage["completion_tokens"]
+    return answer, usage, finish_reason
+
+
+def completion_body(model, answer, usage, finish_reason="stop"):
+    return {
+        "id": "chatcmpl-mock",
+        "object": "chat.completion",
+        "created": int(time.time()),
+        "model": model,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": answer},
+                     "finish_reason": finish_reason}],
+        "usage": usage,
+    }
+
+
+class MockOpenAIHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, *args):
+        pass
+
+    def _send_json(self, status, payload, headers=None):
+        body = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _read_json(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        return json.loads(self.rfile.read(length) or b"{}")
+
+    def _not_found(self):
+        self._send_json(404, {"error": {"message": f"Unknown path {self.path}"}})
+
+    def do_POST(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        if path.endswith("/chat/completions"):
+            self._chat_completions(self._read_json())
+        elif path.endswith("/files"):
+            self._upload_file()
+        elif path.endswith("/batches"):
+            self._create_batch(self._read_json())
+        elif re.search(r"/batches/[^/]+/cancel$", path):
+            self._cancel_batch(path.split("/")[-2])
+        else:
+            self._not_found()
+
+    def do_GET(self):
+        path = self.path.split("?", 1)[0].rstrip("/")
+        match = re.search(r"/(files|batches)/([^/]+)(/content)?$", path)
+        if not match:
+            self._not_found()
+            return
+        kind, object_id, content = match.groups()
+        server = self.server
+        if kind == "files" and content and object_id in server.files:
+            data = server.files[object_id]["data"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data)
+        elif kind == "files" and not content and object_id in server.files:
+            self._send_json(200, server.file_object(object_id))
+        elif kind == "batches" and object_id in server.batches:
+            self._send_json(200, server.batches[object_id])
+        else:
+            self._not_found()
+
+    def _upload_file(self):
+        length = int(self.headers.get("Content-Length") or 0)
+        header = f"Content-Type: {self.headers.get('Content-Type')}\r\n\r\n".encode("latin-1")
+        message = BytesParser(policy=HTTP).parsebytes(header + self.rfile.read(length))
+        fields, data, filename = {}, b"", "upload.jsonl"
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            if name == "file":
+                data = part.get_payload(decode=True) or b""
+                filename = part.get_filename() or filename
+            else:
+                fields[name] = (part.get_payload(decode=True) or b"").decode("utf-8")
+        file_id = self.server.add_file(data, filename, fields.get("purpose", "batch"))
+        self._send_json(200, self.server.file_object(file_id))
+
+    def _create_batch(self, request):
+        server = self.server
+        if request.get("input_file_id") not in server.files:
+            self._send_json(400, {"error": {"message": "Unknown input_file_id"}})
+            return
+        self._send_json(200, server.create_batch(request))
+
+    def _cancel_batch(self, batch_id):
+        batch = self.server.batches.get(batch_id)
+        if batch is None:
+            self._not_found()
+            return
+        if batch["status"] not in ("completed", "failed", "expired", "cancelled"):
+            batch["status"] = "cancelled"
+            batch["cancelled_at"] = int(time.time())
+        self._send_json(200, batch)
+
+    def _chat_completions(self, request):
+        server = self.server
+        settings = server.settings
+        rng = server.next_rng()
+        server.count("requests")
+
+        if settings.error_rate and rng.random() < settings.error_rate:
+            server.count("errors")
+            if rng.random() < 0.5:
+                self._send_json(429, {"error": {"message": "Rate limit reached", "type": "requests"}},
+                                {"retry-after": str(settings.retry_after)})
+            else:
+                self._send_json(500, {"error": {"message": "Internal server error"}})
+            return
+
+        answer, usage, finish_reason = completion_for(request, settings, rng)
+        model = request.get("model", "mock")
+        time.sleep(settings.latency)
+
+        if not request.get("stream"):
+            if settings.tokens_per_second:
+                time.sleep(usage["completion_tokens"] / settings.tokens_per_second)
+            self._send_json(200, completion_body(model, answer, usage, finish_reason))
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Transfer-Encoding", "chunked")
+        self.end_headers()
+        chunk_chars = CHARS_PER_TOKEN * 8
+        for start in range(0, len(answer), chunk_chars):
+            self._send_event({
+                "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+                "model": model,
+                "choices": [{"index": 0, "delta": {"content": answer[start:start + chunk_chars]},
+                             "finish_reason": None}],
+            })
+            if settings.tokens_per_second:
+                time.sleep(8 / settings.tokens_per_second)
+        self._send_event({
+            "id": "chatcmpl-mock", "object": "chat.completion.chunk", "created": int(time.time()),
+            "model": model, "choices": [{"index": 0, "delta": {}, "finish_reason": finish_reason}],
+        })
+        if (request.get("stream_options") or {}).get("include_usage"):
+            self._send_event({"id": "chatcmpl-mock", "object": "chat.completion.chunk",
+                              "created": int(time.time()), "model": model, "choices": [], "usage": usage})
+        self._send_chunk(b"data: [DONE]\n\n")
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+    def _send_event(self, payload):
+        self._send_chunk(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+
+    def _send_chunk(self, data):
+        self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+        self.wfile.flush()
+
+
+class MockOpenAIServer(ThreadingHTTPServer):
+    """
+    Threaded stand-in server; `start()` serves from a daemon thread.
+    """
+
+    daemon_threads = True
+
+    def __init__(self, settings=None, host="127.0.0.1", port=0, handler=MockOpenAIHandler):
+        super().__init__((host, port), handler)
+        self.settings = settings or MockSettings()
+        self.counters = {}
+        self._lock = threading.Lock()
+        self._rng = random.Random(self.settings.seed)
+        self._ids = itertools.count(1)
+        self.files = {}
+        self.batches = {}
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def next_rng(self):
+        with self._lock:
+            return random.Random(self._rng.random())
+
+    def count(self, name):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + 1
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, name="mock-openai", daemon=True).start()
+        return self
+
+    def _new_id(self, prefix):
+        with self._lock:
+            return f"{prefix}-mock{next(self._ids)}"
+
+    def add_file(self, data, filename, purpose):
+        file_id = self._new_id("file")
+        self.files[file_id] = {"data": data, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+        return file_id
+
+    def file_object(self, file_id):
+        f = self.files[file_id]
+        return {"id": file_id, "object": "file", "bytes": len(f["data"]), "created_at": f["created_at"],
+                "filename": f["filename"], "purpose": f["purpose"], "status": "processed"}
+
+    def create_batch(self, request):
+        batch_id = self._new_id("batch")
+        lines = [json.loads(line) for line in self.files[request["input_file_id"]]["data"].splitlines()
+                 if line.strip()]
+        batch = {
+            "id": batch_id,
+            "object": "batch",
+            "endpoint": request.get("endpoint", "/v1/chat/completions"),
+            "input_file_id": request["input_file_id"],
+            "completion_window": request.get("completion_window", "24h"),
+            "status": "validating",
+            "created_at": int(time.time()),
+            "metadata": request.get("metadata"),
+            "output_file_id": None,
+            "error_file_id": None,
+            "request_counts": {"total": len(lines), "completed": 0, "failed": 0},
+        }
+        self.batches[batch_id] = batch
+        self.count("batches")
+        threading.Thread(target=self._process_batch, args=(batch, lines), daemon=True).start()
+        return batch
+
+    def _process_batch(self, batch, lines):
+        settings = self.settings
+        batch["status"] = "in_progress"
+        batch["in_progress_at"] = int(time.time())
+        outputs, errors = [], []
+        delay = settings.batch_delay / max(1, len(lines))
+        for line in lines:
+            if batch["status"] == "cancelled":
+                return
+            rng = self.next_rng()
+            self.count("batch_requests")
+            row = {"id": self._new_id("batch_req"), "custom_id": line.get("custom_id"), "error": None}
+            if settings.error_rate and rng.random() < settings.error_rate:
+                row["response"] = {"status_code": 500, "request_id": row["id"],
+                                   "body": {"error": {"message": "Internal server error", "type": "server_error"}}}
+                errors.append(row)
+                batch["request_counts"]["failed"] += 1
+            else:
+                body = line.get("body") or {}
+                answer, usage, finish_reason = completion_for(body, settings, rng)
+                row["response"] = {"status_code": 200, "request_id": row["id"],
+                                   "body": completion_body(body.get("model", "mock"), answer, usage, finish_reason)}
+                outputs.append(row)
+                batch["request_counts"]["completed"] += 1
+            time.sleep(delay)
+
+        batch["status"] = "finalizing"
+        for key, rows in (("output_file_id", outputs), ("error_file_id", errors)):
+            if rows:
+                data = "".join(json.dumps(row) + "\n" for row in rows).encode("utf-8")
+                batch[key] = self.add_file(data, f"{batch['id']}_{key[:-8]}.jsonl", "batch_output")
+        batch["completed_at"] = int(time.time())
+        batch["status"] = "completed"
+
+
+def add_settings_arguments(parser):
+    parser.add_argument("--latency", type=float, default=0.2, help="Seconds before the first token")
+    parser.add_argument("--tokens-per-second", type=float, default=0.0, help="Generation speed (0 = instant)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Share of requests failing with 429/500")
+    parser.add_argument("--lesson-paragraphs", type=int, default=8, help="Sections per lesson answer")
+    parser.add_argument("--quiz-questions", type=int, default=30, help="Questions per quiz answer")
+    parser.add_argument("--lessons-per-module", type=int, default=5, help="Lessons per module in outlines")
+    parser.add_argument("--batch-delay", type=float, default=1.0, help="Seconds a batch stays in progress")
+    parser.add_argument("--seed", type=int, default=0)
+
+
+def settings_from_args(args):
+    return MockSettings(
+        latency=args.latency,
+        tokens_per_second=args.tokens_per_second,
+        error_rate=args.error_rate,
+        lesson_paragraphs=args.lesson_paragraphs,
+        quiz_questions=args.quiz_questions,
+        lessons_per_module=args.lessons_per_module,
+        seed=args.seed,
+        batch_delay=args.batch_delay,
+    )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local OpenAI-compatible stand-in server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_settings_arguments(parser)
+    args = parser.parse_args(argv)
+
+    server = MockOpenAIServer(settings_from_args(args), args.host, args.port)
+    print(f"Mock OpenAI server on {server.base_url} (Ctrl+C to stop)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""
+Synthetic course content for benchmarks.
+"""
+import random
+
+WORDS = (
+    "variable function loop data structure algorithm module lesson concept example "
+    "practice theory application analysis design system model process result value "
+    "learner instructor context principle method approach pattern problem solution"
+).split()
+
+
+def _sentence(rng, words=14):
+    text = " ".join(rng.choice(WORDS) for _ in range(words))
+    return text[0].upper() + text[1:] + "."
+
+
+def _paragraph(rng, sentences=5):
+    return " ".join(_sentence(rng) for _ in range(sentences))
+
+
+def synthetic_lesson(title, rng, paragraphs=8):
+    """
+    Returns lesson Markdown shaped like a COURSIFY answer (~4-6 KB).
+    """
+    parts = [f"## {title}", "", _paragraph(rng), "", "### Key Terms", ""]
+    parts += [f"- **{rng.choice(WORDS).title()}**: {_sentence(rng, 10)}" for _ in range(5)]
+    for i in range(paragraphs):
+        parts += ["", f"### Section {i + 1}", "", _paragraph(rng)]
+    parts += ["", "```python", "def example(x):", "    return x * 2", "```", "",
+              "Formula: $E = mc^2$", ""]
+    return "\n".join(parts)
+
+
+def synthetic_quiz(rng, questions=30):
+    lines = []
+    for q in range(1, questions + 1):
+        lines.append(f"{q}. {_sentence(rng, 9)[:-1]}?")
+        lines += [f"   {letter}) {_sentence(rng, 4)}" for letter in "abcd"]
+    lines.append("")
+    lines.append("Answer key: " + ", ".join(f"{q}-{rng.choice('abcd')}" for q in range(1, questions + 1)))
+    return "\n".join(lines)
+
+
+def synthetic_module_dict(modules, lessons_per_module=5):
+    return {
+        f"Module {m}: Topic {m}": [f"Lesson {m}.{l}: Subtopic {m}.{l}" for l in range(1, lessons_per_module + 1)]
+        for m in range(1, modules + 1)
+    }
+
+
+def synthetic_outline(modules, lessons_per_module=5, seed=0):
+    """
+    Returns an outline in TABLER's layout: title, details, overview, outcomes
+    and the curriculum of synthetic_module_dict.
+    """
+    rng = random.Random(seed)
+    lines = ["Course Title: Synthetic Course", "",
+             f"Course Details: {modules} modules, {modules * lessons_per_module} lessons, 4 weeks", "",
+             "Course Overview:", _paragraph(rng, 4), "", "Course Outcomes:"]
+    lines += [f"{i}. {_sentence(rng, 12)}" for i in range(1, 6)]
+    lines += ["", "Curriculum Outline:"]
+    for module, lessons in synthetic_module_dict(modules, lessons_per_module).items():
+        lines.append(module)
+        lines += lessons
+    return "\n".join(lines)
+
+
+def synthetic_course(modules, lessons_per_module=5, seed=0):
+    """
+    Returns course Markdown in the same layout as pipeline.generate_course_content.
+    """
+    rng = random.Random(seed)
+    parts = []
+    for module, lessons in synthetic_module_dict(modules, lessons_per_module).items():
+        parts.append(f"# {module}\n\n")
+        for lesson in lessons:
+            parts.append(f"{synthetic_lesson(lesson, rng)}\n\n---\n\n")
+        parts.append(f"## 🧩 Quiz Questions\n{synthetic_quiz(rng)}\n\n\n\n")
+    return "".join(parts)
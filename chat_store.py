@@ -0,0 +1,161 @@
+"""
+Per-session chat history stored as an append-only SQLite table.
+
+Each message is one row keyed by (session_id, id), so saving a message is a
+single insert instead of rewriting the whole history, reads can be paged,
+and sessions never see or overwrite each other's messages. The legacy
+global `shelve` file is imported once into the "legacy" session.
+"""
+import json
+import os
+import shelve
+import threading
+import time
+
+from config import data_path
+from storage import SQLiteStore
+
+LEGACY_SHELVE_PATH = "chat_history"
+LEGACY_SESSION_ID = "legacy"
+DEFAULT_PAGE_SIZE = 50
+
+
+class ChatStore(SQLiteStore):
+    """
+    Append-only chat log with a (session_id, id) index.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT NOT NULL,
+            role TEXT,
+            payload TEXT NOT NULL,
+            created_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages(session_id, id)",
+        "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)",
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or data_path("chat_history.sqlite3"))
+
+    def append(self, session_id, *messages):
+        """
+        Appends messages (dicts with at least "role"/"content") to a session.
+        """
+        now = time.time()
+        self._connect().executemany(
+            "INSERT INTO messages (session_id, role, payload, created_at) VALUES (?, ?, ?, ?)",
+            [(session_id, m.get("role"), json.dumps(m, ensure_ascii=False), now) for m in messages],
+        )
+
+    def count(self, session_id):
+        return self._connect().execute(
+            "SELECT COUNT(*) FROM messages WHERE session_id = ?", (session_id,)
+        ).fetchone()[0]
+
+    def read(self, session_id, limit=None, before_id=None):
+        """
+        Returns (messages, next_before_id) in chronological order.
+
+        Without `limit` the whole session is returned. With `limit` the most
+        recent page is returned; pass the returned `next_before_id` back as
+        `before_id` to fetch the page before it (None when there is none).
+        """
+        conn = self._connect()
+        query = "SELECT id, payload FROM messages WHERE session_id = ?"
+        params = [session_id]
+        if before_id is not None:
+            query += " AND id < ?"
+            params.append(before_id)
+        if limit is None:
+            rows = conn.execute(query + " ORDER BY id ASC", params).fetchall()
+            return [json.loads(payload) for _, payload in rows], None
+
+        rows = conn.execute(query + " ORDER BY id DESC LIMIT ?", params + [limit]).fetchall()
+        rows.reverse()
+        next_before_id = rows[0][0] if len(rows) == limit else None
+        return [json.loads(payload) for _, payload in rows], next_before_id
+
+    def clear(self, session_id):
+        """
+        Deletes every message of a session.
+        """
+        self._connect().execute("DELETE FROM messages WHERE session_id = ?", (session_id,))
+
+    def compact(self, keep_last=None, session_id=None):
+        """
+        Drops all but the `keep_last` newest messages per session (or only for
+        `session_id`), then checkpoints the WAL and reclaims free pages.
+        """
+        conn = self._connect()
+        if keep_last is not None:
+            sessions = [session_id] if session_id else [
+                row[0] for row in conn.execute("SELECT DISTINCT session_id FROM messages")
+            ]
+            for sid in sessions:
+                conn.execute(
+                    "DELETE FROM messages WHERE session_id = ? AND id NOT IN "
+                    "(SELECT id FROM messages WHERE session_id = ? ORDER BY id DESC LIMIT ?)",
+                    (sid, sid, keep_last),
+                )
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        conn.execute("VACUUM")
+
+    def migrate_from_shelve(self, shelve_path=LEGACY_SHELVE_PATH, session_id=LEGACY_SESSION_ID):
+        """
+        Imports the legacy global shelve history once. Returns the number of
+        messages imported (0 if already migrated or nothing to import).
+        """
+        conn = self._connect()
+        marker = f"migrated:{os.path.abspath(shelve_path)}"
+        if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+            return 0
+
+        messages = []
+        if any(os.path.exists(shelve_path + ext) for ext in ("", ".db", ".dat")):
+            try:
+                with shelve.open(shelve_path, flag="r") as db:
+                    messages = list(db.get("messages", []))
+            except Exception as e:
+                print(f"Error reading legacy chat history: {e}")
+                return 0
+
+        messages = [m for m in messages if isinstance(m, dict)]
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Another process may have migrated while we were reading
+            if conn.execute("SELECT 1 FROM meta WHERE key = ?", (marker,)).fetchone():
+                conn.execute("ROLLBACK")
+                return 0
+            if messages:
+                self.append(session_id, *messages)
+            conn.execute("INSERT INTO meta (key, value) VALUES (?, ?)", (marker, str(len(messages))))
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return len(messages)
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_chat_store():
+    """
+    Returns the process-wide chat store, importing the legacy shelve file on first use.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            store = ChatStore()
+            try:
+                store.migrate_from_shelve()
+            except Exception as e:
+                print(f"Error migrating chat history: {e}")
+            _default_store = store
+        return _default_store
@@ -0,0 +1,139 @@
+"""
+Durable per-unit checkpoints for course generation.
+
+Every finished lesson and quiz is written here as soon as it completes, so
+a Streamlit rerun, browser refresh, API error or process restart only costs
+the units that were still running. Failed units are recorded too, which lets
+a later run retry just those.
+"""
+import hashlib
+import json
+import threading
+import time
+
+from config import data_path
+from storage import SQLiteStore
+
+STATUS_DONE = "done"
+STATUS_FAILED = "failed"
+
+
+def make_course_id(course_name, module_dict):
+    """
+    Stable id for a course: the same name and structure resume the same checkpoints.
+    """
+    payload = json.dumps({"course": course_name, "modules": module_dict}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:16]
+
+
+def lesson_key(module, lesson):
+    return f"lesson\x1f{module}\x1f{lesson}"
+
+
+def quiz_key(module):
+    return f"quiz\x1f{module}"
+
+
+class CheckpointStore(SQLiteStore):
+    """
+    SQLite table of generated units keyed by (course_id, unit_key).
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS units (
+            course_id TEXT NOT NULL,
+            unit_key TEXT NOT NULL,
+            status TEXT NOT NULL,
+            content TEXT,
+            error TEXT,
+            updated_at REAL NOT NULL,
+            PRIMARY KEY (course_id, unit_key)
+        )
+        """,
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or data_path("checkpoints.sqlite3"))
+
+    def save(self, course_id, unit_key, content):
+        """
+        Records a successfully generated unit.
+        """
+        self._connect().execute(
+            "INSERT OR REPLACE INTO units (course_id, unit_key, status, content, error, updated_at) "
+            "VALUES (?, ?, ?, ?, NULL, ?)",
+            (course_id, unit_key, STATUS_DONE, content, time.time()),
+        )
+
+    def save_failure(self, course_id, unit_key, error, content=None):
+        """
+        Records a unit that has to be generated again on the next run.
+        """
+        self._connect().execute(
+            "INSERT OR REPLACE INTO units (course_id, unit_key, status, content, error, updated_at) "
+            "VALUES (?, ?, ?, ?, ?, ?)",
+            (course_id, unit_key, STATUS_FAILED, content, str(error) if error else None, time.time()),
+        )
+
+    def load(self, course_id):
+        """
+        Returns {unit_key: content} for the completed units of a course.
+        """
+        rows = self._connect().execute(
+            "SELECT unit_key, content FROM units WHERE course_id = ? AND status = ?",
+            (course_id, STATUS_DONE),
+        )
+        return dict(rows.fetchall())
+
+    def failures(self, course_id):
+        """
+        Returns {unit_key: error} for units whose last attempt failed.
+        """
+        rows = self._connect().execute(
+            "SELECT unit_key, error FROM units WHERE course_id = ? AND status = ?",
+            (course_id, STATUS_FAILED),
+        )
+        return dict(rows.fetchall())
+
+    def copy_units(self, source_id, target_id, keys):
+        """
+        Copies completed units of one course to another. `keys` maps source
+        unit keys to target unit keys; units the target already completed are
+        left alone. Returns the number of units copied.
+        """
+        saved = self.load(source_id)
+        done = self.load(target_id)
+        now = time.time()
+        rows = [
+            (target_id, target_key, STATUS_DONE, saved[source_key], now)
+            for source_key, target_key in keys.items()
+            if source_key in saved and target_key not in done
+        ]
+        self._connect().executemany(
+            "INSERT OR REPLACE INTO units (course_id, unit_key, status, content, error, updated_at) "
+            "VALUES (?, ?, ?, ?, NULL, ?)",
+            rows,
+        )
+        return len(rows)
+
+    def clear_course(self, course_id):
+        """
+        Drops every checkpoint of a course.
+        """
+        self._connect().execute("DELETE FROM units WHERE course_id = ?", (course_id,))
+
+
+_default_store = None
+_default_store_lock = threading.Lock()
+
+
+def get_default_store():
+    """
+    Returns the process-wide checkpoint store.
+    """
+    global _default_store
+    with _default_store_lock:
+        if _default_store is None:
+            _default_store = CheckpointStore()
+        return _default_store
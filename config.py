@@ -0,0 +1,22 @@
+import os
+
+# Directory for local state (response cache, checkpoints, ...). Created on first use.
+DATA_DIR = os.getenv("ACCG_DATA_DIR", ".accg")
+
+
+def env_flag(name, default=False):
+    """
+    Reads a boolean switch from the environment ("1", "true", "yes", "on").
+    """
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in ("1", "true", "yes", "on")
+
+
+def data_path(filename):
+    """
+    Returns the path of a file inside DATA_DIR, creating the directory if needed.
+    """
+    os.makedirs(DATA_DIR, exist_ok=True)
+    return os.path.join(DATA_DIR, filename)
@@ -0,0 +1,97 @@
+"""
+Section index of generated course Markdown.
+
+A course is one long Markdown string. Recording the character offsets of
+its module ("# ") and section ("## ") headings once lets the viewer slice
+out and render a single section at a time instead of the whole course.
+"""
+import re
+
+_HEADING = re.compile(r"^ {0,3}(#{1,6})[ \t]+(.*?)[ \t#]*$")
+_FENCE = re.compile(r"^[ \t]*(```|~~~)")
+
+
+def parse_heading(line):
+    """
+    Returns (level, title) for a Markdown heading line, or None.
+    """
+    heading = _HEADING.match(line.rstrip("\r\n"))
+    if heading and heading.group(2):
+        return len(heading.group(1)), heading.group(2)
+    return None
+
+
+def iter_lines(content):
+    """
+    Yields (line, offset, fenced) for every line of `content`, keeping its
+    line end; `fenced` is True for fenced code blocks and their fences.
+    """
+    offset = 0
+    fence = None
+    for line in content.splitlines(keepends=True):
+        marker = _FENCE.match(line)
+        if marker:
+            if fence is None:
+                fence = marker.group(1)
+            elif marker.group(1) == fence:
+                fence = None
+        yield line, offset, bool(marker) or fence is not None
+        offset += len(line)
+
+
+def iter_headings(content, max_level=2):
+    """
+    Yields (level, title, start, body_start) for every heading up to
+    `max_level` ("#"/"##" by default) outside fenced code blocks; offsets
+    are character positions in `content`.
+    """
+    for line, offset, fenced in iter_lines(content):
+        heading = None if fenced else parse_heading(line)
+        if heading and heading[0] <= max_level:
+            yield heading[0], heading[1], offset, offset + len(line)
+
+
+def index_sections(content, modules=None):
+    """
+    Splits course Markdown into viewer pages, one per "##" section (lessons,
+    quizzes). Returns a list of dicts with module, title, start and end. A
+    module's heading is kept on its first page, and text before a module's
+    first section gets a page of its own.
+
+    When the module names are known, only their "# " headings start a module
+    and any other top-level heading (e.g. a lesson written as "# Title")
+    starts a section.
+    """
+    modules = set(modules) if modules is not None else None
+    pages = []
+
+    def open_page(module, title, start, body_start):
+        pages.append({"module": module, "title": title, "start": start, "end": None, "body_start": body_start})
+
+    module = ""
+    for level, title, start, body_start in iter_headings(content or ""):
+        if level == 1 and (modules is None or title in modules):
+            module = title
+            open_page(module, title, start, body_start)
+            continue
+        page = pages[-1] if pages else None
+        if page is not None and page["title"] == page["module"] and not content[page["body_start"]:start].strip():
+            # Nothing but the module heading so far: the section joins its page
+            page["title"] = title
+            page["body_start"] = body_start
+        else:
+            open_page(module, title, start, body_start)
+
+    if not pages or content[:pages[0]["start"]].strip():
+        pages.insert(0, {"module": "", "title": "Introduction", "start": 0, "end": None, "body_start": 0})
+    for page, following in zip(pages, pages[1:] + [None]):
+        page["end"] = following["start"] if following else len(content or "")
+        del page["body_start"]
+    return [page for page in pages if content[page["start"]:page["end"]].strip()]
+
+
+def section_text(content, section):
+    """
+    The Markdown of one indexed section.
+    """
+    return content[section["start"]:section["end"]]
@@ -0,0 +1,175 @@
+"""
+Document model of a generated course: Course -> Module -> Lesson / Quiz.
+
+The pipeline fills the objects in as units finish. They are slotted and
+only hold titles and generated text; the course Markdown is streamed from
+them chunk by chunk (`iter_markdown`) and joined once, on first use, so
+exporters can walk the structure instead of re-parsing one big string.
+"""
+import hashlib
+
+from content_index import iter_headings
+
+QUIZ_TITLE = "🧩 Quiz Questions"
+LESSON_SEPARATOR = "\n\n---\n\n"
+MODULE_SEPARATOR = "\n\n"
+
+
+class Lesson:
+    """
+    One lesson: its outline title and generated Markdown (None until written).
+    """
+
+    __slots__ = ("title", "content")
+
+    def __init__(self, title, content=None):
+        self.title = title
+        self.content = content
+
+
+class Quiz:
+    """
+    A module's quiz Markdown (None until written).
+    """
+
+    __slots__ = ("content",)
+
+    def __init__(self, content=None):
+        self.content = content
+
+
+class Module:
+    """
+    A module title, its lessons in outline order and its quiz.
+    """
+
+    __slots__ = ("title", "lessons", "quiz")
+
+    def __init__(self, title, lessons=None, quiz=None):
+        self.title = title
+        self.lessons = lessons if lessons is not None else []
+        self.quiz = quiz if quiz is not None else Quiz()
+
+    def iter_markdown(self, quiz=True):
+        """
+        Yields the module's Markdown: heading, lessons and (optionally) quiz.
+        """
+        yield f"# {self.title}\n\n"
+        for lesson in self.lessons:
+            yield f"{lesson.content or ''}{LESSON_SEPARATOR}"
+        if quiz:
+            yield f"## {QUIZ_TITLE}\n{self.quiz.content or ''}\n\n"
+
+    def to_markdown(self, quiz=True):
+        return "".join(self.iter_markdown(quiz))
+
+
+class Course:
+    """
+    A whole course. Texts are joined lazily and cached, so fill it in
+    completely before asking for its Markdown, digest or sections.
+    """
+
+    __slots__ = ("name", "modules", "_markdown", "_stats", "_sections")
+
+    def __init__(self, name, modules=None):
+        self.name = name
+        self.modules = modules if modules is not None else []
+        self._markdown = None
+        self._stats = None
+        self._sections = None
+
+    @classmethod
+    def from_outline(cls, name, module_dict):
+        """
+        An empty course with the structure of a {module: [lessons]} outline.
+        """
+        return cls(name, [
+            Module(module, [Lesson(lesson) for lesson in lessons])
+            for module, lessons in module_dict.items()
+        ])
+
+    @classmethod
+    def from_markdown(cls, text, name="Course"):
+        """
+        Rebuilds a course from Markdown in the layout `iter_markdown` writes
+        (best effort for other Markdown: "# " headings become modules).
+        """
+        text = text or ""
+        starts = [(title, start, body_start) for level, title, start, body_start in iter_headings(text)
+                  if level == 1]
+        if not starts:
+            return cls(name, [Module(name, [Lesson(name, text.strip())])] if text.strip() else [])
+
+        modules = []
+        for index, (title, _, body_start) in enumerate(starts):
+            end = starts[index + 1][1] if index + 1 < len(starts) else len(text)
+            body, _, quiz = text[body_start:end].partition(f"## {QUIZ_TITLE}\n")
+            lessons = []
+            for number, chunk in enumerate(body.split(LESSON_SEPARATOR), 1):
+                chunk = chunk.strip()
+                if not chunk:
+                    continue
+                heading = next(iter_headings(chunk), None)
+                lessons.append(Lesson(heading[1] if heading else f"Lesson {number}", chunk))
+            modules.append(Module(title, lessons, Quiz(quiz.strip() or None)))
+        return cls(name, modules)
+
+    def iter_markdown(self):
+        """
+        Yields the course Markdown chunk by chunk, without joining it.
+        """
+        for module in self.modules:
+            yield from module.iter_markdown()
+            yield MODULE_SEPARATOR
+
+    def to_markdown(self):
+        if self._markdown is None:
+            self._markdown = "".join(self.iter_markdown())
+        return self._markdown
+
+    __str__ = to_markdown
+
+    def _measure(self):
+        if self._stats is None:
+            digest = hashlib.sha256()
+            chars = 0
+            for chunk in self.iter_markdown():
+                digest.update(chunk.encode("utf-8"))
+                chars += len(chunk)
+            self._stats = (digest.hexdigest(), chars)
+        return self._stats
+
+    def digest(self):
+        """
+        SHA-256 of the course Markdown, computed from the chunks.
+        """
+        return self._measure()[0]
+
+    def char_count(self):
+        return self._measure()[1]
+
+    def sections(self):
+        """
+        Viewer pages as content_index.index_sections returns them (module,
+        title, start, end offsets into `to_markdown()`), taken from the
+        structure instead of from the headings.
+        """
+        if self._sections is None:
+            sections = []
+            offset = 0
+            for module in self.modules:
+                chunks = list(module.iter_markdown())
+                titles = [lesson.title for lesson in module.lessons] + [QUIZ_TITLE]
+                # The module heading goes on the first page
+                start = offset
+                offset += len(chunks[0])
+                for title, chunk in zip(titles, chunks[1:]):
+                    offset += len(chunk)
+                    sections.append({"module": module.title, "title": title, "start": start, "end": offset})
+                    start = offset
+                # The blank lines between modules stay with the last page
+                offset += len(MODULE_SEPARATOR)
+                sections[-1]["end"] = offset
+            self._sections = sections
+        return self._sections
@@ -0,0 +1,221 @@
+"""
+Headless batch course generation.
+
+Reads a JSONL manifest with one course config per line, e.g.
+
+    {"course_name": "Intro to SQL", "target_audience": "Beginner", "num_modules": 4}
+
+and generates the courses concurrently, writing Markdown/PDF/PPTX for each
+one and printing per-course throughput and cost. Each course directory
+also gets a trace.jsonl with one telemetry span per API call and export.
+
+    python generate_courses.py courses.jsonl --out-dir output --courses 4
+
+With --batch every outline, lesson and quiz is sent through the provider's
+Batch API instead (cheaper, but results can take up to 24 hours):
+
+    python generate_courses.py catalog.jsonl --batch
+"""
+import argparse
+import json
+import os
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from checkpoints import get_default_store
+from lesson_library import get_default_library
+from llm import create_client
+from batch import BATCH_POLL_SECONDS, generate_courses_batch
+from pipeline import DEFAULT_MAX_WORKERS, export_course, generate_course, safe_filename
+from telemetry import count_api_calls, export_trace, start_metrics_server, summarize
+
+try:
+    from dotenv import load_dotenv
+    load_dotenv()
+except ImportError:
+    pass
+
+
+def load_manifest(path):
+    """
+    Reads course configs from a JSONL file, skipping blank lines.
+    """
+    configs = []
+    with open(path, encoding="utf-8") as f:
+        for line_no, line in enumerate(f, 1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                config = json.loads(line)
+            except json.JSONDecodeError as e:
+                raise SystemExit(f"{path}:{line_no}: invalid JSON ({e})")
+            if not config.get("course_name"):
+                raise SystemExit(f"{path}:{line_no}: missing 'course_name'")
+            configs.append(config)
+    return configs
+
+
+def course_dir_name(config, index):
+    return str(config.get("id") or f"{index:03d}_{safe_filename(config['course_name'])}")
+
+
+def run_course(client, config, args, index):
+    """
+    Generates one course into its own sub-directory and returns a summary row.
+    """
+    course_id = course_dir_name(config, index)
+    out_dir = os.path.join(args.out_dir, course_id)
+    errors = []
+    started = time.perf_counter()
+    try:
+        result = generate_course(
+            client,
+            {k: v for k, v in config.items() if k != "id"},
+            out_dir=out_dir,
+            formats=args.formats,
+            max_workers=args.max_workers,
+            use_cache=not args.no_cache,
+            on_error=lambda label, e: errors.append(f"{label}: {e}"),
+            checkpoints=None if args.no_resume else get_default_store(),
+            library=get_default_library(),
+        )
+    except Exception as e:
+        return {"id": course_id, "ok": False, "error": str(e), "elapsed": time.perf_counter() - started}
+    return summary_row(course_id, out_dir, result, errors)
+
+
+def summary_row(course_id, out_dir, result, errors):
+    """
+    Builds a course's report row and writes its trace next to the files.
+    """
+    usage = summarize(result["trace_id"])
+    os.makedirs(out_dir, exist_ok=True)
+    with open(os.path.join(out_dir, "trace.jsonl"), "w", encoding="utf-8") as f:
+        f.write(export_trace(result["trace_id"]))
+
+    module_dict = result["module_dict"]
+    lessons = sum(len(v) for v in module_dict.values())
+    calls = count_api_calls(result["trace_id"])
+    elapsed = result["timings"]["total"]
+    return {
+        "id": course_id,
+        "ok": True,
+        "modules": len(module_dict),
+        "lessons": lessons,
+        "api_calls": calls,
+        "chars": result["content"].char_count(),
+        "elapsed": elapsed,
+        "calls_per_min": calls / elapsed * 60 if elapsed else 0.0,
+        "chars_per_sec": result["content"].char_count() / elapsed if elapsed else 0.0,
+        "timings": result["timings"],
+        "usage": usage,
+        "cost_usd": sum(row["cost_usd"] for row in usage),
+        "files": result["files"],
+        "errors": errors,
+    }
+
+
+def run_batch(client, configs, args):
+    """
+    Generates every course through the Batch API and returns the summary rows.
+    """
+    errors = [[] for _ in configs]
+    results = generate_courses_batch(
+        client,
+        [{k: v for k, v in config.items() if k != "id"} for config in configs],
+        use_cache=not args.no_cache,
+        checkpoints=get_default_store(),
+        resume=not args.no_resume,
+        max_workers=args.max_workers,
+        poll_seconds=args.batch_poll,
+        on_status=lambda message: print(f"  {message}"),
+        on_error=lambda index, label, e: errors[index].append(f"{label}: {e}"),
+        library=get_default_library(),
+    )
+
+    rows = []
+    for index, (config, result) in enumerate(zip(configs, results)):
+        course_id = course_dir_name(config, index)
+        if "error" in result:
+            rows.append({"id": course_id, "ok": False, "error": result["error"], "elapsed": 0.0})
+            continue
+        out_dir = os.path.join(args.out_dir, course_id)
+        started = time.perf_counter()
+        result["files"] = export_course(result["content"], out_dir, safe_filename(config["course_name"]),
+                                        args.formats, result["trace_id"])
+        result["timings"]["export"] = time.perf_counter() - started
+        result["timings"]["total"] += result["timings"]["export"]
+        rows.append(summary_row(course_id, out_dir, result, errors[index]))
+    return rows
+
+
+def print_report(rows, wall_time):
+    print()
+    print(f"{'course':<40} {'status':<6} {'lessons':>7} {'secs':>8} {'calls/min':>10} {'chars/s':>9} {'cost $':>8}")
+    for row in rows:
+        if row["ok"]:
+            status = "ok" if not row["errors"] else "errors"
+            print(f"{row['id'][:40]:<40} {status:<6} {row['lessons']:>7} {row['elapsed']:>8.1f} "
+                  f"{row['calls_per_min']:>10.1f} {row['chars_per_sec']:>9.0f} {row['cost_usd']:>8.4f}")
+        else:
+            print(f"{row['id'][:40]:<40} {'failed':<6} {'-':>7} {row['elapsed']:>8.1f}   {row['error']}")
+    done = sum(1 for row in rows if row["ok"])
+    print(f"\n{done}/{len(rows)} courses in {wall_time:.1f}s "
+          f"({done / wall_time * 3600 if wall_time else 0:.1f} courses/hour)")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate courses in bulk from a JSONL manifest.")
+    parser.add_argument("manifest", help="JSONL file with one course config per line")
+    parser.add_argument("--out-dir", default="output", help="Directory for generated courses")
+    parser.add_argument("--courses", type=int, default=2, help="Courses generated at the same time")
+    parser.add_argument("--max-workers", type=int, default=DEFAULT_MAX_WORKERS,
+                        help="Parallel API calls per course")
+    parser.add_argument("--formats", nargs="+", default=["md", "pdf", "pptx"], choices=["md", "pdf", "pptx"])
+    parser.add_argument("--no-cache", action="store_true", help="Bypass the response cache")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Regenerate every unit instead of resuming from checkpoints")
+    parser.add_argument("--api-key", default=None, help="Defaults to OPENAI_API_KEY")
+    parser.add_argument("--batch", action="store_true",
+                        help="Submit prompts through the Batch API instead of one request at a time")
+    parser.add_argument("--batch-poll", type=float, default=BATCH_POLL_SECONDS,
+                        help="Seconds between batch status checks")
+    parser.add_argument("--metrics-port", type=int, default=None,
+                        help="Serve Prometheus metrics on this port while running (default ACCG_METRICS_PORT)")
+    args = parser.parse_args(argv)
+
+    start_metrics_server(args.metrics_port)
+
+    client = create_client(args.api_key)
+    if client is None:
+        print("OpenAI client unavailable: install 'openai' and set OPENAI_API_KEY.", file=sys.stderr)
+        return 1
+
+    configs = load_manifest(args.manifest)
+    print(f"Generating {len(configs)} course(s) into {args.out_dir}...")
+
+    started = time.perf_counter()
+    rows = []
+    if args.batch:
+        rows = run_batch(client, configs, args)
+    else:
+        with ThreadPoolExecutor(max_workers=max(1, args.courses)) as executor:
+            futures = [executor.submit(run_course, client, config, args, i) for i, config in enumerate(configs)]
+            for future in as_completed(futures):
+                row = future.result()
+                print(f"  finished {row['id']} in {row['elapsed']:.1f}s" + ("" if row["ok"] else " (failed)"))
+                rows.append(row)
+    wall_time = time.perf_counter() - started
+
+    rows.sort(key=lambda row: row["id"])
+    os.makedirs(args.out_dir, exist_ok=True)
+    with open(os.path.join(args.out_dir, "summary.json"), "w", encoding="utf-8") as f:
+        json.dump({"wall_time": wall_time, "courses": rows}, f, indent=2)
+    print_report(rows, wall_time)
+    return 0 if all(row["ok"] for row in rows) else 2
+
+
+if __name__ == "__main__":
+    sys.exit(main())
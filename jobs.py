@@ -0,0 +1,329 @@
+"""
+Server-side job scheduler shared by all Streamlit sessions.
+
+Long-running work (outline and course generation) is submitted here instead
+of running inside a session's script thread. A bounded pool of worker
+threads takes jobs by priority, and within a priority level round-robins
+between sessions; some workers only take outline jobs, so an outline never
+waits for a course to finish, and only a few prefetch jobs run at a time.
+Sessions poll `Job` objects for status, progress and partial output.
+
+A course job fans out many API calls, so each call also takes a slot from
+the scheduler's CallSlots, handed out the same way: by job priority, then
+round-robin between sessions. One large course can't crowd the calls of
+other sessions out, and some slots are kept free for outline calls.
+"""
+import itertools
+import os
+import threading
+import time
+import uuid
+from collections import OrderedDict, deque
+from contextlib import contextmanager, nullcontext
+
+# Running jobs mostly wait for call slots, so a job worker is cheap; API_SLOTS bounds the calls
+JOB_WORKERS = int(os.getenv("ACCG_JOB_WORKERS", "8"))
+# Extra workers that only run outline jobs
+OUTLINE_WORKERS = int(os.getenv("ACCG_OUTLINE_WORKERS", "1"))
+# Prefetch jobs running at once, across sessions; the other workers stay free for real work
+PREFETCH_JOBS = int(os.getenv("ACCG_PREFETCH_JOBS", "2"))
+JOB_RETENTION_SECONDS = int(os.getenv("ACCG_JOB_RETENTION", "3600"))
+# API calls in flight across all jobs, and how many of them only outline jobs may use
+API_SLOTS = int(os.getenv("ACCG_API_SLOTS", "16"))
+RESERVED_API_SLOTS = int(os.getenv("ACCG_RESERVED_API_SLOTS", "2"))
+
+# Lower runs first
+PRIORITY_OUTLINE = 0
+PRIORITY_CONTENT = 10
+# Speculative work only runs when nothing else is waiting
+PRIORITY_PREFETCH = 20
+
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED_STATES = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    """
+    Raised by a job body to stop early after `Job.cancel_event` was set.
+    """
+
+
+class CallSlots:
+    """
+    Fair semaphore for API calls. Waiting calls are granted free slots by
+    priority, then round-robin between owners (sessions), so an owner with
+    many queued calls gets one slot in turn like everybody else. The last
+    `reserved` slots only go to priority PRIORITY_OUTLINE or better.
+    """
+
+    def __init__(self, slots=API_SLOTS, reserved=RESERVED_API_SLOTS):
+        self._cond = threading.Condition()
+        self.free = max(1, slots)
+        self.reserved = min(max(0, reserved), self.free - 1)
+        # priority -> OrderedDict(owner -> deque of tickets); order is the round-robin turn
+        self._waiting = {}
+
+    def acquire(self, owner, priority=PRIORITY_CONTENT):
+        ticket = [False]
+        with self._cond:
+            self._waiting.setdefault(priority, OrderedDict()).setdefault(owner, deque()).append(ticket)
+            self._grant()
+            while not ticket[0]:
+                self._cond.wait()
+
+    def release(self):
+        with self._cond:
+            self.free += 1
+            self._grant()
+
+    @contextmanager
+    def slot(self, owner, priority=PRIORITY_CONTENT):
+        """
+        Holds one slot for the enclosed block.
+        """
+        self.acquire(owner, priority)
+        try:
+            yield
+        finally:
+            self.release()
+
+    def _grant(self):
+        granted = False
+        for priority in sorted(self._waiting):
+            owners = self._waiting[priority]
+            limit = 0 if priority <= PRIORITY_OUTLINE else self.reserved
+            while owners and self.free > limit:
+                owner, tickets = next(iter(owners.items()))
+                tickets.popleft()[0] = True
+                self.free -= 1
+                granted = True
+                if tickets:
+                    owners.move_to_end(owner)
+                else:
+                    del owners[owner]
+            if not owners:
+                del self._waiting[priority]
+            if self.free <= 0:
+                break
+        if granted:
+            self._cond.notify_all()
+
+
+class Job:
+    """
+    A unit of work plus the status, progress and output a session polls.
+
+    The job body `fn(job)` runs on a scheduler thread and must not call
+    Streamlit; it reports through `update_progress`, `set_partial` and
+    `add_error`, checks `cancel_event`, wraps each API call in `call_slot()`,
+    and returns the result.
+    """
+
+    _sequence = itertools.count()
+
+    def __init__(self, session_id, kind, fn, priority, slots=None):
+        self.id = uuid.uuid4().hex
+        self.session_id = session_id
+        self.kind = kind
+        self.fn = fn
+        self.priority = priority
+        self._slots = slots
+        self.order = next(Job._sequence)
+        self.status = QUEUED
+        self.cancel_event = threading.Event()
+        self._finished_event = threading.Event()
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self.progress = (0, 0, "")
+        self.partial_label = ""
+        self.partial_text = ""
+        self.errors = []
+        self.result = None
+        self.error = None
+
+    @property
+    def finished(self):
+        return self.status in FINISHED_STATES
+
+    def wait(self, timeout=None):
+        """
+        Blocks until the job has finished; a cancelled job only finishes
+        once the calls it has in flight return. Returns False on timeout.
+        """
+        return self._finished_event.wait(timeout)
+
+    def update_progress(self, done, total, label=""):
+        self.progress = (done, total, label)
+
+    def set_partial(self, label, text):
+        self.partial_label, self.partial_text = label, text
+
+    def add_error(self, label, error):
+        self.errors.append(f"{label}: {error}")
+
+    def check_cancelled(self):
+        if self.cancel_event.is_set():
+            raise JobCancelled()
+
+    def call_slot(self):
+        """
+        Context manager holding one of the scheduler's API call slots,
+        granted at this job's priority and in turn with other sessions.
+        """
+        if self._slots is None:
+            return nullcontext()
+        return self._slots.slot(self.session_id, self.priority)
+
+
+class JobScheduler:
+    """
+    Bounded worker pool with priority classes and per-session fair queuing,
+    plus `outline_workers` that only take outline jobs. At most
+    `prefetch_jobs` jobs of PRIORITY_PREFETCH or lower run at once.
+    """
+
+    def __init__(self, max_workers=JOB_WORKERS, outline_workers=OUTLINE_WORKERS, call_slots=None,
+                 prefetch_jobs=PREFETCH_JOBS):
+        self._cond = threading.Condition()
+        self.prefetch_jobs = max(1, prefetch_jobs)
+        self._running_prefetch = 0
+        # priority -> OrderedDict(session_id -> deque of jobs); order is the round-robin turn
+        self._queues = {}
+        self._jobs = {}
+        self.call_slots = call_slots or CallSlots()
+        self._workers = [
+            threading.Thread(target=self._worker_loop, name=f"accg-job-{i}", daemon=True)
+            for i in range(max(1, max_workers))
+        ] + [
+            threading.Thread(target=self._worker_loop, args=(PRIORITY_OUTLINE,), name=f"accg-outline-{i}",
+                             daemon=True)
+            for i in range(max(0, outline_workers))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, session_id, kind, fn, priority=PRIORITY_CONTENT):
+        """
+        Queues `fn(job)` for a session and returns the Job.
+        """
+        job = Job(session_id, kind, fn, priority, self.call_slots)
+        with self._cond:
+            self._prune()
+            self._jobs[job.id] = job
+            sessions = self._queues.setdefault(priority, OrderedDict())
+            sessions.setdefault(session_id, deque()).append(job)
+            # Outline-only workers may not take this job, so wake everyone
+            self._cond.notify_all()
+        return job
+
+    def get(self, job_id):
+        with self._cond:
+            return self._jobs.get(job_id)
+
+    def jobs_for(self, session_id):
+        with self._cond:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+
+    def cancel(self, job_id):
+        """
+        Cancels a queued job immediately, or asks a running one to stop.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.finished:
+                return False
+            job.cancel_event.set()
+            if job.status == QUEUED:
+                # Left in its queue and skipped when reached
+                job.status = CANCELLED
+                job.finished_at = time.time()
+                job._finished_event.set()
+            return True
+
+    def queued_ahead(self, job_id):
+        """
+        Rough number of queued jobs that will start before this one.
+        """
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.status != QUEUED:
+                return 0
+            return sum(
+                1 for other in self._jobs.values()
+                if other.status == QUEUED
+                and (other.priority, other.order) < (job.priority, job.order)
+            )
+
+    def _next_job(self, max_priority=None):
+        for priority in sorted(self._queues):
+            if max_priority is not None and priority > max_priority:
+                return None
+            if priority >= PRIORITY_PREFETCH and self._running_prefetch >= self.prefetch_jobs:
+                return None
+            sessions = self._queues[priority]
+            while sessions:
+                session_id, queue = next(iter(sessions.items()))
+                job = queue.popleft()
+                if queue:
+                    sessions.move_to_end(session_id)
+                else:
+                    del sessions[session_id]
+                if job.status == QUEUED:
+                    return job
+            del self._queues[priority]
+        return None
+
+    def _worker_loop(self, max_priority=None):
+        while True:
+            with self._cond:
+                job = self._next_job(max_priority)
+                while job is None:
+                    self._cond.wait()
+                    job = self._next_job(max_priority)
+                job.status = RUNNING
+                job.started_at = time.time()
+                if job.priority >= PRIORITY_PREFETCH:
+                    self._running_prefetch += 1
+
+            try:
+                job.result = job.fn(job)
+                status = CANCELLED if job.cancel_event.is_set() else DONE
+            except JobCancelled:
+                status = CANCELLED
+            except Exception as e:
+                job.error = e
+                status = FAILED
+
+            with self._cond:
+                job.status = status
+                job.finished_at = time.time()
+                job._finished_event.set()
+                if job.priority >= PRIORITY_PREFETCH:
+                    # A prefetch job queued behind the cap may start now
+                    self._running_prefetch -= 1
+                    self._cond.notify_all()
+
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [j.id for j in self._jobs.values() if j.finished and j.finished_at < cutoff]:
+            del self._jobs[job_id]
+
+
+_scheduler = None
+_scheduler_lock = threading.Lock()
+
+
+def get_scheduler():
+    """
+    Returns the process-wide scheduler, starting its workers on first use.
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = JobScheduler()
+        return _scheduler
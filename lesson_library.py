@@ -0,0 +1,277 @@
+"""
+Library of generated lessons with a MinHash/LSH similarity index.
+
+Every generated lesson is stored with its course and module. Titles are
+normalized into a set of features (words and character 4-grams of the
+lesson title, plus the module and course words as context), summarized as
+a MinHash signature and bucketed by LSH bands, so looking up near-duplicate
+lessons for a new outline is a handful of indexed queries instead of a scan.
+Generic titles ("Key Concepts", "Getting Started") read alike in every
+subject, so a stored lesson only counts as a match when its course shares a
+subject word with the new one.
+Everything is local; no external services are used.
+"""
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+
+from config import data_path
+from storage import SQLiteStore
+
+NUM_PERMUTATIONS = 64
+LSH_BANDS = 16
+LSH_ROWS = NUM_PERMUTATIONS // LSH_BANDS
+# Estimated Jaccard similarity needed to offer a stored lesson for reuse
+REUSE_THRESHOLD = float(os.getenv("ACCG_LESSON_REUSE_THRESHOLD", "0.7"))
+
+_MERSENNE_PRIME = (1 << 61) - 1
+_rng = random.Random(1729)
+_PERMUTATIONS = [
+    (_rng.randrange(1, _MERSENNE_PRIME), _rng.randrange(0, _MERSENNE_PRIME))
+    for _ in range(NUM_PERMUTATIONS)
+]
+
+_NUMBERING = re.compile(r"^\s*(lesson|module|unit|chapter)?\s*[\d.]*\s*[:.\-–)]?\s*", re.IGNORECASE)
+_WORD = re.compile(r"[a-z0-9+#]+")
+STOPWORDS = frozenset(
+    "a an and the of to in on for with into from by at as is are your you our its "
+    "intro introduction basics fundamentals overview part".split()
+)
+# Course title words that say nothing about its subject
+GENERIC_COURSE_WORDS = frozenset(
+    "course class program programme beginner advanced intermediate essential principle guide "
+    "practical applied modern complete master mastering foundation 101 level".split()
+)
+
+
+def normalize_title(title):
+    """
+    Lower-cases a lesson/module title and drops its "Lesson 1.2:" style numbering.
+    """
+    return _NUMBERING.sub("", title or "").strip().lower()
+
+
+def _words(text):
+    words = []
+    for word in _WORD.findall(normalize_title(text)):
+        if word in STOPWORDS:
+            continue
+        # Crude plural folding so "Variables" matches "Variable"
+        if len(word) > 3 and word.endswith("s") and not word.endswith("ss"):
+            word = word[:-1]
+        words.append(word)
+    return words
+
+
+def lesson_features(lesson, module="", course_name=""):
+    """
+    Feature set of a lesson: title words and 4-grams, module and course words.
+    """
+    words = _words(lesson)
+    features = {"w:" + word for word in words}
+    # Sorted so "Data Types and Variables" matches "Variables and Data Types"
+    joined = " ".join(sorted(words))
+    features.update("g:" + joined[i:i + 4] for i in range(max(1, len(joined) - 3)))
+    features.update("m:" + word for word in _words(module))
+    # Course words count twice: the same title in another subject is a weaker match
+    for word in _words(course_name):
+        features.update(("c:" + word, "c2:" + word))
+    return features
+
+
+def subject_words(course_name):
+    """
+    The words of a course name that name its subject.
+    """
+    return {word for word in _words(course_name) if word not in GENERIC_COURSE_WORDS}
+
+
+def same_subject(course_a, course_b):
+    """
+    True when two course names share a subject word.
+    """
+    return bool(subject_words(course_a) & subject_words(course_b))
+
+
+def minhash(features):
+    """
+    MinHash signature (NUM_PERMUTATIONS ints) of a feature set.
+    """
+    if not features:
+        return [_MERSENNE_PRIME] * NUM_PERMUTATIONS
+    hashes = [
+        int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for feature in features
+    ]
+    return [min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in _PERMUTATIONS]
+
+
+def similarity(signature_a, signature_b):
+    """
+    Estimated Jaccard similarity of two signatures.
+    """
+    return sum(1 for a, b in zip(signature_a, signature_b) if a == b) / float(NUM_PERMUTATIONS)
+
+
+def lsh_buckets(signature):
+    """
+    One bucket id per band; similar signatures share at least one bucket.
+    """
+    return [
+        hashlib.blake2b(
+            json.dumps(signature[band * LSH_ROWS:(band + 1) * LSH_ROWS]).encode("ascii"), digest_size=8
+        ).hexdigest()
+        for band in range(LSH_BANDS)
+    ]
+
+
+class LessonLibrary(SQLiteStore):
+    """
+    Generated lessons plus their LSH buckets.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS lessons (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            course_name TEXT NOT NULL,
+            module TEXT NOT NULL,
+            lesson TEXT NOT NULL,
+            content TEXT NOT NULL,
+            signature TEXT NOT NULL,
+            created_at REAL NOT NULL,
+            UNIQUE (course_name, module, lesson)
+        )
+        """,
+        """
+        CREATE TABLE IF NOT EXISTS lesson_buckets (
+            band INTEGER NOT NULL,
+            bucket TEXT NOT NULL,
+            lesson_id INTEGER NOT NULL,
+            PRIMARY KEY (band, bucket, lesson_id)
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_lesson_buckets_lesson ON lesson_buckets(lesson_id)",
+    )
+
+    def __init__(self, path=None):
+        super().__init__(path or data_path("lesson_library.sqlite3"))
+
+    def add(self, course_name, module, lesson, content):
+        """
+        Stores (or replaces) a lesson and indexes it. Re-adding an unchanged
+        lesson is a no-op.
+        """
+        signature = minhash(lesson_features(lesson, module, course_name))
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            row = conn.execute(
+                "SELECT id, content FROM lessons WHERE course_name = ? AND module = ? AND lesson = ?",
+                (course_name, module, lesson),
+            ).fetchone()
+            if row and row[1] == content:
+                conn.execute("COMMIT")
+                return row[0]
+            if row:
+                conn.execute("DELETE FROM lesson_buckets WHERE lesson_id = ?", (row[0],))
+                conn.execute("DELETE FROM lessons WHERE id = ?", (row[0],))
+            lesson_id = conn.execute(
+                "INSERT INTO lessons (course_name, module, lesson, content, signature, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (course_name, module, lesson, content, json.dumps(signature), time.time()),
+            ).lastrowid
+            conn.executemany(
+                "INSERT OR IGNORE INTO lesson_buckets (band, bucket, lesson_id) VALUES (?, ?, ?)",
+                [(band, bucket, lesson_id) for band, bucket in enumerate(lsh_buckets(signature))],
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        return lesson_id
+
+    def count(self):
+        return self._connect().execute("SELECT COUNT(*) FROM lessons").fetchone()[0]
+
+    def find_similar(self, lesson, module="", course_name="", threshold=REUSE_THRESHOLD, limit=3,
+                     exclude_course=None):
+        """
+        Returns up to `limit` stored lessons at least `threshold` similar, best
+        first, as dicts with id, course_name, module, lesson, content and similarity.
+        With a `course_name`, only lessons of courses on the same subject count.
+        """
+        signature = minhash(lesson_features(lesson, module, course_name))
+        conn = self._connect()
+        candidates = set()
+        for band, bucket in enumerate(lsh_buckets(signature)):
+            candidates.update(
+                row[0] for row in conn.execute(
+                    "SELECT lesson_id FROM lesson_buckets WHERE band = ? AND bucket = ?", (band, bucket)
+                )
+            )
+        if not candidates:
+            return []
+
+        # Score on signatures first; only the winners' content is read
+        placeholders = ",".join("?" * len(candidates))
+        scored = []
+        for lesson_id, stored_course, stored_signature in conn.execute(
+            f"SELECT id, course_name, signature FROM lessons WHERE id IN ({placeholders})", list(candidates)
+        ):
+            if exclude_course is not None and stored_course == exclude_course:
+                continue
+            if course_name and not same_subject(course_name, stored_course):
+                continue
+            score = similarity(signature, json.loads(stored_signature))
+            if score >= threshold:
+                scored.append((score, lesson_id))
+        scored.sort(reverse=True)
+
+        matches = []
+        for score, lesson_id in scored[:limit]:
+            stored_course, stored_module, stored_lesson, content = conn.execute(
+                "SELECT course_name, module, lesson, content FROM lessons WHERE id = ?", (lesson_id,)
+            ).fetchone()
+            matches.append({
+                "id": lesson_id,
+                "course_name": stored_course,
+                "module": stored_module,
+                "lesson": stored_lesson,
+                "content": content,
+                "similarity": score,
+            })
+        return matches
+
+    def match_module_dict(self, module_dict, course_name, threshold=REUSE_THRESHOLD):
+        """
+        Best stored match from another course for each lesson of an outline:
+        {(module, lesson): match}. Lessons without a close match are left out.
+        """
+        matches = {}
+        for module, lessons in module_dict.items():
+            for lesson in lessons:
+                found = self.find_similar(lesson, module, course_name, threshold, limit=1,
+                                          exclude_course=course_name)
+                if found:
+                    matches[(module, lesson)] = found[0]
+        return matches
+
+
+_default_library = None
+_default_library_lock = threading.Lock()
+
+
+def get_default_library():
+    """
+    Returns the process-wide lesson library.
+    """
+    global _default_library
+    with _default_library_lock:
+        if _default_library is None:
+            _default_library = LessonLibrary()
+        return _default_library
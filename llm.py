@@ -0,0 +1,404 @@
+"""
+Helpers for talking to the OpenAI chat API.
+
+These functions never touch Streamlit, so they can be called from worker
+threads and from headless scripts as well as from `app.py`. Clients are
+pooled per API key and every request goes through the shared rate limiter
+and retry policy in `rate_limit`. Model, output budget and temperature come
+from the stage's route in `prompts.routing` unless given explicitly.
+"""
+import hashlib
+import importlib.util
+import os
+import threading
+import time
+
+from prompts.registry import MESSAGE_OVERHEAD_TOKENS, REPLY_OVERHEAD_TOKENS, RenderedPrompt, count_tokens
+from prompts.routing import get_route, get_router
+from rate_limit import MAX_RETRIES, backoff_delay, call_with_retries, get_rate_limiter, is_retryable
+from response_cache import get_default_cache, make_key
+from telemetry import record_span
+
+# openai takes ~0.5s to import, so it is only imported with the first client
+HAS_OPENAI = importlib.util.find_spec("openai") is not None
+
+# Stages a user waits on interactively; they may use the rate limiter's reserve
+PRIORITY_STAGES = ("tabler", "dictator")
+# Completion length assumed when reserving rate-limit capacity for unbounded calls
+EXPECTED_OUTPUT_TOKENS = 1000
+
+# Largest output budget a cut-off answer is retried with; the models' output limit
+MAX_OUTPUT_TOKENS = int(os.getenv("ACCG_MAX_OUTPUT_TOKENS", "4096"))
+# Sent after a cut-off streamed answer, which can't be taken back, to have it finished
+CONTINUE_PROMPT = "Continue exactly where your previous answer stopped, without repeating any of it."
+
+REQUEST_TIMEOUT_SECONDS = float(os.getenv("ACCG_REQUEST_TIMEOUT", "120"))
+MAX_CONNECTIONS = int(os.getenv("ACCG_MAX_CONNECTIONS", "64"))
+
+_clients = {}
+_clients_lock = threading.Lock()
+
+
+class TruncatedResponse(Exception):
+    """
+    Raised when an answer still ran into its output budget at
+    MAX_OUTPUT_TOKENS. `content` is the cut-off text; it is not cached.
+    """
+
+    def __init__(self, message, content=""):
+        super().__init__(message)
+        self.content = content
+
+
+def _pool_key(api_key):
+    return hashlib.sha256(api_key.encode("utf-8")).hexdigest()[:16]
+
+
+def _new_client(api_key):
+    from openai import OpenAI
+
+    # The HTTP library openai is built on; used to size the keep-alive connection pool
+    try:
+        import httpx
+    except ImportError:
+        httpx = None
+    kwargs = {"api_key": api_key, "max_retries": 0, "timeout": REQUEST_TIMEOUT_SECONDS}
+    if httpx is not None:
+        kwargs["http_client"] = httpx.Client(
+            limits=httpx.Limits(max_connections=MAX_CONNECTIONS, max_keepalive_connections=MAX_CONNECTIONS),
+            timeout=REQUEST_TIMEOUT_SECONDS,
+        )
+    return OpenAI(**kwargs)
+
+
+def create_client(api_key=None):
+    """
+    Returns the shared OpenAI client for `api_key` (or OPENAI_API_KEY), or
+    None when no key is available or the library is missing. One client,
+    and so one keep-alive connection pool, exists per key in the process.
+    Retries are handled here rather than by the client.
+    """
+    key = api_key or os.getenv("OPENAI_API_KEY")
+    if not key or not HAS_OPENAI:
+        return None
+    pool_key = _pool_key(key)
+    with _clients_lock:
+        if pool_key not in _clients:
+            _clients[pool_key] = _new_client(key)
+        return _clients[pool_key]
+
+
+def _limiter_for(client, model=None):
+    api_key = getattr(client, "api_key", None)
+    pool = _pool_key(api_key) if isinstance(api_key, str) else "default"
+    # Providers limit each model separately, so a fallback model has its own capacity
+    return get_rate_limiter(f"{pool}:{model}" if model else pool)
+
+
+def resolve_route(stage, model=None, temperature=None, max_tokens=None):
+    """
+    Returns (route, model, temperature, max_tokens) for a call of `stage`.
+    Explicit arguments win over the route; otherwise the router picks the
+    route's model or, while that one is degraded, its fallback.
+    """
+    route = get_route(stage)
+    return (
+        route,
+        model or get_router().choose(route),
+        route.temperature if temperature is None else temperature,
+        route.max_tokens if max_tokens is None else max_tokens,
+    )
+
+
+def _create(client, call, messages, **extra):
+    kwargs = {"model": call["model"], "messages": messages, "temperature": call["temperature"]}
+    if call["max_tokens"]:
+        kwargs["max_tokens"] = call["max_tokens"]
+    kwargs.update(extra)
+    return client.chat.completions.create(**kwargs)
+
+
+def _is_timeout(error):
+    return "Timeout" in type(error).__name__ or getattr(error, "status_code", None) == 408
+
+
+def _fallback_for(client, route, call, fn, started):
+    """
+    `call_with_retries` fallback for a routed call: reports rate limits and
+    timeouts to the router and moves the call to the route's fallback model
+    instead of backing off. Other errors are retried on the same model.
+    """
+    router = get_router()
+
+    def fallback(error):
+        if getattr(error, "status_code", None) == 429:
+            router.record_rate_limit(call["model"])
+        elif _is_timeout(error):
+            router.record_latency(route, call["model"], time.perf_counter() - started)
+        else:
+            return None
+        if call["pinned"] or not route.fallback_model or call["model"] == route.fallback_model:
+            return None
+        call["model"] = route.fallback_model
+        return fn, _limiter_for(client, call["model"])
+
+    return fallback
+
+
+def _record_outcome(route, call, started):
+    # Latency of a call that switched models mid-way says nothing about either model
+    if not call["pinned"] and call["model"] == call["first_model"]:
+        get_router().record_latency(route, call["model"], time.perf_counter() - started)
+
+
+def _route_fields(route, call):
+    fields = {"model": call["model"], "max_tokens": call["max_tokens"]}
+    if call["model"] != route.model and not call["pinned"]:
+        fields["fallback"] = True
+    return fields
+
+
+def _usage(response):
+    """
+    Returns (prompt_tokens, completion_tokens, cached_prompt_tokens) reported
+    by the API; unknown values are None.
+    """
+    usage = getattr(response, "usage", None)
+    if usage is None:
+        return None, None, None
+    details = getattr(usage, "prompt_tokens_details", None)
+    return (
+        getattr(usage, "prompt_tokens", None),
+        getattr(usage, "completion_tokens", None),
+        getattr(details, "cached_tokens", None),
+    )
+
+
+def prepare_request(prompt, system=None):
+    """
+    Returns (messages, system, user, prompt_tokens) for a prompt.
+
+    `prompt` is either a RenderedPrompt from the prompts registry (sent as
+    system + user messages) or plain text, sent as one user message after
+    the optional `system` text. Tokens are counted locally.
+    """
+    if isinstance(prompt, RenderedPrompt):
+        return prompt.messages, prompt.system, prompt.user, prompt.token_count
+    messages = [{"role": "user", "content": prompt}]
+    tokens = count_tokens(prompt) + MESSAGE_OVERHEAD_TOKENS + REPLY_OVERHEAD_TOKENS
+    if system:
+        messages.insert(0, {"role": "system", "content": system})
+        tokens += count_tokens(system) + MESSAGE_OVERHEAD_TOKENS
+    return messages, system, prompt, tokens
+
+
+def _grown_budget(max_tokens):
+    """
+    Output budget to retry a cut-off answer with: twice `max_tokens`, up to
+    MAX_OUTPUT_TOKENS. None when it can't grow (also for unbounded calls).
+    """
+    if not max_tokens or max_tokens >= MAX_OUTPUT_TOKENS:
+        return None
+    return min(2 * max_tokens, MAX_OUTPUT_TOKENS)
+
+
+def _truncated(stage, max_tokens, content):
+    return TruncatedResponse(f"{stage} answer was cut off at {max_tokens} output tokens", content)
+
+
+def _plan_call(stage, model, temperature, max_tokens):
+    route, chosen, temperature, max_tokens = resolve_route(stage, model, temperature, max_tokens)
+    call = {"model": chosen, "first_model": chosen, "temperature": temperature,
+            "max_tokens": max_tokens, "pinned": model is not None}
+    return route, call
+
+
+def complete(client, prompt, model=None, temperature=None, use_cache=True,
+             stage="chat", trace_id=None, label=None, system=None, max_tokens=None):
+    """
+    Sends a single-turn chat request and returns the response text.
+    `prompt` is a RenderedPrompt (system + user messages) or plain text
+    with an optional `system` message. `model`, `temperature` and
+    `max_tokens` default to the route of `stage`.
+    Identical requests are answered from the on-disk response cache unless
+    `use_cache` is False. Rate limits, timeouts and 5xx errors are retried
+    with backoff (rate limits and timeouts of a routed call move to the
+    route's fallback model right away); other API errors are raised.
+    An answer cut off by its output budget is requested again with twice
+    the budget, up to MAX_OUTPUT_TOKENS, after which TruncatedResponse is
+    raised; cut-off answers are never cached.
+
+    Every call is recorded as a telemetry span under `stage` and `trace_id`.
+    """
+    started = time.perf_counter()
+    route, call = _plan_call(stage, model, temperature, max_tokens)
+    messages, system, user, prompt_tokens_estimate = prepare_request(prompt, system)
+    cache = get_default_cache() if use_cache else None
+    key = make_key(call["model"], call["temperature"], user, system, call["max_tokens"]) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            record_span(stage, trace_id, label=label, cached=True, latency=time.perf_counter() - started,
+                        prompt_tokens=0, completion_tokens=0, **_route_fields(route, call))
+            return cached
+
+    def request():
+        return _create(client, call, messages)
+
+    fallback = _fallback_for(client, route, call, request, started)
+    while True:
+        attempt_started = time.perf_counter()
+        retries = []
+        try:
+            response = call_with_retries(
+                request,
+                limiter=_limiter_for(client, call["model"]),
+                estimated_tokens=prompt_tokens_estimate + (call["max_tokens"] or EXPECTED_OUTPUT_TOKENS),
+                on_retry=lambda attempt, error, delay: retries.append(attempt),
+                fallback=fallback,
+                priority=stage in PRIORITY_STAGES,
+            )
+        except Exception as e:
+            record_span(stage, trace_id, label=label, latency=time.perf_counter() - attempt_started,
+                        retries=len(retries), error=str(e), **_route_fields(route, call))
+            raise
+        _record_outcome(route, call, attempt_started)
+        choice = response.choices[0]
+        content = choice.message.content
+        truncated = getattr(choice, "finish_reason", None) == "length"
+
+        prompt_tokens, completion_tokens, cached_tokens = _usage(response)
+        record_span(
+            stage, trace_id, label=label, latency=time.perf_counter() - attempt_started,
+            prompt_tokens=prompt_tokens if prompt_tokens is not None else prompt_tokens_estimate,
+            completion_tokens=completion_tokens if completion_tokens is not None else count_tokens(content),
+            cached_prompt_tokens=cached_tokens, estimated_usage=prompt_tokens is None, retries=len(retries),
+            truncated=truncated, **_route_fields(route, call),
+        )
+        # A cut-off answer is asked for again with a larger budget
+        budget = _grown_budget(call["max_tokens"]) if truncated else None
+        if budget is None:
+            break
+        call["max_tokens"] = budget
+
+    if truncated:
+        raise _truncated(stage, call["max_tokens"], content)
+    if cache and content:
+        cache.set(key, content)
+    return content
+
+
+def stream_complete(client, prompt, model=None, temperature=None, use_cache=True,
+                    stage="chat", trace_id=None, label=None, system=None, max_tokens=None):
+    """
+    Streaming variant of `complete`: yields text chunks as the API produces them.
+    A cache hit is yielded as a single chunk; a finished stream is written back
+    to the cache so later calls can be answered instantly. Opening the stream
+    is retried like `complete`; a stream that breaks before its first chunk
+    is reopened from the same attempt budget. Text already yielded can't be
+    requested again, so an answer cut off by its output budget is continued
+    by a follow-up request instead, until the total budget reaches
+    MAX_OUTPUT_TOKENS and TruncatedResponse is raised.
+
+    The span also records the time to first token (`ttft`). Usage is requested
+    with the final chunk and estimated locally if the server doesn't send it.
+    """
+    started = time.perf_counter()
+    route, call = _plan_call(stage, model, temperature, max_tokens)
+    messages, system, user, prompt_tokens_estimate = prepare_request(prompt, system)
+    cache = get_default_cache() if use_cache else None
+    key = make_key(call["model"], call["temperature"], user, system, call["max_tokens"]) if cache else None
+    if cache:
+        cached = cache.get(key)
+        if cached is not None:
+            elapsed = time.perf_counter() - started
+            record_span(stage, trace_id, label=label, cached=True, latency=elapsed, ttft=elapsed,
+                        prompt_tokens=0, completion_tokens=0, **_route_fields(route, call))
+            yield cached
+            return
+
+    # Grows by the cut-off answer and CONTINUE_PROMPT when an answer has to be continued
+    request_messages = list(messages)
+    request_tokens = prompt_tokens_estimate
+
+    def request():
+        return _create(client, call, request_messages, stream=True, stream_options={"include_usage": True})
+
+    fallback = _fallback_for(client, route, call, request, started)
+    parts = []
+    ttft = None
+    budget = call["max_tokens"]
+    while True:
+        attempt_started = time.perf_counter()
+        first_part = len(parts)
+        # One attempt budget for opening the stream and for streams that break before any text
+        retries = []
+        usage = None
+        finish_reason = None
+        while True:
+            try:
+                stream = call_with_retries(
+                    request,
+                    limiter=_limiter_for(client, call["model"]),
+                    estimated_tokens=prompt_tokens_estimate + (call["max_tokens"] or EXPECTED_OUTPUT_TOKENS),
+                    first_attempt=len(retries),
+                    on_retry=lambda attempt, error, delay: retries.append(attempt),
+                    fallback=fallback,
+                    priority=stage in PRIORITY_STAGES,
+                )
+            except Exception as e:
+                record_span(stage, trace_id, label=label, latency=time.perf_counter() - attempt_started,
+                            retries=len(retries), error=str(e), **_route_fields(route, call))
+                raise
+            try:
+                for chunk in stream:
+                    if getattr(chunk, "usage", None) is not None:
+                        usage = chunk
+                    if not chunk.choices:
+                        continue
+                    finish_reason = getattr(chunk.choices[0], "finish_reason", None) or finish_reason
+                    delta = chunk.choices[0].delta.content
+                    if delta:
+                        if ttft is None:
+                            ttft = time.perf_counter() - started
+                        parts.append(delta)
+                        yield delta
+                break
+            except Exception as e:
+                # Once text has been shown it can't be taken back, so only reopen empty streams
+                if len(parts) > first_part or len(retries) >= MAX_RETRIES or not is_retryable(e):
+                    record_span(stage, trace_id, label=label, latency=time.perf_counter() - attempt_started,
+                                ttft=ttft, retries=len(retries), error=str(e), **_route_fields(route, call))
+                    raise
+                time.sleep(backoff_delay(len(retries), e))
+                retries.append(len(retries) + 1)
+
+        _record_outcome(route, call, attempt_started)
+        content = "".join(parts)
+        truncated = finish_reason == "length"
+        prompt_tokens, completion_tokens, cached_tokens = _usage(usage)
+        record_span(
+            stage, trace_id, label=label, latency=time.perf_counter() - attempt_started, ttft=ttft,
+            prompt_tokens=prompt_tokens if prompt_tokens is not None else prompt_tokens_estimate,
+            completion_tokens=(completion_tokens if completion_tokens is not None
+                               else count_tokens("".join(parts[first_part:]))),
+            cached_prompt_tokens=cached_tokens, estimated_usage=prompt_tokens is None, retries=len(retries),
+            truncated=truncated, **_route_fields(route, call),
+        )
+        # The text already yielded stands, so a cut-off answer is continued
+        # with the budget grown by what the next request may add
+        grown = _grown_budget(budget) if truncated else None
+        if grown is None:
+            break
+        call["max_tokens"], budget = grown - budget, grown
+        request_messages[len(messages):] = [
+            {"role": "assistant", "content": content},
+            {"role": "user", "content": CONTINUE_PROMPT},
+        ]
+        prompt_tokens_estimate = request_tokens + count_tokens(content) + count_tokens(CONTINUE_PROMPT) + \
+            2 * MESSAGE_OVERHEAD_TOKENS
+
+    if truncated:
+        raise _truncated(stage, budget, content)
+    if cache and content:
+        cache.set(key, content)
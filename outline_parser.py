@@ -0,0 +1,95 @@
+"""
+Local parser for TABLER outlines.
+
+TABLER is prompted to list the curriculum as "Module N" lines followed by
+"Lesson N.M" lines, so the {module: [lessons]} dictionary can usually be
+read straight from the text without a DICTATOR round trip.
+"""
+import re
+
+# Markdown decoration that may surround a module/lesson line
+_LEADING_MARKUP = re.compile(r"^(?:#{1,6}\s*|>\s*|[-*+•]\s+|\d+[.)]\s+)+")
+_EMPHASIS = re.compile(r"(\*\*|__|\*|`)")
+
+_MODULE_LINE = re.compile(r"^module\s+(\d+)\b\s*(?:\([^)]*\))?\s*[:.\-–—|]*\s*(.*)$", re.IGNORECASE)
+# The number is followed by a separator or the end of the line, so prose like
+# "Lesson 1.1 will teach you..." isn't taken for a lesson
+_LESSON_LINE = re.compile(
+    r"^lesson\s+(\d+(?:\.\d+)*)(?!\.?\d)\s*(?:\([^)]*\))?\s*(?:$|[:.\-–—|]+\s*(.*)$)", re.IGNORECASE
+)
+
+
+def _clean_line(line):
+    """
+    Strips headings, bullets, list numbers and emphasis markers from a line.
+    """
+    line = line.strip()
+    line = _LEADING_MARKUP.sub("", line)
+    line = _EMPHASIS.sub("", line)
+    line = _LEADING_MARKUP.sub("", line.strip())
+    return re.sub(r"\s+", " ", line).strip()
+
+
+def _label(kind, number, title):
+    title = title.strip().rstrip(":").strip()
+    return f"{kind} {number}: {title}" if title else f"{kind} {number}"
+
+
+def parse_outline_structure(outline):
+    """
+    Extracts {"Module N: Title": ["Lesson N.M: Title", ...]} from an outline.
+
+    Tolerates markdown headings, bullets, numbering and bold/italic markers.
+    A "Module N" or "Lesson N.M" line without a title takes the next line as
+    its title, and a lesson listed twice in a module is kept once.
+    Modules without any lessons (e.g. a stray "Module 1 introduces..." line in
+    the overview) are dropped. Returns None when no module with lessons is
+    found, so the caller can fall back to the DICTATOR prompt.
+    """
+    if not outline:
+        return None
+
+    module_dict = {}
+    current = None
+    untitled_number = None
+    untitled_lesson = None
+    for raw_line in outline.splitlines():
+        line = _clean_line(raw_line)
+        if not line:
+            continue
+
+        match = _MODULE_LINE.match(line)
+        if match:
+            current = _label("Module", match.group(1), match.group(2))
+            module_dict.setdefault(current, [])
+            untitled_number = None if match.group(2) else match.group(1)
+            untitled_lesson = None
+            continue
+
+        match = _LESSON_LINE.match(line)
+        if match and current is not None:
+            lesson = _label("Lesson", match.group(1), match.group(2) or "")
+            # A repeated curriculum (e.g. a summary table) must not list a lesson twice
+            if lesson not in module_dict[current]:
+                module_dict[current].append(lesson)
+                untitled_lesson = None if match.group(2) else match.group(1)
+            else:
+                untitled_lesson = None
+            untitled_number = None
+        elif untitled_lesson:
+            # "Lesson 1.1" on its own line, title on the next one
+            lessons = module_dict[current]
+            lessons.remove(_label("Lesson", untitled_lesson, ""))
+            lesson = _label("Lesson", untitled_lesson, line)
+            if lesson not in lessons:
+                lessons.append(lesson)
+            untitled_lesson = None
+        elif untitled_number and not module_dict[current] and list(module_dict)[-1] == current:
+            # "Module 2" on its own line, title on the next one
+            del module_dict[current]
+            current = _label("Module", untitled_number, line)
+            module_dict.setdefault(current, [])
+            untitled_number = None
+
+    module_dict = {module: lessons for module, lessons in module_dict.items() if lessons}
+    return module_dict or None
@@ -0,0 +1,367 @@
+"""
+Structure-aware PDF export for generated courses.
+
+The course (a course_model.Course, or Markdown split at its "# " headings)
+is walked one module at a time and each block (heading, paragraph, list
+item, code block, table row, rule) is drawn as soon as it is parsed, so no
+intermediate representation of the whole course is ever built. A Unicode
+TrueType font is embedded when one can be found; otherwise the core PDF
+fonts are used and text is ASCII-folded as before.
+"""
+import os
+import re
+
+from content_index import iter_headings
+from course_model import Course
+from utils import clean_text
+
+# Try importing FPDF (fpdf2, or the legacy PyFPDF 1.x)
+try:
+    from fpdf import FPDF, FPDF_VERSION
+    LEGACY_FPDF = FPDF_VERSION.startswith("1.")
+except ImportError:
+    FPDF = None
+    LEGACY_FPDF = False
+
+# Font files searched for, in order. ACCG_PDF_FONT / ACCG_PDF_FONT_DIR take precedence.
+FONT_DIRS = [
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "fonts"),
+    "/usr/share/fonts/truetype/dejavu",
+    "/usr/share/fonts/dejavu",
+    "/usr/share/fonts/TTF",
+    "/Library/Fonts",
+    "C:\\Windows\\Fonts",
+]
+FONT_FILES = {
+    "regular": "DejaVuSans.ttf",
+    "bold": "DejaVuSans-Bold.ttf",
+    "mono": "DejaVuSansMono.ttf",
+}
+
+HEADING_SIZES = {1: 20, 2: 16, 3: 14, 4: 12, 5: 12, 6: 12}
+BODY_SIZE = 11
+CODE_SIZE = 9
+LINE_HEIGHT = 6
+WIDTH_CACHE_SIZE = 50000
+
+_HEADING = re.compile(r"^(#{1,6})\s+(.*)$")
+_LIST_ITEM = re.compile(r"^(\s*)([-*+•]|\d+[.)])\s+(.*)$")
+_RULE = re.compile(r"^\s*([-*_])(\s*\1){2,}\s*$")
+_TABLE_SEPARATOR = re.compile(r"^\s*\|?\s*:?-{2,}:?\s*(\|\s*:?-{2,}:?\s*)*\|?\s*$")
+_LINK = re.compile(r"\[([^\]]+)\]\(([^)]+)\)")
+_EMPHASIS = re.compile(r"(\*\*|__|`)")
+_ASTRAL = re.compile("[\U00010000-\U0010FFFF]")
+_SINGLE_EMPHASIS = re.compile(r"(?<![\w*])[*_](?=\S)(.+?)(?<=\S)[*_](?![\w*])")
+
+
+def find_unicode_fonts():
+    """
+    Returns {"regular", "bold", "mono": path} for an available Unicode font
+    family, or None if no regular font is found.
+    """
+    override = os.getenv("ACCG_PDF_FONT")
+    if override and os.path.exists(override):
+        return {"regular": override, "bold": override, "mono": override}
+
+    dirs = list(FONT_DIRS)
+    if os.getenv("ACCG_PDF_FONT_DIR"):
+        dirs.insert(0, os.getenv("ACCG_PDF_FONT_DIR"))
+    for directory in dirs:
+        regular = os.path.join(directory, FONT_FILES["regular"])
+        if not os.path.exists(regular):
+            continue
+        fonts = {"regular": regular}
+        for style in ("bold", "mono"):
+            path = os.path.join(directory, FONT_FILES[style])
+            fonts[style] = path if os.path.exists(path) else regular
+        return fonts
+    return None
+
+
+def iter_modules(content):
+    """
+    Yields the course one module at a time, splitting before each "# "
+    heading outside fenced code blocks.
+    """
+    starts = [start for level, _, start, _ in iter_headings(content) if level == 1]
+    if not starts or starts[0] != 0:
+        starts.insert(0, 0)
+    for i, start in enumerate(starts):
+        end = starts[i + 1] if i + 1 < len(starts) else len(content)
+        chunk = content[start:end]
+        if chunk.strip():
+            yield chunk
+
+
+def iter_blocks(markdown):
+    """
+    Yields (kind, data) blocks from a chunk of Markdown:
+    ("heading", (level, text)), ("paragraph", text), ("item", (indent, marker, text)),
+    ("code", text), ("table", text), ("rule", None).
+    """
+    paragraph = []
+    code = None
+
+    def flush():
+        if paragraph:
+            text = " ".join(line.strip() for line in paragraph)
+            paragraph.clear()
+            return ("paragraph", text)
+        return None
+
+    for line in markdown.splitlines():
+        if code is not None:
+            if line.strip().startswith("```"):
+                yield ("code", "\n".join(code))
+                code = None
+            else:
+                code.append(line)
+            continue
+
+        stripped = line.strip()
+        if stripped.startswith("```"):
+            block = flush()
+            if block:
+                yield block
+            code = []
+            continue
+        if not stripped:
+            block = flush()
+            if block:
+                yield block
+            continue
+
+        heading = _HEADING.match(stripped)
+        item = _LIST_ITEM.match(line)
+        if heading or item or _RULE.match(line) or stripped.startswith("|"):
+            block = flush()
+            if block:
+                yield block
+            if heading:
+                yield ("heading", (len(heading.group(1)), heading.group(2).strip()))
+            elif _RULE.match(line):
+                yield ("rule", None)
+            elif stripped.startswith("|"):
+                if not _TABLE_SEPARATOR.match(stripped):
+                    yield ("table", stripped)
+            else:
+                indent = len(item.group(1).expandtabs(4)) // 2
+                yield ("item", (indent, item.group(2), item.group(3)))
+            continue
+
+        paragraph.append(line)
+
+    if code is not None:
+        yield ("code", "\n".join(code))
+    block = flush()
+    if block:
+        yield block
+
+
+def strip_inline(text):
+    """
+    Removes inline Markdown markers and turns links into "text (url)".
+    """
+    text = _LINK.sub(r"\1 (\2)", text)
+    text = _EMPHASIS.sub("", text)
+    return _SINGLE_EMPHASIS.sub(r"\1", text)
+
+
+if FPDF is not None:
+    class CoursePDF(FPDF):
+        """
+        FPDF document with page numbers in the footer.
+        """
+
+        def footer(self):
+            self.set_y(-15)
+            self.set_font(self.body_family, "", 8)
+            self.cell(0, 10, f"Page {self.page_no()}", align="C")
+
+
+class CoursePDFRenderer:
+    """
+    Draws parsed Markdown blocks onto a CoursePDF.
+
+    Text is wrapped here with cached word widths and written line by line
+    with `cell`, which keeps rendering linear in the text length (FPDF's own
+    `multi_cell` re-measures the line on every character).
+    """
+
+    def __init__(self, title="Course Content"):
+        if FPDF is None:
+            raise RuntimeError("fpdf is not installed")
+        self.pdf = CoursePDF()
+        self.pdf.set_auto_page_break(True, margin=20)
+        self.unicode = self._register_fonts()
+        self.pdf.body_family = self.body_family
+        self.title = title
+        self._widths = {}
+
+    def _register_fonts(self):
+        fonts = find_unicode_fonts()
+        if fonts:
+            try:
+                # PyFPDF needs uni=True for TrueType fonts; fpdf2 deprecates it
+                extra = {"uni": True} if LEGACY_FPDF else {}
+                self.pdf.add_font("CourseSans", "", fonts["regular"], **extra)
+                self.pdf.add_font("CourseSans", "B", fonts["bold"], **extra)
+                self.pdf.add_font("CourseMono", "", fonts["mono"], **extra)
+                self.body_family, self.mono_family = "CourseSans", "CourseMono"
+                return True
+            except Exception as e:
+                print(f"Error loading PDF font, using core fonts: {e}")
+        self.body_family, self.mono_family = "Arial", "Courier"
+        return False
+
+    def text(self, value):
+        value = value.replace("\t", "    ")
+        if not self.unicode:
+            return clean_text(value)
+        # Characters outside the Basic Multilingual Plane (emoji) aren't in the embedded font
+        return _ASTRAL.sub("", value)
+
+    def set_font(self, family, style, size):
+        self.pdf.set_font(family, style, size)
+        self._font_widths = self._widths.setdefault((family, style, size), {})
+
+    def width(self, word):
+        widths = self._font_widths
+        value = widths.get(word)
+        if value is None:
+            if len(widths) > WIDTH_CACHE_SIZE:
+                widths.clear()
+            value = widths[word] = self.pdf.get_string_width(word)
+        return value
+
+    def wrap(self, text, max_width):
+        """
+        Greedy word wrap of one line of text to `max_width` (in user units).
+        """
+        space = self.width(" ")
+        lines, current, current_width = [], [], 0.0
+        for word in text.split(" "):
+            word_width = self.width(word)
+            if word_width > max_width:
+                # Hard-break words that can't fit on a line of their own
+                if current:
+                    lines.append(" ".join(current))
+                    current, current_width = [], 0.0
+                piece = ""
+                for char in word:
+                    if piece and self.pdf.get_string_width(piece + char) > max_width:
+                        lines.append(piece)
+                        piece = ""
+                    piece += char
+                word, word_width = piece, self.width(piece)
+            extra = word_width + (space if current else 0)
+            if current and current_width + extra > max_width:
+                lines.append(" ".join(current))
+                current, current_width = [word], word_width
+            else:
+                current.append(word)
+                current_width += extra
+        lines.append(" ".join(current))
+        return lines
+
+    def write_lines(self, text, height, indent=0, fill=False):
+        """
+        Writes text (which may contain newlines) as wrapped lines starting `indent` from the margin.
+        """
+        pdf = self.pdf
+        max_width = pdf.w - pdf.r_margin - pdf.l_margin - indent
+        for paragraph_line in self.text(text).split("\n"):
+            for line in self.wrap(paragraph_line, max_width):
+                pdf.set_x(pdf.l_margin + indent)
+                pdf.cell(max_width, height, line, fill=fill)
+                pdf.ln(height)
+
+    def render(self, content):
+        """
+        Renders the whole course (a Course or its Markdown) and returns the
+        PDF as bytes.
+        """
+        pdf = self.pdf
+        pdf.add_page()
+        self.set_font(self.body_family, "B", 16)
+        pdf.cell(0, 10, self.text(self.title), align="C")
+        pdf.ln(16)
+
+        if isinstance(content, Course):
+            # Walk the structure; only each lesson's own Markdown is parsed
+            for index, module in enumerate(content.modules):
+                if index:
+                    pdf.add_page()
+                for chunk in module.iter_markdown():
+                    self._draw_blocks(chunk)
+        else:
+            for index, module in enumerate(iter_modules(content)):
+                if index and module.startswith("# "):
+                    pdf.add_page()
+                self._draw_blocks(module)
+
+        if LEGACY_FPDF:
+            # PyFPDF returns a latin-1 str
+            return pdf.output(dest="S").encode("latin-1")
+        return bytes(pdf.output())
+
+    def _draw_blocks(self, markdown):
+        for kind, data in iter_blocks(markdown):
+            getattr(self, "_draw_" + kind)(data)
+
+    def _draw_heading(self, data):
+        level, heading = data
+        size = HEADING_SIZES[level]
+        self.pdf.ln(3 if level > 1 else 0)
+        self.set_font(self.body_family, "B", size)
+        self.write_lines(strip_inline(heading), size * 0.5)
+        self.pdf.ln(2)
+
+    def _draw_paragraph(self, text):
+        self.set_font(self.body_family, "", BODY_SIZE)
+        self.write_lines(strip_inline(text), LINE_HEIGHT)
+        self.pdf.ln(2)
+
+    def _draw_item(self, data):
+        indent, marker, text = data
+        pdf = self.pdf
+        bullet = marker if marker[0].isdigit() else ("•" if self.unicode else "-")
+        offset = 6 + indent * 6
+        self.set_font(self.body_family, "", BODY_SIZE)
+        # Keep the bullet on the same page as the first line of its text
+        if pdf.get_y() + LINE_HEIGHT > pdf.page_break_trigger:
+            pdf.add_page()
+        y = pdf.get_y()
+        pdf.set_x(pdf.l_margin + offset - 6)
+        pdf.cell(6, LINE_HEIGHT, bullet)
+        pdf.set_y(y)
+        self.write_lines(strip_inline(text), LINE_HEIGHT, indent=offset)
+        pdf.ln(1)
+
+    def _draw_code(self, text):
+        self.set_font(self.mono_family, "", CODE_SIZE)
+        self.pdf.set_fill_color(242, 242, 242)
+        self.write_lines(text or " ", LINE_HEIGHT - 1, fill=True)
+        self.pdf.ln(2)
+
+    def _draw_table(self, row):
+        cells = [strip_inline(cell.strip()) for cell in row.strip().strip("|").split("|")]
+        self.set_font(self.mono_family, "", CODE_SIZE)
+        self.write_lines(" | ".join(cells), LINE_HEIGHT - 1)
+
+    def _draw_rule(self, _):
+        pdf = self.pdf
+        pdf.ln(2)
+        y = pdf.get_y()
+        pdf.line(pdf.l_margin, y, pdf.w - pdf.r_margin, y)
+        pdf.ln(4)
+
+
+def render_course_pdf(content, title="Course Content"):
+    """
+    Returns the course (a Course or its Markdown) rendered as PDF bytes, or
+    None if fpdf is missing.
+    """
+    if FPDF is None:
+        return None
+    return CoursePDFRenderer(title).render(content)
@@ -0,0 +1,563 @@
+"""
+Course generation engine shared by the Streamlit app and the batch CLI.
+
+TABLER (outline) -> DICTATOR (outline to {module: [lessons]}) -> COURSIFY
+(lessons) -> QUIZZY (quizzes) -> Markdown/PDF/PPTX export. Nothing in here
+depends on Streamlit.
+"""
+import ast
+import json
+import os
+import re
+import time
+import uuid
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from functools import partial
+
+from llm import complete, stream_complete
+from checkpoints import lesson_key, make_course_id, quiz_key
+from course_model import Course, Lesson, Module
+from outline_parser import parse_outline_structure
+from prompts import render
+from quiz_digest import compact_module_text
+from utils import generate_pdf, generate_ppt
+
+# Upper bound on simultaneous API calls made while generating a course
+DEFAULT_MAX_WORKERS = int(os.getenv("ACCG_MAX_WORKERS", "8"))
+# Parallel calls of a speculative lesson prefetch, kept low as the work may be thrown away
+PREFETCH_MAX_WORKERS = int(os.getenv("ACCG_PREFETCH_WORKERS", "2"))
+
+LESSON_ERROR_TEXT = "Error generating content."
+QUIZ_ERROR_TEXT = "Error generating quiz."
+
+# How often streamed partial text is handed to `on_partial`
+PARTIAL_REFRESH_SECONDS = 0.3
+
+# What to do with a lesson that has a close match in the lesson library
+REUSE_COPY = "copy"
+REUSE_ADAPT = "adapt"
+
+
+# Values used for any field missing from a course config
+COURSE_DEFAULTS = {
+    "course_name": "Course",
+    "target_audience": "Beginner",
+    "difficulty": "Easy",
+    "num_modules": 3,
+    "course_duration": "4 Weeks",
+    "course_credit": "",
+}
+
+
+def course_config(**fields):
+    """
+    Returns a complete course config, filling unspecified fields from COURSE_DEFAULTS.
+    """
+    config = dict(COURSE_DEFAULTS)
+    config.update({k: v for k, v in fields.items() if v is not None})
+    return config
+
+
+def build_outline_prompt(config):
+    """
+    Builds the TABLER prompt for a course config.
+    """
+    return render("tabler", **config)
+
+
+def build_dictator_prompt(outline):
+    """
+    Builds the DICTATOR prompt that turns an outline into {module: [lessons]}.
+    """
+    return render("dictator", outline=outline)
+
+
+def format_course_outline(module_dict):
+    """
+    The course outline lesson prompts carry: the modules and lessons of
+    {module: [lessons]}, one per line.
+    """
+    return "\n".join(
+        f"{module}\n" + "\n".join(f"- {lesson}" for lesson in lessons)
+        for module, lessons in module_dict.items()
+    )
+
+
+def build_lesson_prompt(lesson, module, course_name, course_outline):
+    """
+    Builds the COURSIFY prompt for one lesson. The course name and
+    `course_outline` come before the module and lesson, so only the end of
+    the user message differs between the lessons of a course.
+    """
+    return render("coursify", lesson_name=lesson, module_name=module, course_name=course_name,
+                  course_outline=course_outline)
+
+
+def build_adapt_prompt(lesson, module, course_name, course_outline, source):
+    """
+    Builds the prompt that adapts a stored lesson (a lesson library match) to a new course.
+    """
+    return render(
+        "adapt",
+        lesson_name=lesson,
+        module_name=module,
+        course_name=course_name,
+        course_outline=course_outline,
+        source_lesson=source["lesson"],
+        source_course=source["course_name"],
+        source_content=source["content"],
+    )
+
+
+def extract_json(text):
+    """
+    Extracts the first dictionary from a model response.
+
+    Each "{" is tried as the start of a JSON object, so stray braces before or
+    after the dictionary don't break parsing. Python-style dicts (single
+    quotes) are accepted as DICTATOR is asked for "a plain Python dictionary".
+    """
+    if not text:
+        return None
+    decoder = json.JSONDecoder()
+    for match in re.finditer(r"\{", text):
+        try:
+            value, _ = decoder.raw_decode(text, match.start())
+        except json.JSONDecodeError:
+            value = _literal_dict(text, match.start())
+        if isinstance(value, dict) and value:
+            return value
+    return None
+
+
+def _literal_dict(text, start):
+    """
+    Parses a Python dict literal starting at `start`, or returns None.
+    """
+    end = text.rfind("}")
+    while end > start:
+        try:
+            value = ast.literal_eval(text[start:end + 1])
+            return value if isinstance(value, dict) else None
+        except (ValueError, SyntaxError):
+            end = text.rfind("}", start, end)
+    return None
+
+
+def generate_outline(client, config, use_cache=True, trace_id=None):
+    """
+    Runs TABLER for a course config and returns the outline text.
+    """
+    return complete(client, build_outline_prompt(config), use_cache=use_cache,
+                    stage="tabler", trace_id=trace_id, label=config["course_name"])
+
+
+def parse_outline(client, outline, use_cache=True, trace_id=None):
+    """
+    Turns an outline into {module: [lessons]}. Returns (module_dict, raw_response).
+
+    The outline is parsed locally first; DICTATOR is only called when no
+    Module/Lesson structure is found (raw_response is None otherwise).
+    module_dict is None when neither produced usable structure.
+    """
+    module_dict = parse_outline_structure(outline)
+    if module_dict:
+        return module_dict, None
+
+    raw_response = complete(client, build_dictator_prompt(outline), use_cache=use_cache,
+                            stage="dictator", trace_id=trace_id)
+    return extract_json(raw_response), raw_response
+
+
+def build_module_text(module, lesson_contents):
+    """
+    Joins a module header and its lesson bodies the way the quiz prompt and exports expect.
+    """
+    return Module(module, [Lesson(None, content) for content in lesson_contents]).to_markdown(quiz=False)
+
+
+def build_quiz_prompt(module_text, condensed=False):
+    """
+    Builds the QUIZZY prompt for one module's generated text; `condensed`
+    text holds lesson digests rather than the full lessons.
+    """
+    return render("quizzy_digest" if condensed else "quizzy", module_text=module_text)
+
+
+def build_module_quiz_prompt(module, lesson_contents, client=None, use_cache=True, trace_id=None, call_slot=None):
+    """
+    The QUIZZY prompt of a module, with its lessons condensed by
+    quiz_digest when the module is over the quiz token budget. Digest calls
+    each take a `call_slot()`, if given.
+    """
+    module_text, condensed = compact_module_text(module, lesson_contents, client, use_cache, trace_id,
+                                                 call_slot=call_slot)
+    return build_quiz_prompt(module_text, condensed)
+
+
+def diff_module_dicts(old_dict, new_dict):
+    """
+    Maps the units of an edited outline onto the previous one. Returns
+    {new unit key: old unit key} for every lesson and quiz whose content
+    can be kept: lessons whose title is unchanged (also when their module
+    was renamed or they moved to another module) and quizzes of modules
+    whose name and lessons are unchanged. Everything else is new work.
+    """
+    old_modules = list(old_dict.items())
+    old_names = [module for module, _ in old_modules]
+    # Where each lesson title lived before; titles used in several modules are ambiguous
+    lesson_homes = {}
+    for module, lessons in old_modules:
+        for lesson in lessons:
+            lesson_homes.setdefault(lesson.strip(), []).append((module, lesson))
+
+    kept = {}
+    for index, (module, lessons) in enumerate(new_dict.items()):
+        if module in old_dict:
+            previous = module
+        elif index < len(old_modules) and old_names[index] not in new_dict:
+            # Same position, new name: treated as a rename
+            previous = old_names[index]
+        else:
+            previous = None
+        previous_lessons = {lesson.strip(): lesson for lesson in old_dict.get(previous, [])}
+
+        for lesson in lessons:
+            title = lesson.strip()
+            if title in previous_lessons:
+                kept[lesson_key(module, lesson)] = lesson_key(previous, previous_lessons[title])
+            elif len(lesson_homes.get(title, [])) == 1:
+                kept[lesson_key(module, lesson)] = lesson_key(*lesson_homes[title][0])
+        if previous == module and list(old_dict[module]) == list(lessons):
+            kept[quiz_key(module)] = quiz_key(module)
+    return kept
+
+
+def carry_over_checkpoints(checkpoints, old_course_id, old_dict, new_course_id, new_dict):
+    """
+    Copies the still valid units of a previous outline to the edited one, so
+    generate_course_content only generates what changed. Returns
+    (units kept, units of the new outline).
+    """
+    kept = diff_module_dicts(old_dict, new_dict)
+    copied = checkpoints.copy_units(old_course_id, new_course_id, {old: new for new, old in kept.items()})
+    total = sum(len(lessons) + 1 for lessons in new_dict.values())
+    return copied, total
+
+
+def _run_unit(client, prompt, use_cache, buffer=None, checkpoint=None, span=None, call_slot=None):
+    """
+    Worker body for one lesson or quiz: returns (content, error) so failures
+    never escape the pool. `prompt` may be a function returning the prompt,
+    to build it in the worker. With a `buffer` the response is streamed into
+    it chunk by chunk for the calling thread to render. `span` is
+    (stage, label, trace_id) for telemetry. The call is made while holding
+    `call_slot()`, if given (see jobs.Job.call_slot).
+
+    `checkpoint` is (store, course_id, unit_key, keep). The outcome is written
+    from the worker itself so it survives an interrupted script run; when
+    `keep` is False a success is still recorded as failed, so the unit is
+    regenerated on the next run.
+    """
+    stage, label, trace_id = span or ("chat", None, None)
+    try:
+        if callable(prompt):
+            # Built before taking a slot, as building may make calls of its own (quiz digests)
+            prompt = prompt()
+        with call_slot() if call_slot else nullcontext():
+            if buffer is None:
+                content = complete(client, prompt, use_cache=use_cache, stage=stage, trace_id=trace_id, label=label)
+            else:
+                for chunk in stream_complete(client, prompt, use_cache=use_cache,
+                                             stage=stage, trace_id=trace_id, label=label):
+                    buffer.append(chunk)
+                content = "".join(buffer)
+        error = None
+    except Exception as e:
+        content, error = None, e
+
+    if checkpoint:
+        store, course_id, unit_key, keep = checkpoint
+        try:
+            if content and keep:
+                store.save(course_id, unit_key, content)
+            else:
+                store.save_failure(course_id, unit_key, error or "incomplete module", content)
+        except Exception as e:
+            print(f"Error saving checkpoint: {e}")
+    return content, error
+
+
+def generate_course_content(client, module_data, course_name, max_workers=DEFAULT_MAX_WORKERS,
+                            on_progress=None, on_error=None, use_cache=True, on_partial=None,
+                            checkpoints=None, course_id=None, cancel_event=None, trace_id=None,
+                            reuse=None, library=None, quizzes=True, call_slot=None):
+    """
+    Generates every lesson and quiz in `module_data` with at most `max_workers`
+    requests in flight and returns them as a course_model.Course in outline order.
+
+    Lessons are fanned out across the pool; a module's quiz is started as soon
+    as its last lesson finishes and jumps ahead of lessons still waiting.
+    Callbacks run on the calling thread, so they may safely update Streamlit:
+    `on_progress(done, total, label)` after each call and `on_error(label, exc)`
+    for each failed call. `use_cache=False` bypasses the response cache.
+
+    When `on_partial(label, text)` is given, requests are streamed and the
+    callback receives the growing text of the oldest in-flight lesson or quiz
+    a few times per second.
+
+    With a `checkpoints` store and `course_id`, units finished by an earlier
+    run are reused and only missing or failed ones are generated. A quiz is
+    only kept once every lesson of its module succeeded.
+
+    Setting `cancel_event` stops new requests from being started; calls
+    already in flight finish (and are checkpointed) and None is returned.
+    Lesson and quiz calls are recorded as "coursify" and "quizzy" spans
+    under `trace_id`.
+
+    `reuse` maps lesson keys to (library match, mode): REUSE_COPY takes the
+    stored lesson as is, REUSE_ADAPT asks for a light adaptation of it
+    instead of a full COURSIFY generation. With a `library`, lessons
+    written for this course are added to it at the end.
+
+    With `quizzes=False` only the lessons are generated and checkpointed, and
+    None is returned; used to prefetch lessons while an outline is reviewed.
+
+    `call_slot`, a jobs.Job.call_slot, makes every call wait for a slot of
+    the shared scheduler, so jobs of other sessions get their turn.
+
+    Every lesson prompt starts with the modules and lessons of `module_data`
+    rather than TABLER's whole outline, which would add 1-2k input tokens to
+    every lesson and only pays off where the prefix is cached.
+    """
+    modules = [(module, list(lessons)) for module, lessons in module_data.items()]
+    total_steps = sum(len(lessons) for _, lessons in modules) + (len(modules) if quizzes else 0)
+    course_outline = format_course_outline(module_data)
+    saved = checkpoints.load(course_id) if checkpoints and course_id else {}
+
+    course = Course.from_outline(course_name, module_data)
+    lesson_failed = [False] * len(modules)
+    pending_lessons = deque()
+    ready_quizzes = deque()
+
+    reuse = reuse or {}
+    copied = set()
+    for m_idx, (module, lessons) in enumerate(modules):
+        for l_idx, lesson in enumerate(lessons):
+            key = lesson_key(module, lesson)
+            restored = saved.get(key)
+            if not restored and key in reuse and reuse[key][1] == REUSE_COPY:
+                restored = reuse[key][0]["content"]
+                copied.add(key)
+                if checkpoints and course_id:
+                    checkpoints.save(course_id, key, restored)
+            if restored:
+                course.modules[m_idx].lessons[l_idx].content = restored
+            else:
+                pending_lessons.append((m_idx, l_idx))
+    lessons_left = [sum(1 for lesson in module.lessons if lesson.content is None) for module in course.modules]
+
+    for m_idx, (module, _) in enumerate(modules):
+        if quizzes and lessons_left[m_idx] == 0:
+            # A stored quiz only matches if none of its lessons are regenerated
+            course.modules[m_idx].quiz.content = saved.get(quiz_key(module))
+            if course.modules[m_idx].quiz.content is None:
+                ready_quizzes.append(m_idx)
+
+    restored_lessons = sum(len(lessons) for _, lessons in modules) - len(pending_lessons)
+    done_steps = restored_lessons + sum(1 for module in course.modules if module.quiz.content is not None)
+    if done_steps and on_progress:
+        on_progress(done_steps, total_steps, "Restored from checkpoint")
+
+    max_workers = max(1, int(max_workers))
+    in_flight = {}
+    buffers = {}
+
+    def label_for(kind, m_idx, l_idx):
+        module, lessons = modules[m_idx]
+        return lessons[l_idx] if kind == "lesson" else f"Quiz: {module}"
+
+    def submit(executor, prompt, unit, stage=None):
+        checkpoint = None
+        if checkpoints and course_id:
+            kind, m_idx, l_idx = unit
+            module, lessons = modules[m_idx]
+            if kind == "lesson":
+                checkpoint = (checkpoints, course_id, lesson_key(module, lessons[l_idx]), True)
+            else:
+                checkpoint = (checkpoints, course_id, quiz_key(module), not lesson_failed[m_idx])
+        buffer = buffers.setdefault(unit, []) if on_partial else None
+        span = (stage or ("coursify" if unit[0] == "lesson" else "quizzy"), label_for(*unit), trace_id)
+        future = executor.submit(_run_unit, client, prompt, use_cache, buffer, checkpoint, span, call_slot)
+        in_flight[future] = unit
+
+    def submit_next(executor):
+        # Quizzes go first: their module is otherwise complete
+        if ready_quizzes:
+            m_idx = ready_quizzes.popleft()
+            module = course.modules[m_idx]
+            contents = [lesson.content for lesson in module.lessons]
+            # Condensing may make API calls, so it runs in the worker
+            prompt = partial(build_module_quiz_prompt, module.title, contents, client, use_cache, trace_id,
+                             call_slot)
+            submit(executor, prompt, ("quiz", m_idx, None))
+        else:
+            m_idx, l_idx = pending_lessons.popleft()
+            module, lessons = modules[m_idx]
+            source, mode = reuse.get(lesson_key(module, lessons[l_idx]), (None, None))
+            if mode == REUSE_ADAPT:
+                prompt = build_adapt_prompt(lessons[l_idx], module, course_name, course_outline, source)
+                submit(executor, prompt, ("lesson", m_idx, l_idx), stage="adapt")
+            else:
+                prompt = build_lesson_prompt(lessons[l_idx], module, course_name, course_outline)
+                submit(executor, prompt, ("lesson", m_idx, l_idx))
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        def cancelled():
+            return cancel_event is not None and cancel_event.is_set()
+
+        while in_flight or ((pending_lessons or ready_quizzes) and not cancelled()):
+            while (pending_lessons or ready_quizzes) and len(in_flight) < max_workers and not cancelled():
+                submit_next(executor)
+            if not in_flight:
+                break
+
+            timeout = PARTIAL_REFRESH_SECONDS if on_partial else None
+            finished, _ = wait(in_flight, timeout=timeout, return_when=FIRST_COMPLETED)
+            if on_partial and in_flight:
+                # dicts keep insertion order, so this is the oldest unit still running
+                unit = next(iter(in_flight.values()))
+                on_partial(label_for(*unit), "".join(list(buffers[unit])))
+
+            for future in finished:
+                unit = in_flight.pop(future)
+                buffers.pop(unit, None)
+                kind, m_idx, l_idx = unit
+                content, error = future.result()
+                label = label_for(*unit)
+
+                if kind == "lesson":
+                    course.modules[m_idx].lessons[l_idx].content = content or LESSON_ERROR_TEXT
+                    lesson_failed[m_idx] = lesson_failed[m_idx] or not content
+                    lessons_left[m_idx] -= 1
+                    if quizzes and lessons_left[m_idx] == 0:
+                        ready_quizzes.append(m_idx)
+                else:
+                    course.modules[m_idx].quiz.content = content or QUIZ_ERROR_TEXT
+
+                done_steps += 1
+                if error is not None and on_error:
+                    on_error(label, error)
+                if on_progress:
+                    on_progress(done_steps, total_steps, label)
+
+    if cancelled() or not quizzes:
+        return None
+
+    if library is not None:
+        for m_idx, (module, lessons) in enumerate(modules):
+            for l_idx, lesson in enumerate(lessons):
+                content = course.modules[m_idx].lessons[l_idx].content
+                if content and content != LESSON_ERROR_TEXT and lesson_key(module, lesson) not in copied:
+                    try:
+                        library.add(course_name, module, lesson, content)
+                    except Exception as e:
+                        print(f"Error adding lesson to library: {e}")
+
+    return course
+
+
+def safe_filename(name):
+    """
+    Turns a course name into a file-system friendly base name.
+    """
+    name = re.sub(r"[^\w\-]+", "_", name.strip()).strip("_")
+    return name or "Course"
+
+
+def export_course(content, out_dir, basename, formats=("md", "pdf", "pptx"), trace_id=None):
+    """
+    Writes the course (a Course or Markdown text) to `out_dir` in the
+    requested formats and returns {format: path} for the files that were produced.
+    """
+    os.makedirs(out_dir, exist_ok=True)
+    written = {}
+    base = os.path.join(out_dir, basename)
+
+    if "md" in formats:
+        with open(base + ".md", "w", encoding="utf-8") as f:
+            if isinstance(content, Course):
+                f.writelines(content.iter_markdown())
+            else:
+                f.write(content)
+        written["md"] = base + ".md"
+    if "pdf" in formats and generate_pdf(content, base + ".pdf", trace_id):
+        written["pdf"] = base + ".pdf"
+    if "pptx" in formats and generate_ppt(content, base + ".pptx", trace_id):
+        written["pptx"] = base + ".pptx"
+    return written
+
+
+def generate_course(client, config, out_dir=None, formats=("md", "pdf", "pptx"),
+                    max_workers=DEFAULT_MAX_WORKERS, use_cache=True, on_progress=None, on_error=None,
+                    checkpoints=None, trace_id=None, library=None):
+    """
+    Runs the whole pipeline for one course config without any UI.
+    Generated lessons are added to `library` when one is given.
+
+    Returns a dict with the outline, module_dict, content (a Course), exported files,
+    per-stage timings and the telemetry trace id (a new one unless given).
+    With a `checkpoints` store an interrupted run of the same course resumes
+    where it stopped. Raises RuntimeError if the outline or its structure
+    cannot be produced.
+    """
+    config = course_config(**config)
+    trace_id = trace_id or uuid.uuid4().hex
+    timings = {}
+
+    started = time.perf_counter()
+    outline = generate_outline(client, config, use_cache=use_cache, trace_id=trace_id)
+    timings["outline"] = time.perf_counter() - started
+    if not outline:
+        raise RuntimeError("TABLER returned an empty outline")
+
+    stage_started = time.perf_counter()
+    module_dict, raw_response = parse_outline(client, outline, use_cache=use_cache, trace_id=trace_id)
+    timings["parse"] = time.perf_counter() - stage_started
+    if not module_dict:
+        raise RuntimeError(f"Failed to parse outline into JSON. Response was: {(raw_response or '')[:200]}...")
+
+    stage_started = time.perf_counter()
+    content = generate_course_content(
+        client,
+        module_dict,
+        config["course_name"],
+        max_workers=max_workers,
+        on_progress=on_progress,
+        on_error=on_error,
+        use_cache=use_cache,
+        checkpoints=checkpoints,
+        course_id=make_course_id(config["course_name"], module_dict),
+        trace_id=trace_id,
+        library=library,
+    )
+    timings["content"] = time.perf_counter() - stage_started
+
+    files = {}
+    if out_dir:
+        stage_started = time.perf_counter()
+        files = export_course(content, out_dir, safe_filename(config["course_name"]), formats, trace_id)
+        timings["export"] = time.perf_counter() - stage_started
+
+    timings["total"] = time.perf_counter() - started
+    return {
+        "config": config,
+        "outline": outline,
+        "module_dict": module_dict,
+        "content": content,
+        "files": files,
+        "timings": timings,
+        "trace_id": trace_id,
+    }
@@ -0,0 +1,2 @@
+from prompts.registry import TEMPLATES, PromptTemplate, RenderedPrompt, count_tokens, get_template, register, render
+from prompts.routing import DEFAULT_ROUTES, ModelRouter, Route, get_route, get_router, load_routes, reload_routes
@@ -0,0 +1,147 @@
+"""
+Registry of precompiled prompt templates.
+
+Every template is split into a static system part, identical for every
+call of a stage, and a short user part holding the variable fields. Sent
+as system + user messages, all lessons of a course share the same prefix,
+which the provider can cache. Templates are parsed once at import and
+their static part is token-counted once.
+"""
+import string
+
+# Exact token counts when tiktoken is installed, ~4 characters per token otherwise
+try:
+    import tiktoken
+except ImportError:
+    tiktoken = None
+
+from prompts.adapt_prompt import ADAPT_SYSTEM_PROMPT, ADAPT_USER_TEMPLATE
+from prompts.coursify_prompt import COURSIFY_SYSTEM_PROMPT, COURSIFY_USER_TEMPLATE
+from prompts.dictator_prompt import DICTATOR_PROMPT
+from prompts.digest_prompt import DIGEST_SYSTEM_PROMPT, DIGEST_USER_TEMPLATE
+from prompts.quizzy_prompt import QUIZZY_PROMPT
+from prompts.tabler_prompt import TABLER_PROMPT
+
+# Tokens added per chat message by the chat format, plus the reply primer
+MESSAGE_OVERHEAD_TOKENS = 4
+REPLY_OVERHEAD_TOKENS = 3
+
+_encoding = None
+
+
+def count_tokens(text):
+    """
+    Counts the tokens of `text` locally, without an API call.
+    """
+    global _encoding
+    if not text:
+        return 0
+    if tiktoken is not None:
+        if _encoding is None:
+            try:
+                _encoding = tiktoken.get_encoding("cl100k_base")
+            except Exception:
+                return len(text) // 4
+        return len(_encoding.encode(text, disallowed_special=()))
+    return len(text) // 4
+
+
+class RenderedPrompt:
+    """
+    A filled-in template: the shared `system` text and the per-call `user` text.
+    """
+
+    def __init__(self, name, system, user, system_tokens=None):
+        self.name = name
+        self.system = system
+        self.user = user
+        self._system_tokens = system_tokens
+
+    @property
+    def messages(self):
+        return [{"role": "system", "content": self.system}, {"role": "user", "content": self.user}]
+
+    @property
+    def token_count(self):
+        system_tokens = self._system_tokens if self._system_tokens is not None else count_tokens(self.system)
+        return system_tokens + count_tokens(self.user) + 2 * MESSAGE_OVERHEAD_TOKENS + REPLY_OVERHEAD_TOKENS
+
+    def __str__(self):
+        # Single-message form, e.g. for logs or providers without system messages
+        return self.system + "\n\n" + self.user
+
+
+class PromptTemplate:
+    """
+    Static system text plus a `str.format`-style user template, compiled once.
+    """
+
+    def __init__(self, name, system, user_template):
+        self.name = name
+        self.system = system
+        self.user_template = user_template
+        self.fields = []
+        self._parts = []
+        for literal, field, spec, conversion in string.Formatter().parse(user_template):
+            if spec or conversion:
+                raise ValueError(f"{name}: format specs are not supported in prompt templates")
+            self._parts.append((literal, field))
+            if field is not None and field not in self.fields:
+                self.fields.append(field)
+        self.system_tokens = count_tokens(system)
+
+    def render(self, **values):
+        """
+        Fills the user template and returns a RenderedPrompt.
+        """
+        missing = [field for field in self.fields if field not in values]
+        if missing:
+            raise KeyError(f"{self.name} prompt is missing {', '.join(missing)}")
+        user = "".join(
+            literal + (str(values[field]) if field is not None else "")
+            for literal, field in self._parts
+        )
+        return RenderedPrompt(self.name, self.system, user, self.system_tokens)
+
+
+TEMPLATES = {}
+
+
+def register(template):
+    TEMPLATES[template.name] = template
+    return template
+
+
+def get_template(name):
+    return TEMPLATES[name]
+
+
+def render(name, **values):
+    """
+    Renders the registered template `name`.
+    """
+    return TEMPLATES[name].render(**values)
+
+
+register(PromptTemplate(
+    "tabler",
+    TABLER_PROMPT,
+    "User Input Topic:\n"
+    "Topic: {course_name}\n"
+    "Audience: {target_audience}\n"
+    "Difficulty: {difficulty}\n"
+    "Modules: {num_modules}\n"
+    "Duration: {course_duration}\n"
+    "Credit: {course_credit}",
+))
+register(PromptTemplate("dictator", DICTATOR_PROMPT, "Course Outline:\n{outline}"))
+register(PromptTemplate("coursify", COURSIFY_SYSTEM_PROMPT, COURSIFY_USER_TEMPLATE))
+register(PromptTemplate("quizzy", QUIZZY_PROMPT, "Module Content:\n{module_text}"))
+# Same system text as "quizzy", for modules whose lessons were condensed to fit the token budget
+register(PromptTemplate(
+    "quizzy_digest",
+    QUIZZY_PROMPT,
+    "Module Content (each lesson condensed to its headings, key terms, definitions and key points):\n{module_text}",
+))
+register(PromptTemplate("adapt", ADAPT_SYSTEM_PROMPT, ADAPT_USER_TEMPLATE))
+register(PromptTemplate("digest", DIGEST_SYSTEM_PROMPT, DIGEST_USER_TEMPLATE))
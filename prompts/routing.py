@@ -0,0 +1,237 @@
+"""
+Per-stage model routing.
+
+Each prompt type (tabler, dictator, coursify, adapt, quizzy, digest, chat)
+gets a Route: the model, output budget (`max_tokens`) and temperature its
+calls use, plus an optional faster `fallback_model`. The router switches a stage
+to its fallback while the primary model is rate limited or slower than the
+stage's latency SLO, and tries the primary model again after a cooldown.
+
+Routes are merged from, in increasing precedence: DEFAULT_ROUTES, a TOML
+file (ACCG_ROUTES_FILE, by default .streamlit/routes.toml next to app.py) with one table
+per stage, and the ACCG_ROUTES environment variable holding the same
+tables as JSON. ACCG_MODEL changes the default model of every stage.
+"""
+import json
+import os
+import threading
+import time
+
+# Python 3.11+ ships tomllib; tomli is the same parser for older versions
+try:
+    import tomllib
+except ImportError:
+    try:
+        import tomli as tomllib
+    except ImportError:
+        tomllib = None
+
+DEFAULT_MODEL = os.getenv("ACCG_MODEL", "gpt-3.5-turbo")
+DEFAULT_TEMPERATURE = 0.7
+ROUTES_FILE = os.getenv(
+    "ACCG_ROUTES_FILE",
+    os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), ".streamlit", "routes.toml"),
+)
+
+# How long a model is avoided after a rate limit or an SLO breach
+FALLBACK_COOLDOWN_SECONDS = float(os.getenv("ACCG_FALLBACK_COOLDOWN", "60"))
+# Weight of the newest call in a stage's moving average latency
+LATENCY_SMOOTHING = 0.3
+
+ROUTE_FIELDS = ("model", "max_tokens", "temperature", "fallback_model", "slo_seconds")
+
+# Output budgets leave headroom over what each prompt asks for; raise them
+# together with the model's output limit (ACCG_MAX_OUTPUT_TOKENS, which also
+# caps the larger budget a cut-off answer is retried with)
+DEFAULT_ROUTES = {
+    "chat": {},
+    "tabler": {"max_tokens": 3000},
+    "dictator": {"max_tokens": 2000, "temperature": 0.0},
+    "coursify": {"max_tokens": 3000},
+    "adapt": {"max_tokens": 3000, "temperature": 0.5},
+    "quizzy": {"max_tokens": 3500, "temperature": 0.5},
+    "digest": {"max_tokens": 800, "temperature": 0.0},
+}
+
+
+class Route:
+    """
+    Model settings of one stage. `slo_seconds` is the latency above which
+    the stage moves to `fallback_model`; None never falls back on latency.
+    """
+
+    __slots__ = ("stage",) + ROUTE_FIELDS
+
+    def __init__(self, stage, model=DEFAULT_MODEL, max_tokens=None, temperature=DEFAULT_TEMPERATURE,
+                 fallback_model=None, slo_seconds=None):
+        self.stage = stage
+        self.model = model
+        self.max_tokens = int(max_tokens) if max_tokens else None
+        self.temperature = float(temperature)
+        self.fallback_model = fallback_model or None
+        self.slo_seconds = float(slo_seconds) if slo_seconds else None
+
+    def as_dict(self):
+        return {field: getattr(self, field) for field in ROUTE_FIELDS}
+
+    def __repr__(self):
+        return f"Route({self.stage!r}, {self.as_dict()!r})"
+
+
+def _read_routes_file(path):
+    if not path or not os.path.exists(path):
+        return {}
+    if tomllib is None:
+        print(f"Ignoring {path}: reading TOML needs Python 3.11+ or the tomli package")
+        return {}
+    try:
+        with open(path, "rb") as f:
+            data = tomllib.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Error reading routes from {path}: {e}")
+        return {}
+    # Accept both top-level stage tables and a [routes] table holding them
+    return data.get("routes", data)
+
+
+def _read_routes_env():
+    raw = os.getenv("ACCG_ROUTES")
+    if not raw:
+        return {}
+    try:
+        data = json.loads(raw)
+    except ValueError as e:
+        print(f"Error parsing ACCG_ROUTES: {e}")
+        return {}
+    return data if isinstance(data, dict) else {}
+
+
+def load_routes(path=None):
+    """
+    Returns {stage: Route} merged from the defaults, the routes file and
+    ACCG_ROUTES. A "default" table applies to every stage before its own.
+    """
+    layers = [DEFAULT_ROUTES, _read_routes_file(path or ROUTES_FILE), _read_routes_env()]
+    base = {}
+    for layer in layers:
+        base.update({k: v for k, v in (layer.get("default") or {}).items() if k in ROUTE_FIELDS})
+
+    stages = {stage for layer in layers for stage in layer if stage != "default"}
+    routes = {}
+    for stage in stages:
+        settings = dict(base)
+        for layer in layers:
+            table = layer.get(stage)
+            if isinstance(table, dict):
+                settings.update({k: v for k, v in table.items() if k in ROUTE_FIELDS})
+        try:
+            routes[stage] = Route(stage, **settings)
+        except (TypeError, ValueError) as e:
+            print(f"Error in route for {stage}: {e}")
+            routes[stage] = Route(stage, **DEFAULT_ROUTES.get(stage, {}))
+    routes["default"] = Route("default", **base)
+    return routes
+
+
+_routes = None
+_routes_lock = threading.Lock()
+
+
+def get_routes():
+    global _routes
+    with _routes_lock:
+        if _routes is None:
+            _routes = load_routes()
+        return _routes
+
+
+def reload_routes():
+    """
+    Re-reads the routes file and environment, e.g. after editing them.
+    """
+    global _routes
+    with _routes_lock:
+        _routes = load_routes()
+        return _routes
+
+
+def get_route(stage):
+    """
+    The Route of `stage`, or the default route for unknown stages.
+    """
+    routes = get_routes()
+    return routes.get(stage) or routes["default"]
+
+
+class ModelRouter:
+    """
+    Picks a model for each call from its route and what recent calls saw:
+    rate limits (per model) and a moving average latency (per stage and
+    model). Shared by every session and worker thread of the process.
+    """
+
+    def __init__(self, cooldown=FALLBACK_COOLDOWN_SECONDS):
+        self.cooldown = cooldown
+        self._latency = {}
+        self._rate_limited_until = {}
+        self._slow_until = {}
+        self._lock = threading.Lock()
+
+    def is_degraded(self, route, model=None, now=None):
+        """
+        True while `model` (the route's primary by default) is rate limited
+        or over the route's latency SLO.
+        """
+        model = model or route.model
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            return (self._rate_limited_until.get(model, 0) > now
+                    or self._slow_until.get((route.stage, model), 0) > now)
+
+    def choose(self, route):
+        """
+        The model to call for `route`: its fallback while the primary is
+        degraded (and the fallback isn't), the primary otherwise.
+        """
+        if not route.fallback_model or route.fallback_model == route.model:
+            return route.model
+        now = time.monotonic()
+        if self.is_degraded(route, now=now) and not self.is_degraded(route, route.fallback_model, now):
+            return route.fallback_model
+        return route.model
+
+    def record_latency(self, route, model, seconds):
+        """
+        Adds a finished call to the stage's moving average. Crossing the SLO
+        puts the model in cooldown and restarts its average, so the first
+        call after the cooldown is judged on its own.
+        """
+        key = (route.stage, model)
+        with self._lock:
+            previous = self._latency.get(key)
+            average = seconds if previous is None else (
+                LATENCY_SMOOTHING * seconds + (1 - LATENCY_SMOOTHING) * previous)
+            if route.slo_seconds and average > route.slo_seconds:
+                self._slow_until[key] = time.monotonic() + self.cooldown
+                self._latency.pop(key, None)
+            else:
+                self._latency[key] = average
+
+    def record_rate_limit(self, model):
+        with self._lock:
+            self._rate_limited_until[model] = time.monotonic() + self.cooldown
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    """
+    Returns the process-wide ModelRouter.
+    """
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
@@ -0,0 +1,228 @@
+"""
+Compaction of module text for the QUIZZY prompt.
+
+A quiz is written from its whole module, so sending every lesson verbatim
+makes long modules slow, expensive and liable to overflow the context
+window. When a module is over QUIZ_TOKEN_BUDGET tokens (counted locally),
+lessons that don't fit their share of the budget are replaced by a digest:
+their headings, key terms, definitions and key sentences, extracted from
+the Markdown. With ACCG_QUIZ_DIGEST=summarize the digests are written by
+short "digest" calls run in parallel instead, and the extracted digest is
+used for any call that fails.
+"""
+import os
+import re
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import nullcontext
+
+from content_index import iter_lines, parse_heading
+from course_model import Lesson, Module
+from llm import complete
+from prompts import count_tokens, render
+from telemetry import record_span
+
+# Tokens of module text a quiz prompt may carry before lessons are condensed
+QUIZ_TOKEN_BUDGET = int(os.getenv("ACCG_QUIZ_TOKEN_BUDGET", "6000"))
+# "extract" (local, no API calls) or "summarize" (one cheap call per lesson)
+DIGEST_MODE = os.getenv("ACCG_QUIZ_DIGEST", "extract")
+DIGEST_MAX_WORKERS = int(os.getenv("ACCG_DIGEST_WORKERS", "4"))
+# Smallest share of the budget a lesson is condensed to
+MIN_LESSON_TOKENS = 80
+
+_LIST_ITEM = re.compile(r"^[ \t]*(?:[-*+]|\d+[.)])[ \t]+(.*)$")
+_TERM = re.compile(r"\*\*(.+?)\*\*|__(.+?)__")
+# "**Term**: meaning" or "**Term** - meaning", also as a list item
+_DEFINITION = re.compile(r"^(?:\*\*(.+?)\*\*|__(.+?)__)[ \t]*(?::|[-–—])[ \t]*(.+)$")
+_DEFINING = re.compile(r"\b(?:is|are) (?:a|an|the)\b|\brefers? to\b|\bdefined as\b|\bmeans\b|\bknown as\b",
+                       re.IGNORECASE)
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+(?=[A-Z0-9*_$(\"'])")
+
+# Detail levels of an extracted digest; lower levels are tried until it fits
+HEADINGS_AND_TERMS = 0
+DEFINITIONS = 1
+KEY_SENTENCES = 2
+LIST_POINTS = 3
+
+
+def _first_sentence(text):
+    return _SENTENCE_END.split(text.strip(), 1)[0]
+
+
+def _sections(content):
+    """
+    Splits lesson Markdown into (heading line, [paragraphs], [list items]),
+    skipping fenced code blocks. Text before the first heading gets a
+    section without a heading.
+    """
+    sections = [[None, [], []]]
+    paragraph = []
+
+    def end_paragraph():
+        if paragraph:
+            sections[-1][1].append(" ".join(paragraph))
+            paragraph.clear()
+
+    for line, _, fenced in iter_lines(content):
+        if fenced:
+            end_paragraph()
+            continue
+        stripped = line.strip()
+        heading = parse_heading(line)
+        item = _LIST_ITEM.match(line)
+        if heading:
+            end_paragraph()
+            sections.append([f"{'#' * heading[0]} {heading[1]}", [], []])
+        elif item:
+            end_paragraph()
+            sections[-1][2].append(item.group(1).strip())
+        elif not stripped or stripped in ("---", "***", "___"):
+            end_paragraph()
+        else:
+            paragraph.append(stripped)
+    end_paragraph()
+    return [section for section in sections if section[0] or section[1] or section[2]]
+
+
+def extract_digest(content, detail=LIST_POINTS):
+    """
+    A condensed Markdown version of a lesson: every heading with the key
+    terms (bold text) of its section, plus, with increasing `detail`, the
+    "**Term**: meaning" definitions, the opening and defining sentences of
+    paragraphs and the first sentence of each list item.
+    """
+    lines = []
+    for heading, paragraphs, items in _sections(content or ""):
+        if heading:
+            lines.append(heading)
+        section_lines = []
+        terms = []
+        for text in paragraphs + items:
+            for match in _TERM.finditer(text):
+                term = (match.group(1) or match.group(2)).strip()
+                if term and term not in terms:
+                    terms.append(term)
+
+        if detail >= DEFINITIONS:
+            for text in paragraphs + items:
+                definition = _DEFINITION.match(text)
+                if definition:
+                    term = definition.group(1) or definition.group(2)
+                    section_lines.append(f"- **{term}**: {_first_sentence(definition.group(3))}")
+        if detail >= KEY_SENTENCES:
+            for index, text in enumerate(paragraphs):
+                sentences = _SENTENCE_END.split(text)
+                key = [s for i, s in enumerate(sentences) if (i == 0 and index == 0) or _DEFINING.search(s)]
+                section_lines.extend(f"- {sentence}" for sentence in key)
+        if detail >= LIST_POINTS:
+            section_lines.extend(f"- {_first_sentence(text)}" for text in items if not _DEFINITION.match(text))
+
+        if terms:
+            lines.append("Key terms: " + ", ".join(terms))
+        for line in section_lines:
+            if line not in lines:
+                lines.append(line)
+        lines.append("")
+    return "\n".join(lines).strip()
+
+
+def truncate_tokens(text, max_tokens):
+    """
+    Cuts `text` at a line break so it fits `max_tokens`.
+    """
+    tokens = count_tokens(text)
+    while tokens > max_tokens and text:
+        cut = text[:max(1, int(len(text) * max_tokens / tokens) - 1)]
+        text = cut.rsplit("\n", 1)[0] if "\n" in cut else cut
+        tokens = count_tokens(text)
+    return text
+
+
+def lesson_digest(content, max_tokens):
+    """
+    The most detailed extracted digest of a lesson that fits `max_tokens`.
+    """
+    digest = ""
+    for detail in (LIST_POINTS, KEY_SENTENCES, DEFINITIONS, HEADINGS_AND_TERMS):
+        digest = extract_digest(content, detail)
+        if count_tokens(digest) <= max_tokens:
+            return digest
+    return truncate_tokens(digest, max_tokens)
+
+
+def _shares(sizes, budget):
+    """
+    Splits `budget` between lessons of `sizes` tokens: lessons smaller than
+    an equal share keep their size and leave the rest to the larger ones.
+    """
+    shares = [0] * len(sizes)
+    remaining = budget
+    for left, index in enumerate(sorted(range(len(sizes)), key=sizes.__getitem__)):
+        shares[index] = min(sizes[index], max(MIN_LESSON_TOKENS, remaining // (len(sizes) - left)))
+        remaining -= shares[index]
+    return shares
+
+
+def _summarize(client, jobs, use_cache, trace_id, label, call_slot=None):
+    """
+    Runs one "digest" call per (index, content, max_tokens) job in parallel
+    and returns ({index: digest} of the calls that succeeded, number of
+    failed calls). Each call's error is on its own "digest" span, and each
+    call holds a `call_slot()`, if given (see jobs.Job.call_slot).
+    """
+    def summarize(content, max_tokens):
+        prompt = render("digest", lesson_content=content, max_words=max_tokens * 3 // 4)
+        with call_slot() if call_slot else nullcontext():
+            return complete(client, prompt, use_cache=use_cache, stage="digest", trace_id=trace_id,
+                            label=label, max_tokens=max_tokens)
+
+    digests = {}
+    failed = 0
+    with ThreadPoolExecutor(max_workers=max(1, min(DIGEST_MAX_WORKERS, len(jobs)))) as executor:
+        futures = {index: executor.submit(summarize, content, max_tokens) for index, content, max_tokens in jobs}
+        for index, future in futures.items():
+            try:
+                digest = future.result()
+            except Exception:
+                failed += 1
+                continue
+            if digest:
+                digests[index] = digest
+    return digests, failed
+
+
+def compact_module_text(module, lesson_contents, client=None, use_cache=True, trace_id=None,
+                        budget=None, mode=None, call_slot=None):
+    """
+    Returns (module_text, compacted) for a module's quiz prompt: the module
+    heading and lessons as build_module_text joins them, with every lesson
+    over its share of `budget` tokens replaced by its digest. Modules within
+    the budget are returned verbatim. Summaries need a `client`; without
+    one, digests are always extracted. Summary calls take a `call_slot()`.
+    """
+    budget = QUIZ_TOKEN_BUDGET if budget is None else budget
+    mode = mode or DIGEST_MODE
+    contents = [content or "" for content in lesson_contents]
+    text = Module(module, [Lesson(None, content) for content in contents]).to_markdown(quiz=False)
+    tokens = count_tokens(text)
+    if tokens <= budget or not contents:
+        return text, False
+
+    started = time.perf_counter()
+    overhead = tokens - sum(count_tokens(content) for content in contents)
+    shares = _shares([count_tokens(content) for content in contents], max(0, budget - overhead))
+    over = [(index, contents[index], shares[index]) for index in range(len(contents))
+            if count_tokens(contents[index]) > shares[index]]
+
+    summaries, failed = {}, 0
+    if mode == "summarize" and client is not None:
+        summaries, failed = _summarize(client, over, use_cache, trace_id, f"Digest: {module}", call_slot)
+    for index, content, share in over:
+        summary = summaries.get(index)
+        contents[index] = truncate_tokens(summary, share) if summary else lesson_digest(content, share)
+
+    text = Module(module, [Lesson(None, content) for content in contents]).to_markdown(quiz=False)
+    record_span("compaction", trace_id, label=module, latency=time.perf_counter() - started,
+                mode="summarize" if summaries else "extract", input_tokens=tokens,
+                output_tokens=count_tokens(text), lessons_condensed=len(over), summaries_failed=failed)
+    return text, True
@@ -0,0 +1,182 @@
+"""
+Process-wide rate limiting and retry policy for API calls.
+
+All Streamlit sessions run in one process, so module-level limiters are
+shared by every session (and every worker thread) using the same API key.
+"""
+import os
+import random
+import threading
+import time
+
+# Requests and tokens per minute allowed per API key and model (0 disables the limit)
+REQUESTS_PER_MINUTE = int(os.getenv("ACCG_RPM", "500"))
+TOKENS_PER_MINUTE = int(os.getenv("ACCG_TPM", "200000"))
+
+# Share of each bucket that only priority (outline) calls may take
+RESERVED_SHARE = min(max(float(os.getenv("ACCG_RESERVED_SHARE", "0.1")), 0.0), 0.9)
+
+MAX_RETRIES = int(os.getenv("ACCG_MAX_RETRIES", "5"))
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 60.0
+
+RETRYABLE_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket refilled continuously at `rate_per_minute`.
+    """
+
+    def __init__(self, rate_per_minute, capacity=None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = float(capacity or rate_per_minute)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def acquire(self, amount=1, reserve=0.0):
+        """
+        Blocks until `amount` tokens are available and takes them, leaving
+        a `reserve` share of the bucket untouched. Requests larger than the
+        bucket only wait for a full bucket.
+        """
+        if self.rate <= 0:
+            return
+        floor = self.capacity * reserve
+        amount = min(float(amount), self.capacity - floor)
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self._refill(now)
+                if self.tokens - amount >= floor:
+                    self.tokens -= amount
+                    return
+                wait = (amount + floor - self.tokens) / self.rate
+            time.sleep(min(wait, 1.0))
+
+    def drain(self):
+        """
+        Empties the bucket, e.g. after the server reported a rate limit.
+        """
+        with self.lock:
+            self._refill(time.monotonic())
+            self.tokens = 0.0
+
+
+class RateLimiter:
+    """
+    Request and token buckets for one API key.
+    """
+
+    def __init__(self, requests_per_minute=REQUESTS_PER_MINUTE, tokens_per_minute=TOKENS_PER_MINUTE):
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+
+    def acquire(self, estimated_tokens, priority=False):
+        """
+        Takes one request and `estimated_tokens`. Calls without `priority`
+        leave RESERVED_SHARE of both buckets for those with it.
+        """
+        reserve = 0.0 if priority else RESERVED_SHARE
+        self.requests.acquire(1, reserve)
+        self.tokens.acquire(estimated_tokens, reserve)
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(key):
+    """
+    Returns the shared limiter for an API key (or any other pool key, e.g.
+    key and model, since providers limit each model separately).
+    """
+    with _limiters_lock:
+        if key not in _limiters:
+            _limiters[key] = RateLimiter()
+        return _limiters[key]
+
+
+def is_retryable(error):
+    """
+    True for rate limits, timeouts, connection errors and 5xx responses.
+    """
+    status = getattr(error, "status_code", None)
+    if status is not None:
+        return status in RETRYABLE_STATUS_CODES or status >= 500
+    name = type(error).__name__
+    return name in ("APITimeoutError", "APIConnectionError", "Timeout", "ConnectError", "ReadTimeout")
+
+
+def retry_after_seconds(error):
+    """
+    Reads Retry-After (or retry-after-ms) from an API error's response, if any.
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        if headers.get("retry-after-ms"):
+            return float(headers["retry-after-ms"]) / 1000.0
+        if headers.get("retry-after"):
+            return float(headers["retry-after"])
+    except (TypeError, ValueError):
+        return None
+    return None
+
+
+def backoff_delay(attempt, error=None):
+    """
+    Full-jitter exponential backoff, never shorter than the server's Retry-After.
+    """
+    delay = random.uniform(0, min(BACKOFF_MAX_SECONDS, BACKOFF_BASE_SECONDS * (2 ** attempt)))
+    server_delay = retry_after_seconds(error) if error is not None else None
+    if server_delay is not None:
+        delay = max(delay, min(server_delay, BACKOFF_MAX_SECONDS))
+    return delay
+
+
+def call_with_retries(fn, limiter=None, estimated_tokens=0, max_retries=MAX_RETRIES, on_retry=None,
+                      fallback=None, first_attempt=0, priority=False):
+    """
+    Calls fn() after taking capacity from `limiter`, retrying retryable
+    errors with backoff. `on_retry(attempt, error, delay)` is called before
+    each sleep. The last error is raised once retries are exhausted.
+    `first_attempt` continues the count (and backoff) of earlier retries
+    made by the caller. `priority` calls may use the limiter's reserve.
+
+    `fallback(error)` may return a replacement (fn, limiter) for the
+    remaining attempts, e.g. a faster model; it is tried right away,
+    without backoff, and asked at most once.
+    """
+    attempt = first_attempt
+    while True:
+        if limiter is not None:
+            limiter.acquire(estimated_tokens, priority)
+        try:
+            return fn()
+        except Exception as e:
+            if attempt >= max_retries or not is_retryable(e):
+                raise
+            if limiter is not None and getattr(e, "status_code", None) == 429:
+                # Everyone sharing this key should back off, not just this call
+                limiter.requests.drain()
+            replacement = fallback(e) if fallback is not None else None
+            fallback = None
+            if replacement is not None:
+                fn, limiter = replacement
+                if on_retry:
+                    on_retry(attempt + 1, e, 0.0)
+                attempt += 1
+                continue
+            delay = backoff_delay(attempt, e)
+            if on_retry:
+                on_retry(attempt + 1, e, delay)
+            time.sleep(delay)
+            attempt += 1
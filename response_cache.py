@@ -0,0 +1,129 @@
+import hashlib
+import json
+import os
+import threading
+import time
+
+from config import data_path, env_flag
+from storage import SQLiteStore
+
+# Cache limits (override via environment)
+CACHE_MAX_ENTRIES = int(os.getenv("ACCG_CACHE_MAX_ENTRIES", "5000"))
+CACHE_MAX_BYTES = int(os.getenv("ACCG_CACHE_MAX_BYTES", str(200 * 1024 * 1024)))
+CACHE_TTL_SECONDS = int(os.getenv("ACCG_CACHE_TTL", str(30 * 24 * 3600)))
+
+
+def make_key(model, temperature, prompt, system=None, max_tokens=None):
+    """
+    Content address of a request: sha256 over the model, temperature, prompt
+    and system message (if any), so system + user requests never share an
+    entry with single-message ones. An output budget is part of the key,
+    since it can cut the answer short.
+    """
+    request = {"model": model, "temperature": temperature, "prompt": prompt}
+    if system is not None:
+        request["system"] = system
+    if max_tokens is not None:
+        request["max_tokens"] = max_tokens
+    payload = json.dumps(request, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class ResponseCache(SQLiteStore):
+    """
+    Disk-backed LRU cache of completion texts stored in SQLite.
+
+    Safe to share between Streamlit sessions and processes. Entries expire
+    after `ttl` seconds and the least recently used ones are evicted once
+    `max_entries` or `max_bytes` is exceeded.
+    """
+
+    SCHEMA = (
+        """
+        CREATE TABLE IF NOT EXISTS responses (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL,
+            size INTEGER NOT NULL,
+            created_at REAL NOT NULL,
+            accessed_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_responses_accessed ON responses(accessed_at)",
+    )
+
+    def __init__(self, path=None, max_entries=CACHE_MAX_ENTRIES, max_bytes=CACHE_MAX_BYTES,
+                 ttl=CACHE_TTL_SECONDS):
+        super().__init__(path or data_path("response_cache.sqlite3"))
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+
+    def get(self, key):
+        """
+        Returns the cached text for `key`, or None if missing or expired.
+        """
+        conn = self._connect()
+        now = time.time()
+        row = conn.execute("SELECT value, created_at FROM responses WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        value, created_at = row
+        if self.ttl and now - created_at > self.ttl:
+            conn.execute("DELETE FROM responses WHERE key = ?", (key,))
+            return None
+        conn.execute("UPDATE responses SET accessed_at = ? WHERE key = ?", (now, key))
+        return value
+
+    def set(self, key, value):
+        """
+        Stores `value` under `key` and evicts entries beyond the configured limits.
+        """
+        conn = self._connect()
+        now = time.time()
+        size = len(value.encode("utf-8"))
+        conn.execute(
+            "INSERT OR REPLACE INTO responses (key, value, size, created_at, accessed_at) VALUES (?, ?, ?, ?, ?)",
+            (key, value, size, now, now),
+        )
+        self._evict(conn, now)
+
+    def _evict(self, conn, now):
+        if self.ttl:
+            conn.execute("DELETE FROM responses WHERE created_at < ?", (now - self.ttl,))
+
+        count, total = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM responses").fetchone()
+        if count <= self.max_entries and total <= self.max_bytes:
+            return
+
+        # Walk from least to most recently used until both limits hold
+        doomed = []
+        for key, size in conn.execute("SELECT key, size FROM responses ORDER BY accessed_at ASC"):
+            if count <= self.max_entries and total <= self.max_bytes:
+                break
+            doomed.append((key,))
+            count -= 1
+            total -= size
+        conn.executemany("DELETE FROM responses WHERE key = ?", doomed)
+
+    def clear(self):
+        """
+        Removes every cached response.
+        """
+        self._connect().execute("DELETE FROM responses")
+
+
+_default_cache = None
+_default_cache_lock = threading.Lock()
+
+
+def get_default_cache():
+    """
+    Returns the process-wide cache, or None when disabled with ACCG_CACHE_DISABLED.
+    """
+    global _default_cache
+    if env_flag("ACCG_CACHE_DISABLED"):
+        return None
+    with _default_cache_lock:
+        if _default_cache is None:
+            _default_cache = ResponseCache()
+        return _default_cache
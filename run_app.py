@@ -1,35 +1,69 @@
 import sys
-import subprocess
 import os
+import time
+
+from config import env_flag
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+
+def preload():
+    """
+    Imports the heavy libraries, opens the local stores and renders a tiny
+    PDF/PPTX once, so the first session does not pay for any of it. Runs in
+    the server process, so the app's reruns reuse everything loaded here.
+    """
+    from checkpoints import get_default_store
+    from chat_store import get_default_chat_store
+    from lesson_library import get_default_library
+    from response_cache import get_default_cache
+    from utils import _build_pdf, _build_ppt
+
+    try:
+        import openai  # noqa: F401
+    except ImportError:
+        pass
+    for store in (get_default_cache, get_default_store, get_default_library, get_default_chat_store):
+        store()
+    sample = "# Warm-up\nHello."
+    _build_pdf(sample)
+    _build_ppt(sample)
 
 def main():
     # Default port
     port = "3000"
-    
+    warm_up = env_flag("ACCG_PRELOAD", True)
+
     # Parse arguments to find --port passed by the environment
     args = sys.argv[1:]
     for i, arg in enumerate(args):
         if arg == "--port" and i + 1 < len(args):
             port = args[i+1]
-            break
-    
-    # Construct the Streamlit command
-    # We use -m streamlit to ensure we use the installed module
+        elif arg == "--no-preload":
+            warm_up = False
+
+    # Streamlit runs in this process instead of a second interpreter.
     # We force headless mode to prevent email prompts
-    cmd = [
-        sys.executable, "-m", "streamlit", "run", "app.py",
-        "--server.port", port,
-        "--server.address", "0.0.0.0",
-        "--server.headless", "true",
-        "--browser.gatherUsageStats", "false",
-        "--theme.base", "light"
-    ]
-    
+    flag_options = {
+        "server_port": int(port),
+        "server_address": "0.0.0.0",
+        "server_headless": True,
+        "browser_gatherUsageStats": False,
+        "theme_base": "light",
+    }
+
+    if warm_up:
+        started = time.perf_counter()
+        preload()
+        print(f"Preloaded in {time.perf_counter() - started:.2f}s")
+
     print(f"Starting Streamlit on port {port}...")
-    
-    # Run the command
+
     try:
-        subprocess.run(cmd, check=True)
+        from streamlit.web import bootstrap
+
+        # Like `streamlit run`, .streamlit/ config and secrets are read from the working directory
+        bootstrap.load_config_options(flag_options)
+        bootstrap.run(APP_PATH, False, [], flag_options)
     except KeyboardInterrupt:
         pass
     except Exception as e:
@@ -37,4 +71,4 @@ def main():
         sys.exit(1)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,31 @@
+import sqlite3
+import threading
+
+
+class SQLiteStore:
+    """
+    Base class for the small SQLite databases kept under DATA_DIR.
+
+    Each thread gets its own connection in autocommit mode and the database
+    runs in WAL mode, so concurrent Streamlit sessions, worker threads and
+    other processes can read and write at the same time. Subclasses list
+    their DDL statements in SCHEMA.
+    """
+
+    SCHEMA = ()
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        conn = self._connect()
+        for statement in self.SCHEMA:
+            conn.execute(statement)
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
@@ -0,0 +1,236 @@
+"""
+Per-call instrumentation: spans, an exportable JSONL trace and metrics.
+
+Every LLM call and every export records a span with its stage, model,
+token counts, latency, time to first token, retries and estimated cost.
+Spans are appended to a JSONL trace file, kept in memory per trace id for
+the course summary panel, and aggregated into Prometheus-style metrics
+that `start_metrics_server` exposes over HTTP.
+"""
+import json
+import os
+import threading
+import time
+from collections import OrderedDict, defaultdict, deque
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from config import data_path, env_flag
+
+TRACE_FILE = os.getenv("ACCG_TRACE_FILE")
+MAX_TRACES_IN_MEMORY = 200
+MAX_SPANS_PER_TRACE = 2000
+
+# USD per 1M tokens (input, output); override with ACCG_MODEL_PRICES='{"model": [in, out]}'
+MODEL_PRICES = {
+    "gpt-3.5-turbo": (0.50, 1.50),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4-turbo": (10.00, 30.00),
+    "gpt-4": (30.00, 60.00),
+}
+if os.getenv("ACCG_MODEL_PRICES"):
+    try:
+        MODEL_PRICES.update({k: tuple(v) for k, v in json.loads(os.getenv("ACCG_MODEL_PRICES")).items()})
+    except (ValueError, TypeError) as e:
+        print(f"Ignoring invalid ACCG_MODEL_PRICES: {e}")
+
+_lock = threading.Lock()
+_traces = OrderedDict()
+_counters = defaultdict(float)
+
+
+def estimate_cost(model, prompt_tokens, completion_tokens):
+    """
+    Estimated USD cost of a call; models are matched by longest known prefix.
+    """
+    if not model:
+        return 0.0
+    matches = [name for name in MODEL_PRICES if model.startswith(name)]
+    if not matches:
+        return 0.0
+    price_in, price_out = MODEL_PRICES[max(matches, key=len)]
+    return ((prompt_tokens or 0) * price_in + (completion_tokens or 0) * price_out) / 1_000_000
+
+
+def _trace_path():
+    return TRACE_FILE or data_path("trace.jsonl")
+
+
+def record_span(stage, trace_id=None, **fields):
+    """
+    Records one span. Common fields: label, model, prompt_tokens,
+    completion_tokens, latency, ttft, retries, cached, error.
+    """
+    if env_flag("ACCG_TELEMETRY_DISABLED"):
+        return None
+    span = {"ts": time.time(), "trace_id": trace_id, "stage": stage}
+    span.update(fields)
+    if "cost" not in span and span.get("model"):
+        span["cost"] = 0.0 if span.get("cached") else estimate_cost(
+            span["model"], span.get("prompt_tokens"), span.get("completion_tokens")
+        )
+
+    line = json.dumps(span, ensure_ascii=False, default=str)
+    with _lock:
+        try:
+            with open(_trace_path(), "a", encoding="utf-8") as f:
+                f.write(line + "\n")
+        except OSError as e:
+            print(f"Error writing trace: {e}")
+
+        if trace_id is not None:
+            spans = _traces.get(trace_id)
+            if spans is None:
+                spans = _traces[trace_id] = deque(maxlen=MAX_SPANS_PER_TRACE)
+                while len(_traces) > MAX_TRACES_IN_MEMORY:
+                    _traces.popitem(last=False)
+            spans.append(span)
+
+        labels = (stage, span.get("model") or "")
+        _counters[("calls",) + labels] += 1
+        _counters[("errors",) + labels] += 1 if span.get("error") else 0
+        _counters[("cache_hits",) + labels] += 1 if span.get("cached") else 0
+        _counters[("latency_seconds",) + labels] += span.get("latency") or 0.0
+        _counters[("prompt_tokens",) + labels] += span.get("prompt_tokens") or 0
+        _counters[("completion_tokens",) + labels] += span.get("completion_tokens") or 0
+        _counters[("retries",) + labels] += span.get("retries") or 0
+        _counters[("cost_usd",) + labels] += span.get("cost") or 0.0
+    return span
+
+
+@contextmanager
+def timed_span(stage, trace_id=None, **fields):
+    """
+    Times the enclosed block and records it as a span (with the error, if any).
+    The yielded dict can be filled with extra fields inside the block.
+    """
+    extra = dict(fields)
+    started = time.perf_counter()
+    try:
+        yield extra
+    except Exception as e:
+        extra["error"] = str(e)
+        raise
+    finally:
+        record_span(stage, trace_id, latency=time.perf_counter() - started, **extra)
+
+
+def get_spans(trace_id):
+    with _lock:
+        return list(_traces.get(trace_id, ()))
+
+
+def count_api_calls(trace_id):
+    """
+    Requests actually sent for a trace: spans of API calls carry a model,
+    cache hits sent none and every retry sent one more.
+    """
+    return sum(1 + (span.get("retries") or 0) for span in get_spans(trace_id)
+               if span.get("model") and not span.get("cached"))
+
+
+def summarize(trace_id):
+    """
+    Per-stage rows for a trace: calls, tokens, latency, TTFT, retries, cost.
+    """
+    rows = OrderedDict()
+    for span in get_spans(trace_id):
+        row = rows.setdefault(span["stage"], {
+            "stage": span["stage"], "calls": 0, "cached": 0, "errors": 0,
+            "prompt_tokens": 0, "completion_tokens": 0, "latency_total": 0.0,
+            "latency_max": 0.0, "ttft_total": 0.0, "ttft_count": 0, "retries": 0, "cost": 0.0,
+        })
+        latency = span.get("latency") or 0.0
+        row["calls"] += 1
+        row["cached"] += 1 if span.get("cached") else 0
+        row["errors"] += 1 if span.get("error") else 0
+        row["prompt_tokens"] += span.get("prompt_tokens") or 0
+        row["completion_tokens"] += span.get("completion_tokens") or 0
+        row["latency_total"] += latency
+        row["latency_max"] = max(row["latency_max"], latency)
+        if span.get("ttft") is not None:
+            row["ttft_total"] += span["ttft"]
+            row["ttft_count"] += 1
+        row["retries"] += span.get("retries") or 0
+        row["cost"] += span.get("cost") or 0.0
+
+    summary = []
+    for row in rows.values():
+        summary.append({
+            "stage": row["stage"],
+            "calls": row["calls"],
+            "cached": row["cached"],
+            "errors": row["errors"],
+            "prompt_tokens": row["prompt_tokens"],
+            "completion_tokens": row["completion_tokens"],
+            "avg_latency_s": round(row["latency_total"] / row["calls"], 3),
+            "max_latency_s": round(row["latency_max"], 3),
+            "avg_ttft_s": round(row["ttft_total"] / row["ttft_count"], 3) if row["ttft_count"] else None,
+            "retries": row["retries"],
+            "cost_usd": round(row["cost"], 5),
+        })
+    return summary
+
+
+def export_trace(trace_id):
+    """
+    Returns a trace's spans as JSONL text, e.g. for a download button.
+    """
+    return "".join(json.dumps(span, ensure_ascii=False, default=str) + "\n" for span in get_spans(trace_id))
+
+
+def render_metrics():
+    """
+    Renders the aggregated counters in Prometheus text exposition format.
+    """
+    with _lock:
+        items = sorted(_counters.items())
+    lines = []
+    seen = set()
+    for (metric, stage, model), value in items:
+        name = f"accg_{metric}_total"
+        if name not in seen:
+            lines.append(f"# TYPE {name} counter")
+            seen.add(name)
+        lines.append(f'{name}{{stage="{stage}",model="{model}"}} {value}')
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.rstrip("/") not in ("", "/metrics"):
+            self.send_error(404)
+            return
+        body = render_metrics().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+_metrics_server = None
+
+
+def start_metrics_server(port=None, host="0.0.0.0"):
+    """
+    Serves /metrics on `port` (default ACCG_METRICS_PORT) from a daemon
+    thread. Does nothing without a port or if the server is already running.
+    """
+    global _metrics_server
+    port = port or os.getenv("ACCG_METRICS_PORT")
+    if not port:
+        return None
+    with _lock:
+        if _metrics_server is None:
+            try:
+                _metrics_server = ThreadingHTTPServer((host, int(port)), _MetricsHandler)
+            except OSError as e:
+                print(f"Error starting metrics server on port {port}: {e}")
+                return None
+            threading.Thread(target=_metrics_server.serve_forever, name="accg-metrics", daemon=True).start()
+        return _metrics_server
@@ -0,0 +1,202 @@
+import threading
+import time
+
+from jobs import (
+    CANCELLED,
+    DONE,
+    PRIORITY_CONTENT,
+    PRIORITY_OUTLINE,
+    PRIORITY_PREFETCH,
+    RUNNING,
+    CallSlots,
+    JobScheduler,
+)
+
+TIMEOUT = 5
+
+
+def wait_until(condition):
+    deadline = time.time() + TIMEOUT
+    while not condition():
+        assert time.time() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def waiting_tickets(slots):
+    with slots._cond:
+        return sum(len(tickets) for owners in slots._waiting.values() for tickets in owners.values())
+
+
+def queue_calls(slots, calls, granted):
+    """
+    Starts one thread per (owner, priority) call, in order, each waiting for
+    a slot, recording its owner once granted and releasing the slot again.
+    """
+    def call(owner, priority):
+        with slots.slot(owner, priority):
+            granted.append(owner)
+
+    threads = []
+    for owner, priority in calls:
+        thread = threading.Thread(target=call, args=(owner, priority), daemon=True)
+        thread.start()
+        wait_until(lambda n=len(threads) + 1: waiting_tickets(slots) == n)
+        threads.append(thread)
+    return threads
+
+
+def test_call_slots_account_for_every_slot():
+    slots = CallSlots(slots=2, reserved=0)
+    slots.acquire("a")
+    slots.acquire("b")
+    assert slots.free == 0
+    granted = []
+    threads = queue_calls(slots, [("c", PRIORITY_CONTENT)], granted)
+    assert granted == []
+    slots.release()
+    threads[0].join(TIMEOUT)
+    assert granted == ["c"]
+    slots.release()
+    assert slots.free == 2
+
+
+def test_call_slots_take_turns_between_owners():
+    slots = CallSlots(slots=1, reserved=0)
+    slots.acquire("busy")
+    granted = []
+    calls = [("a", PRIORITY_CONTENT)] * 3 + [("b", PRIORITY_CONTENT)] * 2 + [("c", PRIORITY_CONTENT)]
+    threads = queue_calls(slots, calls, granted)
+    slots.release()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert granted == ["a", "b", "c", "a", "b", "a"]
+    assert slots.free == 1
+
+
+def test_call_slots_grant_outline_calls_first():
+    slots = CallSlots(slots=1, reserved=0)
+    slots.acquire("busy")
+    granted = []
+    threads = queue_calls(slots, [("a", PRIORITY_PREFETCH), ("b", PRIORITY_CONTENT), ("c", PRIORITY_OUTLINE)], granted)
+    slots.release()
+    for thread in threads:
+        thread.join(TIMEOUT)
+    assert granted == ["c", "b", "a"]
+
+
+def test_reserved_call_slots_only_go_to_outline_calls():
+    slots = CallSlots(slots=3, reserved=1)
+    slots.acquire("a")
+    slots.acquire("a")
+    granted = []
+    content = queue_calls(slots, [("b", PRIORITY_CONTENT)], granted)
+    assert granted == []
+    outline = queue_calls(slots, [("c", PRIORITY_OUTLINE)], granted)
+    outline[0].join(TIMEOUT)
+    assert granted == ["c"]
+    slots.release()
+    content[0].join(TIMEOUT)
+    assert granted == ["c", "b"]
+
+
+def blocked_scheduler(**kwargs):
+    """
+    A one-worker scheduler whose worker is held by a job until the returned
+    event is set, so jobs submitted meanwhile queue up.
+    """
+    scheduler = JobScheduler(max_workers=1, outline_workers=0, call_slots=CallSlots(slots=4, reserved=0),
+                             **kwargs)
+    release = threading.Event()
+    blocker = scheduler.submit("blocker", "content", lambda job: release.wait(TIMEOUT))
+    wait_until(lambda: blocker.status == RUNNING)
+    return scheduler, release
+
+
+def test_scheduler_runs_by_priority_then_round_robin_between_sessions():
+    scheduler, release = blocked_scheduler()
+    order = []
+
+    def body(name):
+        return lambda job: order.append(name)
+
+    jobs = [scheduler.submit(session, "content", body(name))
+            for session, name in [("a", "a1"), ("a", "a2"), ("a", "a3"), ("b", "b1"), ("b", "b2")]]
+    jobs.append(scheduler.submit("c", "outline", body("c-outline"), priority=PRIORITY_OUTLINE))
+    release.set()
+    for job in jobs:
+        assert job.wait(TIMEOUT)
+    assert order == ["c-outline", "a1", "b1", "a2", "b2", "a3"]
+    assert all(job.status == DONE for job in jobs)
+
+
+def test_outline_workers_only_take_outline_jobs():
+    scheduler = JobScheduler(max_workers=1, outline_workers=1, call_slots=CallSlots(slots=4, reserved=0))
+    release = threading.Event()
+    content = [scheduler.submit("a", "content", lambda job: release.wait(TIMEOUT)) for _ in range(2)]
+    outline = scheduler.submit("b", "outline", lambda job: "outline", priority=PRIORITY_OUTLINE)
+    assert outline.wait(TIMEOUT)
+    assert outline.result == "outline"
+    wait_until(lambda: content[0].status == RUNNING)
+    assert content[1].status != RUNNING
+    release.set()
+    assert all(job.wait(TIMEOUT) for job in content)
+
+
+def test_job_call_slot_uses_the_job_priority():
+    scheduler = JobScheduler(max_workers=1, outline_workers=0, call_slots=CallSlots(slots=2, reserved=1))
+
+    def body(job):
+        with job.call_slot():
+            return scheduler.call_slots.free
+
+    assert scheduler.submit("a", "content", body).wait(TIMEOUT)
+    job = scheduler.submit("a", "outline", body, priority=PRIORITY_OUTLINE)
+    assert job.wait(TIMEOUT)
+    assert job.result == 1
+    assert scheduler.call_slots.free == 2
+
+
+def test_cancelling_a_queued_job_skips_it():
+    scheduler, release = blocked_scheduler()
+    ran = []
+    job = scheduler.submit("a", "content", lambda job: ran.append(job.id))
+    assert scheduler.cancel(job.id)
+    assert job.status == CANCELLED
+    release.set()
+    after = scheduler.submit("a", "content", lambda job: None)
+    assert after.wait(TIMEOUT)
+    assert ran == []
+
+
+def test_prefetch_jobs_are_capped_and_leave_workers_to_real_work():
+    scheduler = JobScheduler(max_workers=3, outline_workers=0, call_slots=CallSlots(slots=4, reserved=0),
+                             prefetch_jobs=1)
+    release = threading.Event()
+    prefetches = [scheduler.submit(session, "prefetch", lambda job: release.wait(TIMEOUT), priority=PRIORITY_PREFETCH)
+                  for session in ("a", "b")]
+    wait_until(lambda: prefetches[0].status == RUNNING)
+    content = scheduler.submit("c", "content", lambda job: "lessons")
+    assert content.wait(TIMEOUT)
+    assert prefetches[1].status != RUNNING
+    release.set()
+    assert all(job.wait(TIMEOUT) for job in prefetches)
+
+
+def test_cancelled_running_job_finishes_after_its_calls():
+    scheduler = JobScheduler(max_workers=1, outline_workers=0, call_slots=CallSlots(slots=4, reserved=0))
+    in_flight = threading.Event()
+    release = threading.Event()
+
+    def body(job):
+        in_flight.set()
+        release.wait(TIMEOUT)
+        return "written"
+
+    job = scheduler.submit("a", "prefetch", body, priority=PRIORITY_PREFETCH)
+    assert in_flight.wait(TIMEOUT)
+    scheduler.cancel(job.id)
+    assert not job.wait(0.05)
+    release.set()
+    assert job.wait(TIMEOUT)
+    assert job.status == CANCELLED
+    assert job.result == "written"
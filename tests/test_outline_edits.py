@@ -0,0 +1,67 @@
+from checkpoints import CheckpointStore, lesson_key, quiz_key
+from pipeline import carry_over_checkpoints, diff_module_dicts
+
+OLD = {
+    "Module 1: Basics": ["Lesson 1.1: Variables", "Lesson 1.2: Types"],
+    "Module 2: Flow": ["Lesson 2.1: Loops", "Lesson 2.2: Functions"],
+}
+
+
+def test_unchanged_outline_keeps_everything():
+    kept = diff_module_dicts(OLD, OLD)
+    assert len(kept) == 6
+    assert all(new == old for new, old in kept.items())
+
+
+def test_edited_lesson_is_new_and_its_quiz_too():
+    new = dict(OLD, **{"Module 1: Basics": ["Lesson 1.1: Variables and Constants", "Lesson 1.2: Types"]})
+    kept = diff_module_dicts(OLD, new)
+    assert lesson_key("Module 1: Basics", "Lesson 1.1: Variables and Constants") not in kept
+    assert kept[lesson_key("Module 1: Basics", "Lesson 1.2: Types")] == lesson_key("Module 1: Basics", "Lesson 1.2: Types")
+    assert quiz_key("Module 1: Basics") not in kept
+    assert kept[quiz_key("Module 2: Flow")] == quiz_key("Module 2: Flow")
+
+
+def test_renamed_module_keeps_its_lessons_but_not_its_quiz():
+    new = {"Module 1: Python Basics": OLD["Module 1: Basics"], "Module 2: Flow": OLD["Module 2: Flow"]}
+    kept = diff_module_dicts(OLD, new)
+    assert kept[lesson_key("Module 1: Python Basics", "Lesson 1.1: Variables")] == \
+        lesson_key("Module 1: Basics", "Lesson 1.1: Variables")
+    assert quiz_key("Module 1: Python Basics") not in kept
+
+
+def test_lesson_moved_to_another_module_is_kept():
+    new = {
+        "Module 1: Basics": ["Lesson 1.1: Variables"],
+        "Module 2: Flow": ["Lesson 1.2: Types", "Lesson 2.1: Loops", "Lesson 2.2: Functions"],
+    }
+    kept = diff_module_dicts(OLD, new)
+    assert kept[lesson_key("Module 2: Flow", "Lesson 1.2: Types")] == lesson_key("Module 1: Basics", "Lesson 1.2: Types")
+
+
+def test_carry_over_copies_only_valid_units(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    for module, lessons in OLD.items():
+        for lesson in lessons:
+            store.save("old", lesson_key(module, lesson), f"content of {lesson}")
+        store.save("old", quiz_key(module), f"quiz of {module}")
+    store.save_failure("old", lesson_key("Module 2: Flow", "Lesson 2.2: Functions"), "timeout")
+    new = dict(OLD, **{"Module 1: Basics": ["Lesson 1.1: Variables and Constants", "Lesson 1.2: Types"]})
+
+    copied, total = carry_over_checkpoints(store, "old", OLD, "new", new)
+
+    assert (copied, total) == (3, 6)
+    assert store.load("new") == {
+        lesson_key("Module 1: Basics", "Lesson 1.2: Types"): "content of Lesson 1.2: Types",
+        lesson_key("Module 2: Flow", "Lesson 2.1: Loops"): "content of Lesson 2.1: Loops",
+        quiz_key("Module 2: Flow"): "quiz of Module 2: Flow",
+    }
+
+
+def test_carry_over_leaves_units_the_target_completed(tmp_path):
+    store = CheckpointStore(str(tmp_path / "checkpoints.sqlite3"))
+    key = lesson_key("Module 1: Basics", "Lesson 1.1: Variables")
+    store.save("old", key, "old text")
+    store.save("new", key, "new text")
+    assert carry_over_checkpoints(store, "old", OLD, "new", OLD)[0] == 0
+    assert store.load("new")[key] == "new text"
@@ -0,0 +1,51 @@
+from outline_parser import parse_outline_structure
+
+
+def test_tabler_curriculum():
+    outline = """Course Title: Python
+
+Curriculum Outline:
+**Module 1: Basics**
+- Lesson 1.1: Variables
+- Lesson 1.2: Types
+### Module 2 - Flow
+1. Lesson 2.1 (30 min): Loops
+"""
+    assert parse_outline_structure(outline) == {
+        "Module 1: Basics": ["Lesson 1.1: Variables", "Lesson 1.2: Types"],
+        "Module 2: Flow": ["Lesson 2.1: Loops"],
+    }
+
+
+def test_untitled_module_takes_next_line():
+    outline = "Module 1\nBasics\nLesson 1.1: Variables"
+    assert parse_outline_structure(outline) == {"Module 1: Basics": ["Lesson 1.1: Variables"]}
+
+
+def test_untitled_lesson_takes_next_line():
+    outline = "Module 1: Basics\nLesson 1.1\nVariables\nLesson 1.2:\nTypes"
+    assert parse_outline_structure(outline) == {
+        "Module 1: Basics": ["Lesson 1.1: Variables", "Lesson 1.2: Types"],
+    }
+
+
+def test_repeated_lessons_are_kept_once():
+    curriculum = "Module 1: Basics\nLesson 1.1: Variables\nLesson 1.2: Types\n"
+    assert parse_outline_structure(curriculum + "\nSummary\n" + curriculum) == {
+        "Module 1: Basics": ["Lesson 1.1: Variables", "Lesson 1.2: Types"],
+    }
+
+
+def test_prose_mentioning_a_lesson_is_not_a_lesson():
+    outline = "Module 1: Basics\nLesson 1.1 will teach you variables.\nLesson 1.1: Variables"
+    assert parse_outline_structure(outline) == {"Module 1: Basics": ["Lesson 1.1: Variables"]}
+
+
+def test_modules_without_lessons_are_dropped():
+    outline = "Module 1 introduces the basics.\nModule 1: Basics\nLesson 1.1: Variables"
+    assert parse_outline_structure(outline) == {"Module 1: Basics": ["Lesson 1.1: Variables"]}
+
+
+def test_no_curriculum_returns_none():
+    assert parse_outline_structure("A course about Python.") is None
+    assert parse_outline_structure("") is None
@@ -1,20 +1,19 @@
-import shelve
 import unicodedata
+import importlib.util
 import os
-import re
+import hashlib
+import threading
+from collections import OrderedDict
+from io import BytesIO
 
-# Try importing FPDF
-try:
-    from fpdf import FPDF
-except ImportError:
-    FPDF = None
+from chat_store import LEGACY_SESSION_ID, get_default_chat_store
+from course_model import QUIZ_TITLE, Course
+from telemetry import record_span, timed_span
 
-# Try importing python-pptx
-try:
-    from pptx import Presentation
-    from pptx.util import Inches, Pt
-except ImportError:
-    Presentation = None
+# fpdf and python-pptx (with lxml) take ~0.5s to import, so the exporters
+# import them on first use; only their presence is checked here
+HAS_FPDF = importlib.util.find_spec("fpdf") is not None
+HAS_PPTX = importlib.util.find_spec("pptx") is not None
 
 def clean_text(text):
     """
@@ -22,99 +21,247 @@ def clean_text(text):
     """
     return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii')
 
-def generate_pdf(content, filename):
+# --- In-memory export cache ---
+# Exports are keyed on a hash of the course text, so Streamlit reruns reuse
+# the bytes instead of rebuilding the documents.
+EXPORT_CACHE_SIZE = 8
+
+# Text per PPTX body placeholder; longer lessons continue on further slides
+PPT_SLIDE_CHARS = 900
+PPT_SLIDE_LINES = 14
+PPT_LINE_CHARS = 90
+_export_cache = OrderedDict()
+_export_cache_lock = threading.Lock()
+
+
+def _memoized_export(kind, content, builder, trace_id=None):
     """
-    Generates a PDF file from text content.
+    Returns builder(content), reusing the result for identical content (a
+    Course or Markdown text). Keeps the EXPORT_CACHE_SIZE most recently used
+    exports. Builds (and cache hits) are recorded as "export_<kind>" telemetry spans.
+    """
+    if isinstance(content, Course):
+        # The title comes from the name, which the Markdown digest leaves out
+        key = (kind, content.name, content.digest())
+        chars = content.char_count()
+    else:
+        key = (kind, hashlib.sha256(content.encode("utf-8")).hexdigest())
+        chars = len(content)
+    with _export_cache_lock:
+        if key in _export_cache:
+            _export_cache.move_to_end(key)
+            data = _export_cache[key]
+            record_span("export_" + kind, trace_id, cached=True, latency=0.0, bytes=len(data))
+            return data
+
+    with timed_span("export_" + kind, trace_id, input_chars=chars) as span:
+        data = builder(content)
+        span["bytes"] = len(data) if data is not None else 0
+        if data is None:
+            span["error"] = "export failed"
+    if data is None:
+        return None
+
+    with _export_cache_lock:
+        _export_cache[key] = data
+        _export_cache.move_to_end(key)
+        while len(_export_cache) > EXPORT_CACHE_SIZE:
+            _export_cache.popitem(last=False)
+    return data
+
+
+def _write_file(data, filename):
+    with open(filename, "wb") as f:
+        f.write(data)
+
+
+def _build_pdf(content):
+    """
+    Renders a course (or course Markdown) to PDF bytes, one module at a time.
     """
-    if FPDF is None:
+    if not HAS_FPDF:
         return None
 
     try:
-        content = clean_text(content)
-        pdf = FPDF()
-        pdf.add_page()
-        pdf.set_font('Arial', 'B', 16)
-        pdf.cell(0, 10, 'Course Content', ln=True, align='C')
-        pdf.ln(10)
-        
-        pdf.set_font('Arial', '', 12)
-        pdf.multi_cell(0, 10, content)
-        
-        # FPDF output to file
-        pdf.output(filename, 'F')
-        return pdf
+        from pdf_export import render_course_pdf
+        if isinstance(content, Course) and content.name:
+            return render_course_pdf(content, content.name)
+        return render_course_pdf(content)
     except Exception as e:
         print(f"Error generating PDF: {e}")
         return None
 
-def generate_ppt(content, filename):
+
+def paginate_text(text, max_chars=PPT_SLIDE_CHARS, max_lines=PPT_SLIDE_LINES):
     """
-    Generates a PowerPoint file from markdown-like text content.
+    Splits text into slide-sized pages at line (or, for very long lines,
+    word) boundaries; a word longer than a page is cut. Long lines count as
+    the several lines they wrap to.
+    """
+    pages, page, used_chars, used_lines = [], [], 0, 0
+    for line in text.splitlines():
+        pieces = [line]
+        if len(line) > max_chars:
+            pieces, piece = [], ""
+            for word in line.split(" "):
+                # A single token longer than a page (a URL, a long formula) is cut into page-sized parts
+                while len(word) > max_chars:
+                    if piece:
+                        pieces.append(piece)
+                        piece = ""
+                    pieces.append(word[:max_chars])
+                    word = word[max_chars:]
+                if not word:
+                    continue
+                if piece and len(piece) + len(word) + 1 > max_chars:
+                    pieces.append(piece)
+                    piece = word
+                else:
+                    piece = f"{piece} {word}" if piece else word
+            pieces.append(piece)
+        for piece in pieces:
+            lines = 1 + len(piece) // PPT_LINE_CHARS
+            if page and (used_chars + len(piece) > max_chars or used_lines + lines > max_lines):
+                pages.append("\n".join(page).strip())
+                page, used_chars, used_lines = [], 0, 0
+            if not page and not piece.strip():
+                continue
+            page.append(piece)
+            used_chars += len(piece)
+            used_lines += lines
+    if page and "\n".join(page).strip():
+        pages.append("\n".join(page).strip())
+    return pages
+
+
+def _slide_body(content, title):
+    """
+    Slide text of a lesson or quiz: headings lose their "#" markers, blank
+    runs collapse and a leading heading repeating the slide title is dropped.
+    """
+    lines = []
+    for line in clean_text(content or "").splitlines():
+        stripped = line.strip()
+        if stripped.startswith("#"):
+            stripped = stripped.lstrip("#").strip()
+            if not lines and stripped.lower() == clean_text(title or "").strip().lower():
+                continue
+            line = stripped
+        if not stripped and (not lines or not lines[-1].strip()):
+            continue
+        lines.append(line.rstrip())
+    return "\n".join(lines)
+
+
+def _build_ppt(content):
+    """
+    Renders a course (or course Markdown) to PPTX bytes: a section slide per
+    module, then each lesson and quiz paginated over as many slides as needed.
     """
-    if Presentation is None:
+    if not HAS_PPTX:
         return None
 
     try:
+        from pptx import Presentation
+
+        course = content if isinstance(content, Course) else Course.from_markdown(content)
         prs = Presentation()
-        
-        # Clean content
-        content = clean_text(content)
-        
-        # Split content by Headers (assuming lines starting with # are headers)
-        # matches newlines followed by #, capturing the # to keep it or just splitting
-        sections = re.split(r'\n(?=#)', content)
-        
-        # Title Slide (First section is usually the title or intro)
-        title_slide_layout = prs.slide_layouts[0]
-        slide = prs.slides.add_slide(title_slide_layout)
-        title = slide.shapes.title
-        subtitle = slide.placeholders[1]
-        
-        title.text = "Generated Course"
-        subtitle.text = "Automated Course Content Generator"
-
-        for section in sections:
-            section = section.strip()
-            if not section:
-                continue
-                
-            lines = section.split('\n')
-            header = lines[0].replace('#', '').strip()
-            body_text = '\n'.join(lines[1:]).strip()
-            
-            # Content Slide
-            bullet_slide_layout = prs.slide_layouts[1]
-            slide = prs.slides.add_slide(bullet_slide_layout)
-            
-            shapes = slide.shapes
-            title_shape = shapes.title
-            body_shape = shapes.placeholders[1]
-            
-            title_shape.text = header[:100] # Limit title length
-            body_shape.text = body_text[:1000] # Limit body length to prevent overflow (basic handling)
-            
-        prs.save(filename)
-        return filename
+        title_layout, bullet_layout, section_layout = prs.slide_layouts[0], prs.slide_layouts[1], prs.slide_layouts[2]
+
+        slide = prs.slides.add_slide(title_layout)
+        slide.shapes.title.text = clean_text(course.name or "") or "Generated Course"
+        slide.placeholders[1].text = "Automated Course Content Generator"
+
+        def add_pages(title, body):
+            title = clean_text(title or "")[:100]
+            pages = paginate_text(_slide_body(body, title)) or [""]
+            for number, page in enumerate(pages, 1):
+                slide = prs.slides.add_slide(bullet_layout)
+                slide.shapes.title.text = title if len(pages) == 1 else f"{title} ({number}/{len(pages)})"
+                slide.placeholders[1].text = page
+
+        for module in course.modules:
+            slide = prs.slides.add_slide(section_layout)
+            slide.shapes.title.text = clean_text(module.title)[:100]
+            for lesson in module.lessons:
+                add_pages(lesson.title, lesson.content)
+            if module.quiz.content:
+                add_pages(f"{module.title}: {clean_text(QUIZ_TITLE).strip()}", module.quiz.content)
+
+        buffer = BytesIO()
+        prs.save(buffer)
+        return buffer.getvalue()
     except Exception as e:
         print(f"Error generating PPT: {e}")
         return None
 
-def load_chat_history():
+
+def generate_pdf_bytes(content, trace_id=None):
+    """
+    Returns the course as PDF bytes (memoized on the content hash), or None.
+    """
+    return _memoized_export("pdf", content, _build_pdf, trace_id)
+
+
+def generate_ppt_bytes(content, trace_id=None):
+    """
+    Returns the course as PPTX bytes (memoized on the content hash), or None.
+    """
+    return _memoized_export("pptx", content, _build_ppt, trace_id)
+
+
+def generate_pdf(content, filename, trace_id=None):
+    """
+    Generates a PDF file from text content.
+    """
+    data = generate_pdf_bytes(content, trace_id)
+    if data is None:
+        return None
+    _write_file(data, filename)
+    return filename
+
+
+def generate_ppt(content, filename, trace_id=None):
+    """
+    Generates a PowerPoint file from markdown-like text content.
+    """
+    data = generate_ppt_bytes(content, trace_id)
+    if data is None:
+        return None
+    _write_file(data, filename)
+    return filename
+
+def load_chat_history(session_id=LEGACY_SESSION_ID, limit=None):
     """
-    Loads chat history safely.
+    Loads a session's chat history safely (the newest `limit` messages if given).
     """
     try:
-        with shelve.open("chat_history") as db:
-            return db.get("messages", [])
+        messages, _ = get_default_chat_store().read(session_id, limit=limit)
+        return messages
     except Exception:
         return []
 
-def save_chat_history(messages):
+def append_chat_message(message, session_id=LEGACY_SESSION_ID):
+    """
+    Appends a single message to a session's history.
+    """
+    try:
+        get_default_chat_store().append(session_id, message)
+    except Exception:
+        pass
+
+def save_chat_history(messages, session_id=LEGACY_SESSION_ID):
     """
-    Saves chat history safely.
+    Saves chat history safely. Only messages beyond those already stored are
+    appended; a shorter list (e.g. []) replaces the session's history.
     """
     try:
-        with shelve.open("chat_history") as db:
-            db["messages"] = messages
+        store = get_default_chat_store()
+        stored = store.count(session_id)
+        if len(messages) < stored:
+            store.clear(session_id)
+            stored = 0
+        if len(messages) > stored:
+            store.append(session_id, *messages[stored:])
     except Exception:
-        pass
\ No newline at end of file
+        pass